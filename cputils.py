@@ -0,0 +1,132 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" One import for all of the utils_* modules, without paying for the ones you don't use.
+
+    import cputils
+    cputils.get_os_info()        # imports utils_system the first time
+    cputils.pins.classify_pin("SCL1")
+
+Nothing is imported until you use it. Each utils_* module also defers its hardware
+imports (board, wifi, adafruit_lis3dh, ...) until one of its functions needs them. """
+
+# Short names for the utils_* modules, so cputils.wifi is utils_wifi
+MODULES = {
+    "accelerometer": "utils_accelerometer",
+    "benchmark": "utils_benchmark",
+    "cache": "utils_cache",
+    "capabilities": "utils_capabilities",
+    "display": "utils_display",
+    "framebuffer": "utils_framebuffer",
+    "i2c": "utils_i2c",
+    "pins": "utils_pins",
+    "profile": "utils_profile",
+    "report": "utils_report",
+    "sampler": "utils_sampler",
+    "system": "utils_system",
+    "telemetry": "utils_telemetry",
+    "ticks": "utils_ticks",
+    "trace": "utils_trace",
+    "wifi": "utils_wifi",
+    "wifi_probe": "utils_wifi_probe",
+    "wifi_survey": "utils_wifi_survey",
+}
+
+# Functions available directly on cputils, and the module each one lives in
+FUNCTIONS = {
+    "get_os_info": "utils_system",
+    "get_board_info": "utils_system",
+    "get_microcontroller_info": "utils_system",
+    "get_builtin_modules": "utils_system",
+    "collect_snapshot": "utils_system",
+    "get_cache_info": "utils_cache",
+    "get_board_pins": "utils_pins",
+    "get_microcontroller_pins": "utils_pins",
+    "get_matching_pins": "utils_pins",
+    "build_pin_map": "utils_pins",
+    "classify_pin": "utils_pins",
+    "check_for_pin": "utils_pins",
+    "get_i2c_info": "utils_i2c",
+    "get_display_info": "utils_display",
+    "rotate_display": "utils_display",
+    "benchmark_display": "utils_display",
+    "connect_wifi": "utils_wifi",
+    "scan_wifi_networks": "utils_wifi",
+    "test_wifi": "utils_wifi",
+    "test_bandwidth": "utils_wifi",
+    "test_upload": "utils_wifi",
+    "connect_wifi_async": "utils_wifi",
+    "keep_connected": "utils_wifi",
+    "scan_wifi_networks_async": "utils_wifi",
+    "test_wifi_async": "utils_wifi",
+    "test_bandwidth_async": "utils_wifi",
+    "get_session": "utils_wifi",
+    "close_session": "utils_wifi",
+    "test_http_timings": "utils_wifi",
+    "run_benchmark": "utils_benchmark",
+    "collect_capabilities": "utils_capabilities",
+    "get_capabilities": "utils_capabilities",
+}
+
+# Heap budget for importing each module on the board, in bytes. measure_imports() flags modules over budget.
+# These are bytes still allocated after the import, so they don't include the compiler's temporary use.
+# Set your own for your board; they start out generous.
+IMPORT_BUDGETS = {
+    "utils_accelerometer": 8192,
+    "utils_benchmark": 8192,
+    "utils_cache": 6144,
+    "utils_capabilities": 8192,
+    "utils_display": 8192,
+    "utils_framebuffer": 8192,
+    "utils_i2c": 12288,
+    "utils_pins": 12288,
+    "utils_profile": 4096,
+    "utils_report": 4096,
+    "utils_sampler": 6144,
+    "utils_system": 4096,
+    "utils_telemetry": 6144,
+    "utils_ticks": 2048,
+    "utils_trace": 4096,
+    "utils_wifi": 12288,
+    "utils_wifi_probe": 8192,
+    "utils_wifi_survey": 8192,
+}
+
+
+def __getattr__(name):
+    module_name = MODULES.get(name)
+    if module_name is not None:
+        value = __import__(module_name)
+    else:
+        module_name = FUNCTIONS.get(name)
+        if module_name is None:
+            raise AttributeError(name)
+        value = getattr(__import__(module_name), name)
+    # Remember it, so the next lookup doesn't come back here
+    globals()[name] = value
+    return value
+
+
+def measure_imports(modules=None):
+    """Import each utils_* module that isn't loaded yet, and print the heap and time each one costs.
+    Run it straight after a reload to get the real numbers. Returns a dict of module -> (bytes, ms)."""
+
+    import sys
+    import utils_profile
+
+    print("\n=== import footprint ===\n")
+    print("\t%-22s %10s %10s %10s" % ("module", "bytes", "ms", "budget"))
+
+    measured = {}
+    for module_name in modules or sorted(IMPORT_BUDGETS):
+        if module_name in sys.modules:
+            print("\t%-22s already imported" % module_name)
+            continue
+        with utils_profile.profile() as result:
+            __import__(module_name)
+        budget = IMPORT_BUDGETS.get(module_name)
+        flag = " OVER" if budget is not None and result.retained > budget else ""
+        print("\t%-22s %10d %10.1f %10s%s" % (
+            module_name, result.retained, result.elapsed_us / 1000, "-" if budget is None else budget, flag))
+        measured[module_name] = (result.retained, result.elapsed_us / 1000)
+    return measured
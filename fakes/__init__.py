@@ -0,0 +1,342 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Fake CircuitPython hardware, so the utils_* modules run on a regular computer.
+
+install() puts stand-ins for board, microcontroller, busio, displayio, wifi, socketpool,
+adafruit_requests and adafruit_lis3dh into sys.modules, built from one of the board
+profiles in fakes.profiles. It also fakes os.uname(), os.statvfs(), gc.mem_free() and gc.mem_alloc().
+The utils_* modules then run unchanged:
+
+    import fakes
+    env = fakes.install("clue")
+    import utils_pins
+    utils_pins.get_matching_pins()
+    fakes.uninstall()
+
+It works as a context manager too:
+
+    with fakes.install("magtag", i2c_latency_us=500) as env:
+        ...
+
+Or print every report for a board with python -m fakes <profile>. """
+
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+from fakes.profiles import PROFILES, DEFAULT_NETWORKS
+
+# Modules install() replaces
+FAKE_MODULES = (
+    "board", "microcontroller", "busio", "displayio", "wifi", "socketpool", "adafruit_requests", "adafruit_lis3dh",
+    "_bleio",
+)
+
+# The setting utils_cache reads its file's path from, with os.getenv()
+CACHE_PATH_SETTING = "CPUTILS_CACHE_PATH"
+
+# The environment currently installed, if any
+_installed = None
+
+# Heap a board has already used by the time your code runs, as a fraction of heap_size
+BASE_HEAP_USE = 0.05
+
+# CIRCUITPY block size, and the fraction of the drive that's free
+FILESYSTEM_BLOCK_SIZE = 512
+FILESYSTEM_FREE = 0.8
+
+
+class FakeModule(types.ModuleType):
+    """Module whose dir() lists what you put in it, like the board's built-in modules,
+    instead of Python's __doc__, __loader__ and friends"""
+
+    def __dir__(self):
+        return ["__name__"] + [name for name in self.__dict__ if not name.startswith("__")]
+
+
+class Pin:
+    """Stand-in for microcontroller.Pin. Compared and hashed by identity, like the real thing."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __repr__(self):
+        return "board." + self._name
+
+
+class Processor:
+    """Stand-in for microcontroller.cpu"""
+
+    def __init__(self, frequency, temperature, voltage):
+        self.frequency = frequency
+        self.temperature = temperature
+        self.voltage = voltage
+        self.uid = b"\xfa\xce\x00\x01\x02\x03"
+        self.reset_reason = "POWER_ON"
+
+
+class UName(tuple):
+    """What os.uname() returns on the board"""
+
+    def __new__(cls, sysname, nodename, release, version, machine):
+        self = super().__new__(cls, (sysname, nodename, release, version, machine))
+        self.sysname = sysname
+        self.nodename = nodename
+        self.release = release
+        self.version = version
+        self.machine = machine
+        return self
+
+
+class Environment:
+    """Everything install() made, so you can look at it or change it while the utilities run.
+
+    profile:        the board profile, after any overrides
+    board:          the fake board module
+    microcontroller: the fake microcontroller module
+    buses:          FakeI2C buses, by the board function that returns them, like "I2C" or "STEMMA_I2C"
+    display:        the FakeDisplay, or None
+    radio:          the FakeRadio, or None if the board has no native wifi
+    lis3dh:         the first FakeLIS3DH on any bus, or None"""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.board = None
+        self.microcontroller = None
+        self.buses = {}
+        self.display = None
+        self.radio = None
+        self.lis3dh = None
+        self._saved_modules = {}
+        self._saved_os = {}
+        self._saved_gc = {}
+        self._cache_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        uninstall()
+
+    def mem_alloc(self):
+        """Bytes of the fake heap in use. Follows tracemalloc, when it's running, so allocations show up."""
+        used = int(self.profile["heap_size"] * BASE_HEAP_USE)
+        import tracemalloc
+        if tracemalloc.is_tracing():
+            used += tracemalloc.get_traced_memory()[0]
+        return min(used, self.profile["heap_size"])
+
+    def mem_free(self):
+        return self.profile["heap_size"] - self.mem_alloc()
+
+    def statvfs(self, path):
+        """os.statvfs() for the CIRCUITPY drive, whatever the path"""
+        blocks = self.profile["filesystem_size"] // FILESYSTEM_BLOCK_SIZE
+        free = int(blocks * FILESYSTEM_FREE)
+        return (FILESYSTEM_BLOCK_SIZE, FILESYSTEM_BLOCK_SIZE, blocks, free, free, 0, 0, 0, 0, 255)
+
+
+def _build_pins(env):
+    """Make the board and microcontroller modules, with one Pin per GPIO and the profile's aliases"""
+    profile = env.profile
+    microcontroller = FakeModule("microcontroller")
+    microcontroller.Pin = Pin
+    microcontroller.pin = FakeModule("microcontroller.pin")
+    microcontroller.cpu = Processor(profile["cpu_frequency"], profile["cpu_temperature"], profile["cpu_voltage"])
+    microcontroller.cpus = (microcontroller.cpu,)
+    microcontroller.nvm = bytearray(profile["nvm_size"]) if profile["nvm_size"] else None
+    microcontroller.reset = lambda: None
+
+    board = FakeModule("board")
+    board.board_id = profile["board_id"]
+
+    gpios = list(profile["gpios"])
+    for gpio in profile["pins"]:
+        if gpio not in gpios:
+            gpios.append(gpio)
+    for gpio in gpios:
+        pin = Pin(gpio)
+        setattr(microcontroller.pin, gpio, pin)
+        for alias in profile["pins"].get(gpio, ()):
+            setattr(board, alias, pin)
+
+    env.board = board
+    env.microcontroller = microcontroller
+
+
+def _build_buses(env, i2c_latency_us, i2c_frequency):
+    """Make a FakeI2C for each bus in the profile, with its devices, and the board functions that return them"""
+    from fakes.i2c import FakeI2C, DEVICE_TYPES
+    from fakes.lis3dh import FakeLIS3DH
+
+    profile = env.profile
+    by_pins = {}
+    for name, (scl, sda) in profile["i2c"].items():
+        bus = by_pins.get((scl, sda))
+        if bus is None:
+            bus = FakeI2C(frequency=i2c_frequency, latency_us=i2c_latency_us)
+            for device_type, address in profile["i2c_devices"].get(scl, ()):
+                if device_type == "lis3dh":
+                    device = FakeLIS3DH(address)
+                    if env.lis3dh is None:
+                        env.lis3dh = device
+                else:
+                    device = DEVICE_TYPES[device_type](address)
+                bus.add_device(device)
+            by_pins[(scl, sda)] = bus
+        env.buses[name] = bus
+        # board.I2C() always returns the same bus object
+        setattr(env.board, name, (lambda bus=bus: bus))
+
+    def I2C(scl, sda, *, frequency=100000, timeout=255):
+        for (scl_alias, sda_alias), bus in by_pins.items():
+            if getattr(env.board, scl_alias) is scl and getattr(env.board, sda_alias) is sda:
+                bus.frequency = frequency
+                return bus
+        # Nothing on these pins, but the bus still works
+        return FakeI2C(frequency=frequency, latency_us=i2c_latency_us)
+
+    busio = FakeModule("busio")
+    busio.I2C = I2C
+    return busio
+
+
+class Address:
+    """Stand-in for _bleio.Address"""
+
+    def __init__(self, address_bytes):
+        self.address_bytes = address_bytes
+
+
+class Adapter:
+    """Stand-in for _bleio.adapter, enough to tell it's there"""
+
+    def __init__(self):
+        self.enabled = True
+        self.address = Address(b"\xc0\xff\xee\x00\x11\x22")
+        self.name = "CIRCUITPY"
+
+
+def _build_bleio():
+    bleio = FakeModule("_bleio")
+    bleio.adapter = Adapter()
+    return bleio
+
+
+def _drop_caches():
+    """Make the utilities forget what they found on the last board, as if it had rebooted"""
+    for name, forget in (("utils_system", "reset"), ("utils_pins", "reset"), ("utils_i2c", "invalidate"),
+                         ("utils_capabilities", "invalidate"), ("utils_cache", "reset")):
+        module = sys.modules.get(name)
+        if module is not None:
+            getattr(module, forget)()
+
+
+def install(profile="magtag", *, i2c_latency_us=50, i2c_frequency=100000, networks=DEFAULT_NETWORKS,
+            wifi_password=None, nvm=None, **overrides):
+    """Install fake hardware for profile, a name from fakes.profiles.PROFILES or a profile dict.
+    nvm is what microcontroller.nvm starts out holding, like what the board kept from its last boot.
+    Any other keyword arguments replace entries in the profile, such as display=None.
+    Returns the Environment. Installing again replaces the previous fakes."""
+
+    global _installed
+    if _installed is not None:
+        uninstall()
+
+    if isinstance(profile, str):
+        profile = PROFILES[profile]
+    profile = dict(profile)
+    profile.update(overrides)
+
+    env = Environment(profile)
+    _build_pins(env)
+    if nvm is not None:
+        env.microcontroller.nvm[:len(nvm)] = nvm
+    modules = {
+        "board": env.board,
+        "microcontroller": env.microcontroller,
+        "busio": _build_buses(env, i2c_latency_us, i2c_frequency),
+    }
+
+    from fakes import display, lis3dh
+    modules["displayio"] = display.make_displayio_module()
+    display.FakeDisplay.current = None
+    if profile["display"] is not None:
+        env.display = display.FakeDisplay(**profile["display"])
+        env.board.DISPLAY = env.display
+    modules["adafruit_lis3dh"] = lis3dh.make_driver_module()
+    if profile["ble"]:
+        modules["_bleio"] = _build_bleio()
+
+    if profile["wifi"] == "native":
+        from fakes import wifi
+        env.radio = wifi.FakeRadio(networks, password=wifi_password)
+        modules["wifi"] = wifi.make_wifi_module(env.radio)
+        modules["socketpool"] = wifi.make_socketpool_module()
+        modules["adafruit_requests"] = wifi.make_requests_module()
+
+    for name in FAKE_MODULES:
+        env._saved_modules[name] = sys.modules.pop(name, None)
+    sys.modules.update(modules)
+
+    for name in ("uname", "statvfs"):
+        env._saved_os[name] = getattr(os, name, None)
+    uname = UName(profile["sysname"], profile["sysname"], profile["release"],
+                  profile["release"] + " on 2024-03-28", profile["machine"])
+    os.uname = lambda: uname
+    os.statvfs = env.statvfs
+
+    # Unless you've picked a file for utils_cache, it gets a folder of its own instead of the root of your computer
+    if CACHE_PATH_SETTING not in os.environ:
+        env._cache_dir = tempfile.mkdtemp(prefix="fakes_")
+        os.environ[CACHE_PATH_SETTING] = os.path.join(env._cache_dir, "cputils_cache")
+
+    for name in ("mem_free", "mem_alloc"):
+        env._saved_gc[name] = getattr(gc, name, None)
+    gc.mem_free = env.mem_free
+    gc.mem_alloc = env.mem_alloc
+
+    # Drop any snapshot the utilities cached from a previous board
+    _drop_caches()
+
+    _installed = env
+    return env
+
+
+def uninstall():
+    """Put back the real modules, and the os and gc functions"""
+
+    global _installed
+    env = _installed
+    if env is None:
+        return
+    _installed = None
+
+    from fakes import display
+    display.FakeDisplay.current = None
+    for name, module in env._saved_modules.items():
+        if module is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = module
+
+    for target, saved in ((os, env._saved_os), (gc, env._saved_gc)):
+        for name, function in saved.items():
+            if function is None:
+                delattr(target, name)
+            else:
+                setattr(target, name, function)
+
+    if env._cache_dir is not None:
+        os.environ.pop(CACHE_PATH_SETTING, None)
+        shutil.rmtree(env._cache_dir, ignore_errors=True)
+    _drop_caches()
+
+
+def installed():
+    """Return the installed Environment, or None"""
+    return _installed
@@ -0,0 +1,77 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Run every utils_* report against a fake board.
+
+    python -m fakes                 # MagTag
+    python -m fakes clue
+    python -m fakes --all           # every profile
+    python -m fakes --list
+
+help("modules") is skipped, since on a computer it lists everything installed, not the board's modules. """
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fakes
+from fakes.profiles import PROFILES
+
+
+def run_reports(name):
+    env = fakes.install(name)
+    print("\n########", name, "########")
+    try:
+        import utils_system
+        import utils_pins
+        import utils_i2c
+        import utils_display
+        import utils_accelerometer
+        import utils_capabilities
+
+        utils_system.get_os_info()
+        utils_system.get_board_info()
+        utils_system.get_microcontroller_info()
+        utils_pins.get_board_pins()
+        utils_pins.get_microcontroller_pins()
+        utils_pins.get_matching_pins()
+        utils_i2c.get_i2c_info()
+        utils_display.get_display_info()
+        utils_capabilities.get_capabilities()
+
+        if env.lis3dh is not None:
+            import adafruit_lis3dh
+            print("\n=== accelerometer ===\n")
+            bus = next(bus for bus in env.buses.values() if env.lis3dh.address in bus.devices)
+            lis3dh = adafruit_lis3dh.LIS3DH_I2C(bus, address=env.lis3dh.address)
+            utils_accelerometer.print_values(lis3dh)
+
+        if env.radio is not None:
+            import utils_wifi
+            utils_wifi.scan_wifi_networks()
+            utils_wifi.connect_wifi(env.radio.networks[0][0], "password")
+            utils_wifi.test_wifi()
+            utils_wifi.test_bandwidth()
+    finally:
+        fakes.uninstall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("profile", nargs="?", default="magtag", choices=sorted(PROFILES))
+    parser.add_argument("--all", action="store_true", help="run every profile")
+    parser.add_argument("--list", action="store_true", help="list the profiles")
+    args = parser.parse_args()
+
+    if args.list:
+        for name in sorted(PROFILES):
+            print(f"{name:<18} {PROFILES[name]['machine']}")
+        return
+    for name in sorted(PROFILES) if args.all else [args.profile]:
+        run_reports(name)
+
+
+if __name__ == "__main__":
+    main()
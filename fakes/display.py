@@ -0,0 +1,321 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Simulated built-in display, and a small stand-in for displayio.
+
+FakeDisplay has the properties utils_display reads. E-ink displays have no
+auto_refresh or brightness, like the real ones, so getattr() falls back for them.
+
+Bitmaps remember the area that changed since the last refresh, and a refresh takes as long as
+sending that area over the display's bus would, so benchmarks see the cost of full and partial
+updates. With auto_refresh on, changing a bitmap refreshes the display if a frame is due, the way
+CircuitPython's background refresh steals time from the code that's running. """
+
+import time
+
+from fakes import FakeModule
+
+# Seconds between auto refreshes, like CircuitPython's 60 frames a second
+AUTO_REFRESH_INTERVAL = 1 / 60
+
+
+# MIPI DCS commands the bus understands: set the column range, set the row range, write pixels
+CASET = 0x2A
+RASET = 0x2B
+RAMWR = 0x2C
+
+
+class DisplayBus:
+    """What the display buses have in common: send(), like displayio's FourWire.send(), into an
+    in-memory panel. The panel keeps 16 bit pixels in ram, in the order sent. Call attach() with the
+    panel's size to give it memory; until then, send() only counts and takes time."""
+
+    # Bytes a second
+    bytes_per_second = 3000000
+
+    def __init__(self):
+        self.ram = None
+        self.panel_width = 0
+        self.panel_height = 0
+        self.commands = 0
+        self.bytes_sent = 0
+        self._columns = (0, 0)
+        self._rows = (0, 0)
+
+    def attach(self, width, height):
+        self.panel_width = width
+        self.panel_height = height
+        self.ram = bytearray(width * height * 2)
+        self._columns = (0, width - 1)
+        self._rows = (0, height - 1)
+
+    def send(self, command, data, *, toggle_every_byte=False):
+        self.commands += 1
+        self.bytes_sent += 1 + len(data)
+        time.sleep((1 + len(data)) / self.bytes_per_second)
+        if command == CASET:
+            self._columns = ((data[0] << 8) | data[1], (data[2] << 8) | data[3])
+        elif command == RASET:
+            self._rows = ((data[0] << 8) | data[1], (data[2] << 8) | data[3])
+        elif command == RAMWR and self.ram is not None:
+            self._write(data)
+
+    def _write(self, data):
+        """Fill the window row by row, like the panel's memory pointer does"""
+        x1, x2 = self._columns
+        y1, y2 = self._rows
+        if x2 >= self.panel_width or y2 >= self.panel_height or x1 > x2 or y1 > y2:
+            raise ValueError("Window outside the panel")
+        row_bytes = (x2 - x1 + 1) * 2
+        data = memoryview(data)
+        offset = 0
+        for y in range(y1, y2 + 1):
+            if offset >= len(data):
+                break
+            count = min(row_bytes, len(data) - offset)
+            start = (y * self.panel_width + x1) * 2
+            self.ram[start:start + count] = data[offset:offset + count]
+            offset += count
+
+
+class FourWire(DisplayBus):
+    """Stand-in for the SPI display bus"""
+
+    # Like SPI at 24 MHz
+    bytes_per_second = 3000000
+
+    def __repr__(self):
+        return "<FourWire>"
+
+
+class ParallelBus(DisplayBus):
+    """Stand-in for the 8-bit parallel display bus"""
+
+    bytes_per_second = 10000000
+
+    def __repr__(self):
+        return "<ParallelBus>"
+
+
+BUSES = {"FourWire": FourWire, "ParallelBus": ParallelBus}
+
+
+class Bitmap:
+    """Stand-in for displayio.Bitmap, one byte per pixel, tracking the area changed since the last refresh"""
+
+    def __init__(self, width, height, value_count):
+        self.width = width
+        self.height = height
+        self.value_count = value_count
+        self._pixels = bytearray(width * height)
+        # (x1, y1, x2, y2), exclusive at the end, or None
+        self.dirty = None
+
+    def _changed(self, x1, y1, x2, y2):
+        if self.dirty is None:
+            self.dirty = (x1, y1, x2, y2)
+        else:
+            dx1, dy1, dx2, dy2 = self.dirty
+            self.dirty = (min(x1, dx1), min(y1, dy1), max(x2, dx2), max(y2, dy2))
+        if FakeDisplay.current is not None:
+            FakeDisplay.current._background()
+
+    def _index(self, key):
+        if isinstance(key, tuple):
+            return key[0], key[1]
+        return key % self.width, key // self.width
+
+    def __getitem__(self, key):
+        x, y = self._index(key)
+        return self._pixels[y * self.width + x]
+
+    def __setitem__(self, key, value):
+        if not 0 <= value < self.value_count:
+            raise ValueError("Bitmap value out of range")
+        x, y = self._index(key)
+        self._pixels[y * self.width + x] = value
+        self._changed(x, y, x + 1, y + 1)
+
+    def fill(self, value):
+        if not 0 <= value < self.value_count:
+            raise ValueError("Bitmap value out of range")
+        self._pixels[:] = bytes([value]) * len(self._pixels)
+        self._changed(0, 0, self.width, self.height)
+
+
+class Palette(list):
+    """Stand-in for displayio.Palette. Colors don't affect timing, so it's just a list."""
+
+    def __init__(self, color_count):
+        super().__init__([0] * color_count)
+
+
+class TileGrid:
+    """Stand-in for displayio.TileGrid, showing a whole bitmap as one tile"""
+
+    def __init__(self, bitmap, *, pixel_shader, x=0, y=0, **kwargs):
+        self.bitmap = bitmap
+        self.pixel_shader = pixel_shader
+        self.x = x
+        self.y = y
+        self.hidden = False
+
+
+class Group(list):
+    """Stand-in for displayio.Group. Just a list of layers with a position and scale."""
+
+    def __init__(self, *, scale=1, x=0, y=0):
+        super().__init__()
+        self.scale = scale
+        self.x = x
+        self.y = y
+        self.hidden = False
+
+
+class FakeDisplay:
+    """Stand-in for board.DISPLAY.
+
+    width and height are the size at the starting rotation, as the board reports it.
+    refresh_time:       seconds each refresh takes on top of sending the pixels. For e-ink, how long
+                        the panel stays busy after a refresh, which is much longer.
+    bits_per_pixel:     what each pixel costs on the bus, 16 for the color displays
+    seconds_per_frame:  e-ink only, the shortest time between refreshes"""
+
+    # The display of the board installed last, which bitmap changes trigger auto refreshes on
+    current = None
+
+    def __init__(self, width, height, rotation=0, bus="FourWire", eink=False, refresh_time=None,
+                 bits_per_pixel=None, seconds_per_frame=5.0):
+        self.rotation = rotation
+        # Keep the panel's own size, so width and height swap as the rotation changes
+        if self._rotation in (90, 270):
+            width, height = height, width
+        self._width = width
+        self._height = height
+        self.bus = BUSES[bus]()
+        if not eink:
+            self.bus.attach(width, height)
+        self._root_group = None
+        self._full_redraw = True
+        self._last_refresh = 0.0
+        self.refresh_count = 0
+        self.bytes_sent = 0
+        self.eink = eink
+        if refresh_time is None:
+            refresh_time = 1.0 if eink else 0.0005
+        self.refresh_time = refresh_time
+        if bits_per_pixel is None:
+            bits_per_pixel = 2 if eink else 16
+        self.bits_per_pixel = bits_per_pixel
+        if eink:
+            self.seconds_per_frame = seconds_per_frame
+            self._busy_until = 0.0
+            self._next_refresh = 0.0
+        else:
+            self.auto_refresh = True
+            self.brightness = 1.0
+        FakeDisplay.current = self
+
+    @property
+    def rotation(self):
+        return self._rotation
+
+    @rotation.setter
+    def rotation(self, value):
+        if value % 90 != 0:
+            raise ValueError("Display rotation must be in 90 degree increments")
+        self._rotation = value % 360
+        self._full_redraw = True
+
+    @property
+    def width(self):
+        return self._height if self._rotation in (90, 270) else self._width
+
+    @property
+    def height(self):
+        return self._width if self._rotation in (90, 270) else self._height
+
+    @property
+    def root_group(self):
+        return self._root_group
+
+    @root_group.setter
+    def root_group(self, group):
+        self._root_group = group
+        self._full_redraw = True
+
+    def show(self, group):
+        """What CircuitPython 8 and earlier used instead of root_group"""
+        self.root_group = group
+
+    @property
+    def busy(self):
+        return time.monotonic() < self._busy_until
+
+    @property
+    def time_to_refresh(self):
+        return max(0.0, self._next_refresh - time.monotonic())
+
+    def _dirty_pixels(self, group, x, y):
+        """Pixels changed since the last refresh in group and everything in it, clipped to the screen"""
+        count = 0
+        for layer in group:
+            if layer.hidden:
+                continue
+            if isinstance(layer, Group):
+                count += self._dirty_pixels(layer, x + layer.x, y + layer.y)
+                continue
+            dirty = layer.bitmap.dirty
+            if dirty is None:
+                continue
+            layer.bitmap.dirty = None
+            left = max(0, x + layer.x + dirty[0])
+            top = max(0, y + layer.y + dirty[1])
+            right = min(self.width, x + layer.x + dirty[2])
+            bottom = min(self.height, y + layer.y + dirty[3])
+            if right > left and bottom > top:
+                count += (right - left) * (bottom - top)
+        return count
+
+    def _push(self):
+        """Send whatever changed, taking as long as the bus would"""
+        if self._root_group is None:
+            pixels = 0
+        else:
+            pixels = self._dirty_pixels(self._root_group, self._root_group.x, self._root_group.y)
+        if self._full_redraw:
+            pixels = self.width * self.height
+            self._full_redraw = False
+        sent = pixels * self.bits_per_pixel // 8
+        self.bytes_sent += sent
+        self.refresh_count += 1
+        time.sleep(sent / self.bus.bytes_per_second + (0 if self.eink else self.refresh_time))
+        self._last_refresh = time.monotonic()
+
+    def _background(self):
+        if not self.eink and self.auto_refresh and time.monotonic() - self._last_refresh >= AUTO_REFRESH_INTERVAL:
+            self._push()
+
+    def refresh(self, *, target_frames_per_second=None, minimum_frames_per_second=0):
+        if self.eink:
+            if self.time_to_refresh > 0:
+                raise RuntimeError("Refresh too soon")
+            self._push()
+            now = time.monotonic()
+            self._busy_until = now + self.refresh_time
+            self._next_refresh = now + self.seconds_per_frame
+            return True
+        self._push()
+        return True
+
+
+def make_displayio_module():
+    module = FakeModule("displayio")
+    module.Bitmap = Bitmap
+    module.Palette = Palette
+    module.TileGrid = TileGrid
+    module.Group = Group
+    module.FourWire = FourWire
+    module.ParallelBus = ParallelBus
+    module.release_displays = lambda: None
+    return module
@@ -0,0 +1,100 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" A small HTTP/1.1 server for testing utils_wifi against, instead of a server on the internet.
+
+The fake socketpool sends requests for the canned test URLs here, so raw socket code works offline too.
+tools/local_http_server.py runs it on its own, for a board on your network to test against.
+It keeps connections open between requests, like most real servers.
+
+    GET /index.html     a short text page, like the default test URL
+    GET /bytes/<n>      n bytes of data, sent in pieces, so n can be far bigger than memory
+    POST /upload        reads and throws away the body, and answers with how many bytes arrived
+Plus any routes passed to start(), as path -> (status, headers, body). """
+
+import http.server
+import socket
+import threading
+import time
+
+PAGE = b"This is a test of Adafruit WiFi!\nIf you can read this, its working :)\n"
+# Bytes sent or read at a time for /bytes/<n> and /upload
+CHUNK_SIZE = 65536
+# Made once, so a server in the same process as a heap benchmark doesn't show up in it
+_ZEROS = memoryview(bytes(CHUNK_SIZE))
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    # Keep-alive needs HTTP/1.1
+    protocol_version = "HTTP/1.1"
+    # Milliseconds to wait before answering, like a server far away
+    delay_ms = 0
+    routes = {}
+
+    def setup(self):
+        super().setup()
+        # Otherwise the headers and body go out as two packets, and Nagle's algorithm holds the body
+        # until the client's delayed ACK, adding 40 ms to every keep-alive request
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send(self, status, headers, length):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+
+    def do_GET(self):
+        if self.delay_ms:
+            time.sleep(self.delay_ms / 1000)
+        if self.path in self.routes:
+            status, headers, body = self.routes[self.path]
+        elif self.path == "/index.html":
+            status, headers, body = 200, {"Content-Type": "text/html"}, PAGE
+        elif self.path.startswith("/bytes/") and self.path[7:].isdigit():
+            remaining = int(self.path[7:])
+            self._send(200, {"Content-Type": "application/octet-stream"}, remaining)
+            while remaining > 0:
+                self.wfile.write(_ZEROS[:remaining] if remaining < CHUNK_SIZE else _ZEROS)
+                remaining -= CHUNK_SIZE
+            return
+        else:
+            self.send_error(404)
+            return
+        self._send(status, headers, len(body))
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != "/upload":
+            self.send_error(404)
+            return
+        remaining = int(self.headers.get("Content-Length", 0))
+        received = 0
+        while remaining > 0:
+            data = self.rfile.read(min(remaining, CHUNK_SIZE))
+            if not data:
+                break
+            received += len(data)
+            remaining -= len(data)
+        if self.delay_ms:
+            time.sleep(self.delay_ms / 1000)
+        body = str(received).encode()
+        self._send(200, {"Content-Type": "text/plain"}, len(body))
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=0, delay_ms=0, routes=None):
+    handler = type("Handler", (Handler,), {"delay_ms": delay_ms, "routes": dict(routes or {})})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start(host="127.0.0.1", port=0, delay_ms=0, routes=None):
+    """Serve in a background thread. Returns (server, base URL). Call server.shutdown() to stop."""
+    server = make_server(host, port, delay_ms, routes)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://%s:%d" % (host, server.server_address[1])
@@ -0,0 +1,212 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Simulated I2C bus and devices.
+
+FakeI2C behaves like busio.I2C: lock it, then scan, writeto, readfrom_into or writeto_then_readfrom.
+Every transaction sleeps for roughly as long as it would take on a real bus at the given frequency,
+plus any extra latency you configure. Devices are register files, with optional NACKs and clock stretching. """
+
+import errno
+import random
+import time
+
+# Addresses busio.I2C.scan() probes
+SCAN_RANGE = range(0x08, 0x78)
+
+
+class FakeI2CDevice:
+    """A device with 256 byte registers and an auto-incrementing register pointer.
+    The first byte written selects the register. Any further bytes are written from there.
+
+    nack_rate:  chance that a transaction is NACKed
+    stretch_us: extra time the device holds the clock on every transaction"""
+
+    name = "i2c device"
+
+    def __init__(self, address, registers=None, nack_rate=0.0, stretch_us=0):
+        self.address = address
+        self.registers = bytearray(256)
+        for register, value in (registers or {}).items():
+            self.registers[register] = value
+        self.pointer = 0
+        self.nack_rate = nack_rate
+        self.stretch_us = stretch_us
+
+    def write(self, data):
+        if data:
+            self.pointer = data[0]
+            for value in data[1:]:
+                self.write_register(self.pointer, value)
+                self.pointer = (self.pointer + 1) & 0xFF
+
+    def read(self, buf):
+        for i in range(len(buf)):
+            buf[i] = self.read_register(self.pointer)
+            self.pointer = (self.pointer + 1) & 0xFF
+
+    def write_register(self, register, value):
+        self.registers[register] = value
+
+    def read_register(self, register):
+        return self.registers[register]
+
+
+def _chip_id_device(name, register, value):
+    class Device(FakeI2CDevice):
+        def __init__(self, address, **kwargs):
+            super().__init__(address, {register: value}, **kwargs)
+    Device.name = name
+    return Device
+
+
+def _crc8(data):
+    """Sensirion's CRC-8: polynomial 0x31, starting at 0xFF"""
+    crc = 0xFF
+    for value in data:
+        crc ^= value
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+class FakeSensirion(FakeI2CDevice):
+    """A Sensirion sensor, which has commands instead of registers.
+    Reading after the serial number command returns the serial number as two words, each followed by its CRC."""
+
+    serial_command = b"\x89"
+
+    def __init__(self, address, serial=0x12345678, **kwargs):
+        super().__init__(address, **kwargs)
+        self.serial = serial
+        self.answer = bytearray(6)
+
+    def write(self, data):
+        if bytes(data) == self.serial_command:
+            words = (self.serial >> 16, self.serial & 0xFFFF)
+            for i, word in enumerate(words):
+                pair = bytes((word >> 8, word & 0xFF))
+                self.answer[i * 3:i * 3 + 2] = pair
+                self.answer[i * 3 + 2] = _crc8(pair)
+        else:
+            self.answer[:] = bytes(6)
+
+    def read(self, buf):
+        for i in range(len(buf)):
+            buf[i] = self.answer[i] if i < len(self.answer) else 0xFF
+
+
+def _sensirion_device(name, command):
+    class Device(FakeSensirion):
+        serial_command = command
+    Device.name = name
+    return Device
+
+
+# Devices that identify themselves through an ID register or a serial number command
+DEVICE_TYPES = {
+    "bme280": _chip_id_device("bme280", 0xD0, 0x60),
+    "bmp280": _chip_id_device("bmp280", 0xD0, 0x58),
+    "lsm6ds33": _chip_id_device("lsm6ds33", 0x0F, 0x69),
+    "lis3mdl": _chip_id_device("lis3mdl", 0x0F, 0x3D),
+    "apds9960": _chip_id_device("apds9960", 0x92, 0xAB),
+    "adt7410": _chip_id_device("adt7410", 0x0B, 0xCB),
+    "sht30": _sensirion_device("sht30", b"\x37\x80"),
+    "sht4x": _sensirion_device("sht4x", b"\x89"),
+}
+
+
+class FakeI2C:
+    """Stand-in for busio.I2C.
+
+    frequency:        bus clock in Hz, which sets how long each byte takes
+    latency_us:       fixed cost of each transaction, on top of the bytes
+    lock_contention:  how many try_lock() calls fail before one succeeds, as if another task held the bus"""
+
+    def __init__(self, devices=(), frequency=100000, latency_us=50, lock_contention=0):
+        self.devices = {device.address: device for device in devices}
+        self.frequency = frequency
+        self.latency_us = latency_us
+        self.lock_contention = lock_contention
+        self.locked = False
+        self.transactions = 0
+        self.bytes_transferred = 0
+
+    def add_device(self, device):
+        self.devices[device.address] = device
+
+    def remove_device(self, address):
+        self.devices.pop(address, None)
+
+    # Locking
+
+    def try_lock(self):
+        if self.lock_contention > 0:
+            self.lock_contention -= 1
+            return False
+        if self.locked:
+            return False
+        self.locked = True
+        return True
+
+    def unlock(self):
+        self.locked = False
+
+    def deinit(self):
+        self.locked = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.deinit()
+
+    # Transactions
+
+    def _check_locked(self):
+        if not self.locked:
+            raise RuntimeError("Function requires lock")
+
+    def _transfer(self, address, length):
+        """Wait as long as the transaction would take, and return the device or raise the NACK"""
+        device = self.devices.get(address)
+        # Address byte, plus data bytes, 9 clocks each with the ACK bit
+        micros = self.latency_us + (1 + length) * 9 * 1000000 / self.frequency
+        if device is not None:
+            micros += device.stretch_us
+        time.sleep(micros / 1000000)
+        self.transactions += 1
+        self.bytes_transferred += length
+        if device is None or (device.nack_rate and random.random() < device.nack_rate):
+            raise OSError(errno.ENODEV, "No such device")
+        return device
+
+    def scan(self):
+        self._check_locked()
+        found = []
+        for address in SCAN_RANGE:
+            try:
+                self._transfer(address, 0)
+                found.append(address)
+            except OSError:
+                pass
+        return found
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        self._check_locked()
+        data = bytes(buffer[start:end])
+        self._transfer(address, len(data)).write(data)
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        self._check_locked()
+        view = memoryview(buffer)[start:end]
+        self._transfer(address, len(view)).read(view)
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, *, out_start=0, out_end=None,
+                              in_start=0, in_end=None):
+        self._check_locked()
+        data = bytes(buffer_out[out_start:out_end])
+        view = memoryview(buffer_in)[in_start:in_end]
+        device = self._transfer(address, len(data) + len(view))
+        device.write(data)
+        device.read(view)
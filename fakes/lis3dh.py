@@ -0,0 +1,212 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Simulated LIS3DH accelerometer, and a stand-in for the adafruit_lis3dh driver.
+
+FakeLIS3DH is an I2C device with the real chip's registers: WHO_AM_I, the data rate and range
+in CTRL_REG1 and CTRL_REG4, the 32 sample FIFO, and the OUT_X_L..OUT_Z_H data registers.
+Samples are produced at the configured data rate as wall-clock time passes, from a data
+source function you can replace. """
+
+import math
+import random
+import time
+
+from fakes import FakeModule
+from fakes.i2c import FakeI2CDevice
+
+STANDARD_GRAVITY = 9.806
+
+WHO_AM_I = 0x0F
+CTRL_REG1 = 0x20
+CTRL_REG4 = 0x23
+CTRL_REG5 = 0x24
+OUT_X_L = 0x28
+FIFO_CTRL_REG = 0x2E
+FIFO_SRC_REG = 0x2F
+
+FIFO_SIZE = 32
+
+# CTRL_REG1 output data rate bits (7:4) -> samples per second
+DATA_RATES = {0: 0, 1: 1, 2: 10, 3: 25, 4: 50, 5: 100, 6: 200, 7: 400, 8: 1620, 9: 1344}
+
+# CTRL_REG4 full scale bits (5:4) -> raw counts per G, as the adafruit_lis3dh driver uses them
+RANGE_DIVIDERS = (16380, 8190, 4096, 1365)
+
+
+def vibration(t):
+    """Default data source: gravity on z, plus a 50 Hz vibration and a little noise. Returns G."""
+    wobble = 0.2 * math.sin(2 * math.pi * 50 * t)
+    return (
+        wobble + random.gauss(0, 0.01),
+        0.5 * wobble + random.gauss(0, 0.01),
+        1.0 + random.gauss(0, 0.01),
+    )
+
+
+class FakeLIS3DH(FakeI2CDevice):
+    name = "lis3dh"
+
+    def __init__(self, address=0x18, source=vibration, **kwargs):
+        super().__init__(address, {WHO_AM_I: 0x33, CTRL_REG1: 0x07}, **kwargs)
+        self.source = source
+        self.fifo = []
+        self.overrun = False
+        self.samples_generated = 0
+        self._last_time = time.monotonic()
+        self._current = (0, 0, 0)
+
+    @property
+    def data_rate(self):
+        return DATA_RATES.get(self.registers[CTRL_REG1] >> 4, 0)
+
+    @property
+    def fifo_enabled(self):
+        return bool(self.registers[CTRL_REG5] & 0x40) and (self.registers[FIFO_CTRL_REG] >> 6) != 0
+
+    def _raw(self, g):
+        divider = RANGE_DIVIDERS[(self.registers[CTRL_REG4] >> 4) & 0x03]
+        return max(-32768, min(32767, int(g * divider)))
+
+    def _catch_up(self):
+        """Produce the samples the chip would have made since we last looked"""
+        rate = self.data_rate
+        if rate == 0:
+            self._last_time = time.monotonic()
+            return
+        now = time.monotonic()
+        count = int((now - self._last_time) * rate)
+        if count == 0:
+            return
+        self._last_time += count / rate
+        # Only the newest samples can survive in the FIFO, so don't bother making the rest
+        skipped = max(0, count - FIFO_SIZE)
+        self.samples_generated += skipped
+        if skipped and self.fifo_enabled:
+            self.overrun = True
+        for i in range(skipped, count):
+            t = self._last_time - (count - 1 - i) / rate
+            sample = tuple(self._raw(g) for g in self.source(t))
+            self.samples_generated += 1
+            self._current = sample
+            if self.fifo_enabled:
+                if len(self.fifo) >= FIFO_SIZE:
+                    self.fifo.pop(0)
+                    self.overrun = True
+                self.fifo.append(sample)
+
+    def _fifo_src(self):
+        self._catch_up()
+        # FSS (bits 4:0) is the number of unread samples. A full FIFO reads as 31 with OVRN set.
+        value = min(len(self.fifo), FIFO_SIZE - 1)
+        if not self.fifo:
+            value |= 0x20
+        if self.overrun or len(self.fifo) >= FIFO_SIZE:
+            value |= 0x40
+        return value
+
+    def read(self, buf):
+        # Bit 7 of the register address turns on auto-increment for multi-byte reads
+        register = self.pointer & 0x7F
+        if register == OUT_X_L:
+            self._catch_up()
+            for offset in range(0, len(buf) - len(buf) % 6, 6):
+                if self.fifo_enabled and self.fifo:
+                    # Reading a sample clears the overrun flag, like the real chip
+                    sample = self.fifo.pop(0)
+                    self.overrun = False
+                else:
+                    sample = self._current
+                for axis in range(3):
+                    value = sample[axis] & 0xFFFF
+                    buf[offset + axis * 2] = value & 0xFF
+                    buf[offset + axis * 2 + 1] = value >> 8
+            return
+        if register == FIFO_SRC_REG:
+            buf[0] = self._fifo_src()
+            return
+        self.pointer = register
+        super().read(buf)
+
+    def write(self, data):
+        if data:
+            data = bytes([data[0] & 0x7F]) + bytes(data[1:])
+        super().write(data)
+        if len(data) > 1 and data[0] in (CTRL_REG1, CTRL_REG5, FIFO_CTRL_REG):
+            # Changing the mode empties the FIFO, like the real chip
+            self._catch_up()
+            self.fifo = []
+            self.overrun = False
+
+
+def make_driver_module():
+    """Build a stand-in for the adafruit_lis3dh module that talks to FakeLIS3DH over the fake bus"""
+    module = FakeModule("adafruit_lis3dh")
+    module.STANDARD_GRAVITY = STANDARD_GRAVITY
+    module.RANGE_2_G, module.RANGE_4_G, module.RANGE_8_G, module.RANGE_16_G = 0, 1, 2, 3
+    module.DATARATE_1_HZ, module.DATARATE_10_HZ, module.DATARATE_25_HZ = 1, 2, 3
+    module.DATARATE_50_HZ, module.DATARATE_100_HZ, module.DATARATE_200_HZ = 4, 5, 6
+    module.DATARATE_400_HZ, module.DATARATE_LOWPOWER_1K6HZ, module.DATARATE_1344_HZ = 7, 8, 9
+
+    class LIS3DH_I2C:
+        def __init__(self, i2c, *, address=0x18, int1=None, int2=None):
+            self._i2c = i2c
+            self._address = address
+            if self._read(WHO_AM_I, 1)[0] != 0x33:
+                raise RuntimeError("Failed to find LIS3DH!")
+            # Same defaults as the driver: 400 Hz, all axes, high resolution
+            self._write(CTRL_REG1, 0x77)
+            self._write(CTRL_REG4, 0x88)
+
+        def _read(self, register, length):
+            buf = bytearray(length)
+            while not self._i2c.try_lock():
+                pass
+            try:
+                self._i2c.writeto_then_readfrom(self._address, bytes([register | 0x80]), buf)
+            finally:
+                self._i2c.unlock()
+            return buf
+
+        def _write(self, register, value):
+            while not self._i2c.try_lock():
+                pass
+            try:
+                self._i2c.writeto(self._address, bytes([register, value]))
+            finally:
+                self._i2c.unlock()
+
+        @property
+        def range(self):
+            return (self._read(CTRL_REG4, 1)[0] >> 4) & 0x03
+
+        @range.setter
+        def range(self, value):
+            current = self._read(CTRL_REG4, 1)[0]
+            self._write(CTRL_REG4, (current & ~0x30) | (value << 4))
+
+        @property
+        def data_rate(self):
+            return self._read(CTRL_REG1, 1)[0] >> 4
+
+        @data_rate.setter
+        def data_rate(self, value):
+            current = self._read(CTRL_REG1, 1)[0]
+            self._write(CTRL_REG1, (current & 0x0F) | (value << 4))
+
+        @property
+        def acceleration(self):
+            divider = RANGE_DIVIDERS[self.range]
+            raw = self._read(OUT_X_L, 6)
+            values = []
+            for axis in range(3):
+                value = raw[axis * 2] | (raw[axis * 2 + 1] << 8)
+                if value & 0x8000:
+                    value -= 0x10000
+                values.append(value / divider * STANDARD_GRAVITY)
+            return tuple(values)
+
+    module.LIS3DH_I2C = LIS3DH_I2C
+    # The real module exposes its base class as lis3dh
+    module.lis3dh = LIS3DH_I2C
+    return module
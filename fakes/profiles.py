@@ -0,0 +1,207 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Board profiles for the fakes package.
+
+Each profile describes one board: what os.uname(), microcontroller.cpu, gc and os.statvfs() report,
+which GPIOs exist and which board aliases point at them, the I2C buses and the
+devices on them, the built-in display, and whether it has native wifi.
+Pin names follow the boards' CircuitPython definitions, trimmed to the ones that matter here. """
+
+
+def _numbered(prefix, gpios):
+    """{gpio: [prefix0], ...} for gpios in order"""
+    return {gpio: [prefix + str(i)] for i, gpio in enumerate(gpios)}
+
+
+def _merge(*maps):
+    """Merge several {gpio: [aliases]} maps, keeping every alias"""
+    merged = {}
+    for pin_map in maps:
+        for gpio, aliases in pin_map.items():
+            merged.setdefault(gpio, []).extend(aliases)
+    return merged
+
+
+# Access points the fake wifi radio can see, as (ssid, bssid, channel, rssi, authmode).
+# rssi is the average; each scan adds some noise.
+DEFAULT_NETWORKS = (
+    ("HomeNetwork", b"\x12\x34\x56\x78\x9a\x01", 6, -48, "WPA2_PSK"),
+    ("HomeNetwork", b"\x12\x34\x56\x78\x9a\x02", 36, -61, "WPA2_PSK"),
+    ("Neighbor-2G", b"\x22\x33\x44\x55\x66\x77", 1, -72, "WPA2_PSK"),
+    ("CoffeeShop", b"\x0a\x0b\x0c\x0d\x0e\x0f", 11, -80, "OPEN"),
+    ("PrinterDirect", b"\x5c\x5d\x5e\x5f\x60\x61", 6, -77, "WPA2_PSK"),
+    ("IoT-Lab", b"\xa0\xa1\xa2\xa3\xa4\xa5", 3, -69, "WPA2_PSK"),
+)
+
+PROFILES = {
+    "magtag": {
+        "board_id": "adafruit_magtag_2.9_grayscale",
+        "machine": "Adafruit MagTag with ESP32S2",
+        "sysname": "ESP32S2",
+        "release": "9.0.0",
+        "cpu_frequency": 240000000,
+        "cpu_temperature": 33.5,
+        "cpu_voltage": None,
+        "nvm_size": 8192,
+        "heap_size": 2000000,
+        "filesystem_size": 983040,
+        "pins": _merge(
+            {
+                "GPIO1": ["NEOPIXEL"], "GPIO3": ["LIGHT"], "GPIO4": ["BATTERY", "VOLTAGE_MONITOR"],
+                "GPIO5": ["EPD_BUSY"], "GPIO6": ["EPD_RESET"], "GPIO7": ["EPD_DC"], "GPIO8": ["EPD_CS"],
+                "GPIO9": ["ACCELEROMETER_INTERRUPT"], "GPIO10": ["A2", "D10"], "GPIO11": ["BUTTON_D", "D11"],
+                "GPIO12": ["BUTTON_C", "D12"], "GPIO13": ["D13", "LED"], "GPIO14": ["BUTTON_B", "D14"],
+                "GPIO15": ["BUTTON_A", "D15"], "GPIO16": ["SPEAKER_ENABLE"], "GPIO17": ["A0", "SPEAKER"],
+                "GPIO18": ["A1", "AD1"], "GPIO21": ["NEOPIXEL_POWER"], "GPIO33": ["SDA"], "GPIO34": ["SCL"],
+                "GPIO35": ["MOSI"], "GPIO36": ["SCK"], "GPIO37": ["MISO"],
+            },
+        ),
+        "gpios": ["GPIO%d" % i for i in range(47)],
+        "i2c": {"I2C": ("SCL", "SDA")},
+        "i2c_devices": {"SCL": [("lis3dh", 0x19)]},
+        "display": {"width": 296, "height": 128, "rotation": 270, "bus": "FourWire", "eink": True},
+        "wifi": "native",
+        "ble": False,
+    },
+    "clue": {
+        "board_id": "clue_nrf52840_express",
+        "machine": "Adafruit CLUE nRF52840 Express with nRF52840",
+        "sysname": "nRF52840",
+        "release": "9.0.0",
+        "cpu_frequency": 64000000,
+        "cpu_temperature": 28.25,
+        "cpu_voltage": 3.3,
+        "nvm_size": 8192,
+        "heap_size": 180000,
+        "filesystem_size": 2031616,
+        "pins": _merge(
+            {
+                "P0_04": ["A2", "D2"], "P0_05": ["A3", "D3"], "P0_03": ["A4", "D4"], "P0_28": ["A5", "D10"],
+                "P0_29": ["A6", "D12"], "P0_30": ["A7", "D1", "RX"], "P0_02": ["A0", "D0", "TX"],
+                "P0_31": ["A1"], "P1_02": ["D5", "BUTTON_A"], "P1_10": ["D11", "BUTTON_B"],
+                "P1_00": ["D6", "SPEAKER"], "P1_11": ["D7"], "P0_16": ["D16", "NEOPIXEL"],
+                "P1_09": ["D17", "LED", "L"], "P0_10": ["D18", "WHITE_LEDS"], "P0_25": ["SCL", "D19"],
+                "P0_24": ["SDA", "D20"], "P0_08": ["SCK", "D13"], "P0_26": ["MOSI", "D15"],
+                "P0_06": ["MISO", "D14"], "P0_01": ["MICROPHONE_DATA"], "P0_00": ["MICROPHONE_CLOCK"],
+                "P1_05": ["TFT_RESET"], "P1_14": ["TFT_SCK"], "P1_15": ["TFT_MOSI"], "P1_12": ["TFT_CS"],
+                "P1_13": ["TFT_DC"], "P1_07": ["TFT_BACKLIGHT"], "P1_06": ["ACCELEROMETER_GYRO_INTERRUPT"],
+                "P0_09": ["PROXIMITY_LIGHT_INTERRUPT"],
+            },
+        ),
+        "gpios": ["P0_%02d" % i for i in range(32)] + ["P1_%02d" % i for i in range(16)],
+        "i2c": {"I2C": ("SCL", "SDA")},
+        "i2c_devices": {"SCL": [("lsm6ds33", 0x6A), ("lis3mdl", 0x1C), ("apds9960", 0x39),
+                                ("sht30", 0x44), ("bmp280", 0x77)]},
+        "display": {"width": 240, "height": 240, "rotation": 0, "bus": "FourWire", "eink": False},
+        "wifi": None,
+        "ble": True,
+    },
+    "qtpy_m0": {
+        "board_id": "qtpy_m0",
+        "machine": "Adafruit QT Py M0 with samd21e18",
+        "sysname": "samd21",
+        "release": "9.0.0",
+        "cpu_frequency": 48000000,
+        "cpu_temperature": 26.8,
+        "cpu_voltage": 3.29,
+        "nvm_size": 256,
+        "heap_size": 20000,
+        "filesystem_size": 65536,
+        "pins": _merge(
+            _numbered("A", ["PA02", "PA03", "PA04", "PA05", "PA16", "PA17", "PA06", "PA07", "PA11", "PA09", "PA10"]),
+            _numbered("D", ["PA02", "PA03", "PA04", "PA05", "PA16", "PA17", "PA06", "PA07", "PA11", "PA09", "PA10"]),
+            {"PA16": ["SDA"], "PA17": ["SCL"], "PA06": ["TX"], "PA07": ["RX"], "PA11": ["SCK"],
+             "PA09": ["MISO"], "PA10": ["MOSI"], "PA18": ["NEOPIXEL"], "PA15": ["NEOPIXEL_POWER"]},
+        ),
+        "gpios": ["PA%02d" % i for i in range(32)],
+        "i2c": {"I2C": ("SCL", "SDA")},
+        "i2c_devices": {"SCL": [("sht4x", 0x44)]},
+        "display": None,
+        "wifi": None,
+        "ble": False,
+    },
+    "qtpy_esp32s3": {
+        "board_id": "adafruit_qtpy_esp32s3_nopsram",
+        "machine": "Adafruit QT Py ESP32S3 no psram with ESP32S3",
+        "sysname": "ESP32S3",
+        "release": "9.0.0",
+        "cpu_frequency": 240000000,
+        "cpu_temperature": 41.0,
+        "cpu_voltage": None,
+        "nvm_size": 8192,
+        "heap_size": 160000,
+        "filesystem_size": 1376256,
+        "pins": _merge(
+            {
+                "GPIO18": ["A0", "D18"], "GPIO17": ["A1", "D17"], "GPIO9": ["A2", "D9"], "GPIO8": ["A3", "D8"],
+                "GPIO7": ["SDA", "D7"], "GPIO6": ["SCL", "D6"], "GPIO5": ["TX", "D5"], "GPIO16": ["RX", "D16"],
+                "GPIO36": ["SCK", "D36"], "GPIO37": ["MISO", "D37"], "GPIO35": ["MOSI", "D35"],
+                "GPIO41": ["SDA1"], "GPIO40": ["SCL1"], "GPIO0": ["BUTTON", "BOOT0", "D0"],
+                "GPIO39": ["NEOPIXEL"], "GPIO38": ["NEOPIXEL_POWER"],
+            },
+        ),
+        "gpios": ["GPIO%d" % i for i in range(49)],
+        "i2c": {"I2C": ("SCL", "SDA"), "STEMMA_I2C": ("SCL1", "SDA1")},
+        "i2c_devices": {"SCL1": [("bme280", 0x77), ("sht4x", 0x44), ("lis3dh", 0x18)]},
+        "display": None,
+        "wifi": "native",
+        "ble": False,
+    },
+    "pyportal_titano": {
+        "board_id": "pyportal_titano",
+        "machine": "Adafruit PyPortal Titano with samd51j20",
+        "sysname": "samd51",
+        "release": "9.0.0",
+        "cpu_frequency": 120000000,
+        "cpu_temperature": 35.1,
+        "cpu_voltage": 3.3,
+        "nvm_size": 8192,
+        "heap_size": 190000,
+        "filesystem_size": 8323072,
+        "pins": _merge(
+            {
+                "PA02": ["AUDIO_OUT", "A0", "SPEAKER"], "PA04": ["A1", "D3"], "PA05": ["A3", "D4"],
+                "PA07": ["A2", "LIGHT"], "PB05": ["A4", "TOUCH_YD"], "PB06": ["A5", "TOUCH_XL"],
+                "PB07": ["A6", "TOUCH_YU"], "PB08": ["A7", "TOUCH_XR"], "PB22": ["D13", "L", "LED"],
+                "PB23": ["NEOPIXEL", "D2"], "PA27": ["SPEAKER_ENABLE"], "PB09": ["SD_CARD_DETECT"],
+                "PB30": ["SD_CS"], "PA12": ["SCK"], "PA14": ["MISO"], "PA13": ["MOSI"],
+                "PB03": ["SCL"], "PB02": ["SDA"], "PB14": ["ESP_BUSY"], "PB15": ["ESP_CS"],
+                "PB17": ["ESP_RESET"], "PB16": ["ESP_GPIO0"], "PB13": ["ESP_RTS"], "PB12": ["ESP_TX"],
+                "PB29": ["ESP_RX"], "PB31": ["TFT_BACKLIGHT"], "PB21": ["TFT_CS"], "PB10": ["TFT_DC"],
+                "PA00": ["TFT_RESET"], "PB04": ["TFT_RD"], "PB01": ["TFT_TE"], "PB11": ["TFT_WR"],
+            },
+            _numbered("LCD_DATA", ["PA%02d" % i for i in range(16, 24)]),
+        ),
+        "gpios": ["PA%02d" % i for i in range(32)] + ["PB%02d" % i for i in range(32)],
+        "i2c": {"I2C": ("SCL", "SDA")},
+        "i2c_devices": {"SCL": [("adt7410", 0x48)]},
+        "display": {"width": 480, "height": 320, "rotation": 0, "bus": "ParallelBus", "eink": False},
+        "wifi": "esp32spi",
+        "ble": False,
+    },
+    "pico": {
+        "board_id": "raspberry_pi_pico",
+        "machine": "Raspberry Pi Pico with rp2040",
+        "sysname": "rp2040",
+        "release": "9.0.0",
+        "cpu_frequency": 125000000,
+        "cpu_temperature": 27.6,
+        "cpu_voltage": 3.3,
+        "nvm_size": 4096,
+        "heap_size": 190000,
+        "filesystem_size": 1044480,
+        "pins": _merge(
+            {"GPIO%d" % i: ["GP%d" % i] for i in range(29)},
+            {"GPIO25": ["LED"], "GPIO26": ["A0", "GP26_A0"], "GPIO27": ["A1", "GP27_A1"],
+             "GPIO28": ["A2", "GP28_A2"], "GPIO29": ["A3", "VOLTAGE_MONITOR"], "GPIO24": ["VBUS_SENSE"],
+             "GPIO23": ["SMPS_MODE"]},
+        ),
+        "gpios": ["GPIO%d" % i for i in range(30)],
+        "i2c": {},
+        "i2c_devices": {},
+        "display": None,
+        "wifi": None,
+        "ble": False,
+    },
+}
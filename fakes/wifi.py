@@ -0,0 +1,442 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Simulated wifi radio, plus socketpool and adafruit_requests stand-ins.
+
+The radio connects to the access points in its list, scans them with some RSSI noise,
+and answers pings with a configurable latency and loss rate.
+socketpool hands out real sockets, so requests can reach a server on your computer.
+adafruit_requests.Session speaks plain HTTP/1.1 over those sockets, reusing connections
+like the real library, and also answers from canned routes so the default test URLs work offline. """
+
+import ipaddress
+import random
+import socket
+import time
+
+from fakes import FakeModule
+
+
+class Network:
+    """What wifi.Radio.start_scanning_networks() yields"""
+
+    def __init__(self, ssid, bssid, channel, rssi, authmode, country="US"):
+        self.ssid = ssid
+        self.bssid = bssid
+        self.channel = channel
+        self.rssi = rssi
+        self.authmode = authmode
+        self.country = country
+
+
+class FakeRadio:
+    """Stand-in for wifi.radio.
+
+    networks:       access points, as (ssid, bssid, channel, rssi, authmode)
+    password:       password every access point accepts. None accepts anything.
+    connect_delay:  seconds a connect takes
+    ping_ms:        average ping time, with ping_jitter_ms of spread
+    ping_loss:      chance that a ping gets no answer
+    scan_delay:     seconds each network takes to show up during a scan
+    rssi_noise:     standard deviation of the RSSI noise added to each scan result
+    throughput:     bytes per second for canned HTTP responses. Real sockets go as fast as they go."""
+
+    def __init__(self, networks, password=None, connect_delay=0.05, ping_ms=25.0, ping_jitter_ms=5.0,
+                 ping_loss=0.0, scan_delay=0.002, rssi_noise=3.0, throughput=250000):
+        self.networks = list(networks)
+        self.password = password
+        self.connect_delay = connect_delay
+        self.ping_ms = ping_ms
+        self.ping_jitter_ms = ping_jitter_ms
+        self.ping_loss = ping_loss
+        self.scan_delay = scan_delay
+        self.rssi_noise = rssi_noise
+        self.throughput = throughput
+        self.enabled = True
+        self.connected = False
+        self.mac_address = b"\x7c\xdf\xa1\x00\x11\x22"
+        self.hostname = "cpy-fake"
+        self.ipv4_address = None
+        self.ipv4_gateway = None
+        self.ipv4_subnet = None
+        self.ipv4_dns = None
+        self.ap_info = None
+        self._scanning = False
+
+    def _scan_result(self, entry):
+        ssid, bssid, channel, rssi, authmode = entry
+        noisy = int(round(rssi + random.gauss(0, self.rssi_noise))) if self.rssi_noise else rssi
+        return Network(ssid, bssid, channel, noisy, authmode)
+
+    def connect(self, ssid, password="", *, channel=0, bssid=None, timeout=None):
+        if not self.enabled:
+            raise RuntimeError("Wifi is not enabled")
+        time.sleep(self.connect_delay)
+        candidates = [entry for entry in self.networks if entry[0] == ssid]
+        if not candidates:
+            raise ConnectionError("No network with that ssid")
+        if self.password is not None and password != self.password:
+            raise ConnectionError("Authentication failure")
+        best = max(candidates, key=lambda entry: entry[3])
+        self.connected = True
+        self.ap_info = self._scan_result(best)
+        self.ipv4_address = ipaddress.IPv4Address("192.168.1.42")
+        self.ipv4_gateway = ipaddress.IPv4Address("192.168.1.1")
+        self.ipv4_subnet = ipaddress.IPv4Address("255.255.255.0")
+        self.ipv4_dns = ipaddress.IPv4Address("192.168.1.1")
+
+    def disconnect(self):
+        self.connected = False
+        self.ap_info = None
+        self.ipv4_address = None
+
+    def start_scanning_networks(self, *, start_channel=1, stop_channel=11):
+        if self._scanning:
+            raise RuntimeError("Already scanning for wifi networks")
+        self._scanning = True
+        return self._scan()
+
+    def _scan(self):
+        for entry in self.networks:
+            if not self._scanning:
+                return
+            time.sleep(self.scan_delay)
+            yield self._scan_result(entry)
+
+    def stop_scanning_networks(self):
+        self._scanning = False
+
+    def ping(self, ip, *, timeout=0.5):
+        if not self.connected:
+            return None
+        delay = max(0.001, random.gauss(self.ping_ms, self.ping_jitter_ms) / 1000)
+        if random.random() < self.ping_loss or delay > timeout:
+            time.sleep(timeout)
+            return None
+        time.sleep(delay)
+        return delay
+
+
+def make_wifi_module(radio):
+    module = FakeModule("wifi")
+    module.radio = radio
+    module.Network = Network
+    module.Radio = FakeRadio
+    return module
+
+
+class SocketPool:
+    """Stand-in for socketpool.SocketPool. Sockets are real, so they can reach servers on this computer."""
+
+    AF_INET = socket.AF_INET
+    SOCK_STREAM = socket.SOCK_STREAM
+    SOCK_DGRAM = socket.SOCK_DGRAM
+    IPPROTO_TCP = socket.IPPROTO_TCP
+    timeout = socket.timeout
+    gaierror = socket.gaierror
+
+    def __init__(self, radio):
+        self.radio = radio
+        self.sockets_created = 0
+        self.lookups = 0
+
+    def socket(self, family=socket.AF_INET, type=socket.SOCK_STREAM, proto=0):
+        self.sockets_created += 1
+        sock = FakeSocket(family, type, proto)
+        sock.radio = self.radio
+        return sock
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        # Looking up a name costs a round trip to the DNS server. IP addresses don't need one.
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            self.lookups += 1
+            time.sleep(self.radio.ping_ms / 1000)
+        if host in _canned_hosts():
+            # The canned test URLs are answered by a local server, so sockets reach them offline
+            return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", _canned_server_address())]
+        return socket.getaddrinfo(host, port, family, type, proto, flags)
+
+
+class FakeSocket(socket.socket):
+    """A real socket that takes the radio's round trip time where a board would wait for one:
+    in connect(), like the TCP handshake, and for the first bytes of each answer after sending a request.
+    Data goes no faster than the radio's throughput, in either direction."""
+
+    radio = None
+    _sent = False
+    # Seconds of transfer time owed, slept off once there's a millisecond or more
+    _owed = 0.0
+
+    def _round_trip(self):
+        if self.radio is not None:
+            time.sleep(self.radio.ping_ms / 1000)
+
+    def _transfer(self, count):
+        if self.radio is not None and self.radio.throughput:
+            self._owed += count / self.radio.throughput
+            if self._owed >= 0.001:
+                time.sleep(self._owed)
+                self._owed = 0.0
+        return count
+
+    def connect(self, address):
+        self._round_trip()
+        super().connect(address)
+
+    def send(self, data, *args):
+        self._sent = True
+        return self._transfer(super().send(data, *args))
+
+    def sendall(self, data, *args):
+        self._sent = True
+        super().sendall(data, *args)
+        self._transfer(len(data))
+
+    def recv_into(self, buffer, *args):
+        if self._sent:
+            self._sent = False
+            self._round_trip()
+        return self._transfer(super().recv_into(buffer, *args))
+
+    def recv(self, size, *args):
+        if self._sent:
+            self._sent = False
+            self._round_trip()
+        data = super().recv(size, *args)
+        self._transfer(len(data))
+        return data
+
+
+def make_socketpool_module():
+    module = FakeModule("socketpool")
+    module.SocketPool = SocketPool
+    return module
+
+
+# Canned answers for URLs the utilities use by default, as url -> (status, headers, body)
+DEFAULT_ROUTES = {
+    "http://wifitest.adafruit.com/testwifi/index.html": (
+        200,
+        {"content-type": "text/html"},
+        b"This is a test of Adafruit WiFi!\nIf you can read this, its working :)\n",
+    ),
+}
+
+
+_canned_server = None
+
+
+def _canned_hosts():
+    return {url.partition("//")[2].partition("/")[0] for url in DEFAULT_ROUTES}
+
+
+def _canned_server_address():
+    """Start the server for DEFAULT_ROUTES the first time it's needed, and return its address"""
+    global _canned_server
+    if _canned_server is None:
+        from fakes import http_server
+        routes = {"/" + url.partition("//")[2].partition("/")[2]: route for url, route in DEFAULT_ROUTES.items()}
+        _canned_server, _ = http_server.start(routes=routes)
+    return _canned_server.server_address
+
+
+class Response:
+    """Stand-in for adafruit_requests.Response"""
+
+    def __init__(self, status_code, headers, body=None, socket=None, remaining=None, session=None, key=None,
+                 throughput=None):
+        self.status_code = status_code
+        self._throughput = throughput
+        self.reason = b""
+        self.headers = headers
+        self._body = body
+        self.socket = socket
+        self._remaining = remaining
+        self._session = session
+        self._key = key
+
+    def _read_into(self, buf):
+        """Read up to len(buf) bytes of body. Returns the count, 0 at the end."""
+        if self._remaining == 0:
+            return 0
+        view = memoryview(buf)
+        if self._remaining is not None:
+            view = view[:self._remaining]
+        count = self.socket.recv_into(view)
+        if self._remaining is not None:
+            self._remaining -= count
+        if count == 0 or self._remaining == 0:
+            self._release()
+        return count
+
+    def _release(self):
+        if self._session is not None:
+            if self._remaining == 0:
+                self._session._free_socket(self._key, self.socket)
+            else:
+                self._session._close_socket(self._key, self.socket)
+            self._session = None
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        if self._body is not None:
+            for start in range(0, len(self._body), chunk_size):
+                chunk = self._body[start:start + chunk_size]
+                if self._throughput:
+                    time.sleep(len(chunk) / self._throughput)
+                yield chunk
+            return
+        buf = bytearray(chunk_size)
+        while True:
+            count = self._read_into(buf)
+            if count == 0:
+                return
+            yield bytes(buf[:count])
+
+    @property
+    def content(self):
+        if self._throughput:
+            time.sleep(len(self._body) / self._throughput)
+            self._throughput = None
+        if self._body is None:
+            self._body = b"".join(self.iter_content(4096))
+            self.socket = None
+        return self._body
+
+    @property
+    def text(self):
+        return self.content.decode()
+
+    def json(self):
+        import json
+        return json.loads(self.content)
+
+    def close(self):
+        if self._session is not None:
+            self._session._close_socket(self._key, self.socket)
+            self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Session:
+    """Stand-in for adafruit_requests.Session. Plain HTTP/1.1 with keep-alive, one open socket per host."""
+
+    def __init__(self, socket_pool, ssl_context=None, session_id=None):
+        self._pool = socket_pool
+        self._ssl_context = ssl_context
+        self._open_sockets = {}
+        self.routes = dict(DEFAULT_ROUTES)
+        self.sockets_opened = 0
+
+    def _free_socket(self, key, sock):
+        self._open_sockets[key] = sock
+
+    def _close_socket(self, key, sock):
+        if self._open_sockets.get(key) is sock:
+            del self._open_sockets[key]
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def _connect(self, proto, host, port, timeout):
+        key = (proto, host, port)
+        sock = self._open_sockets.pop(key, None)
+        if sock is not None:
+            return key, sock
+        info = self._pool.getaddrinfo(host, port, 0, self._pool.SOCK_STREAM)[0]
+        sock = self._pool.socket(info[0], info[1], info[2])
+        sock.settimeout(timeout)
+        sock.connect(info[-1])
+        if proto == "https:":
+            sock = self._ssl_context.wrap_socket(sock, server_hostname=host)
+        self.sockets_opened += 1
+        return key, sock
+
+    def request(self, method, url, data=None, json=None, headers=None, stream=False, timeout=60):
+        if url in self.routes and method == "GET":
+            status, route_headers, body = self.routes[url]
+            # A round trip, plus the time the body takes over the air. A streamed
+            # response takes that time as each chunk is read instead.
+            radio = self._pool.radio
+            time.sleep(radio.ping_ms / 1000 + (0 if stream else len(body) / radio.throughput))
+            headers = dict(route_headers)
+            headers["content-length"] = str(len(body))
+            return Response(status, headers, body, throughput=radio.throughput if stream else None)
+
+        proto, _, host_port_path = url.partition("//")
+        host_port, _, path = host_port_path.partition("/")
+        host, _, port = host_port.partition(":")
+        port = int(port) if port else (443 if proto == "https:" else 80)
+
+        if json is not None:
+            import json as json_module
+            data = json_module.dumps(json)
+        if isinstance(data, str):
+            data = data.encode()
+
+        key, sock = self._connect(proto, host, port, timeout)
+        lines = ["%s /%s HTTP/1.1" % (method, path), "Host: " + host, "User-Agent: Adafruit CircuitPython"]
+        for name, value in (headers or {}).items():
+            lines.append("%s: %s" % (name, value))
+        if data is not None:
+            lines.append("Content-Length: %d" % len(data))
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode()
+        try:
+            sock.sendall(request)
+            if data is not None:
+                sock.sendall(data)
+            status, response_headers = _read_head(sock)
+        except OSError:
+            self._close_socket(key, sock)
+            raise
+
+        length = response_headers.get("content-length")
+        response = Response(status, response_headers, socket=sock, session=self, key=key,
+                            remaining=int(length) if length is not None else None)
+        if length is not None and int(length) == 0:
+            response._release()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+
+def _read_head(sock):
+    """Read the status line and headers one byte at a time, so the body stays in the socket"""
+    head = bytearray()
+    one = bytearray(1)
+    while not head.endswith(b"\r\n\r\n"):
+        if sock.recv_into(one) == 0:
+            raise OSError("connection closed before the response headers")
+        head += one
+    lines = bytes(head).decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    return status, headers
+
+
+def make_requests_module():
+    module = FakeModule("adafruit_requests")
+    module.Session = Session
+    module.Response = Response
+    return module
@@ -0,0 +1,310 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Line up what utils_sampler logged with saved benchmark and network probe results, to see whether
+a slow run happened while the board was throttled, hot, short of memory or its supply sagged.
+
+Copy the files off CIRCUITPY, or save the board's serial output with a utils_sampler dump() in it, then:
+
+    python tools/align_log.py samples.bin benchmarks.jsonl probes.jsonl
+    python tools/align_log.py serial.log benchmarks.jsonl
+
+Results from utils_benchmark.save_results() and LatencyProbe.save_results() carry time.time() and
+utils_ticks.ticks_ms() read together, as does each sampler session, so the boot each came from can be
+worked out. ticks_ms() starts again from 0 about every 6 days, so boots are only told apart up to that. Within a boot, each benchmark and probe run's start and end pick out the samples taken
+during it, or the nearest ones if none were. Shows the conditions for each run, then, for
+anything run at least three times, how closely its speed followed each condition.
+"""
+
+import argparse
+import calendar
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import utils_sampler
+import utils_ticks
+
+# Seconds two boot times can differ by and still be the same boot. The board's clock only has seconds.
+TOLERANCE = 3.0
+# A window whose samples go below this fraction of the boot's usual voltage is flagged
+SAG = 0.95
+# Samples this many ms either side of a window still count as during it, for the ones
+# run_benchmark() takes right before and after each benchmark
+SLACK_MS = 2
+WRAP = utils_ticks.TICKS_PERIOD
+
+
+class Window:
+    """One benchmark or probe target's result, and the samples taken while it ran"""
+
+    def __init__(self, kind, name, value, unit, record, start_ms, end_ms):
+        self.kind = kind
+        self.name = name
+        self.value = value
+        self.unit = unit
+        self.board_id = record.get("board_id")
+        self.release = record.get("release")
+        # When the board booted, by its clock
+        self.boot = record["time"] - record["monotonic_ms"] / 1000
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.session = None
+        self.ambiguous = False
+        self.samples = []
+
+
+def parse_dumps(lines):
+    """Sessions printed by SystemSampler.dump(), in the same form as utils_sampler.decode()"""
+    sessions = []
+    session = None
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+        if fields[0] == "SAMPLES" and len(fields) >= 5:
+            if int(fields[1]) != utils_sampler.FORMAT_VERSION:
+                raise ValueError("unsupported sample dump version " + fields[1])
+            session = {"time": tuple(int(field) for field in fields[2].split("-")), "monotonic_ms": int(fields[3]), "interval_ms": int(fields[4]),
+                       "board_id": fields[5] if len(fields) > 5 else "", "release": fields[6] if len(fields) > 6 else "",
+                       "records": []}
+        elif session is None:
+            continue
+        elif fields[0] == "END":
+            sessions.append(session)
+            session = None
+        elif len(fields) == 5:
+            ms, mhz, temperature, voltage, mem_free = (int(field) for field in fields)
+            session["records"].append((ms, mhz,
+                                       None if temperature == utils_sampler._NO_TEMPERATURE else temperature / 100,
+                                       None if voltage == utils_sampler._NO_VOLTAGE else voltage / 1000, mem_free))
+    return sessions
+
+
+def load(paths):
+    """Returns (sessions, benchmark records, probe records) from every file"""
+    sessions = []
+    benchmarks = []
+    probes = []
+    for path in paths:
+        with open(path, "rb") as file:
+            data = file.read()
+        if data.startswith(utils_sampler.MAGIC):
+            sessions.extend(utils_sampler.decode(data))
+            continue
+        text = data.decode("utf-8", errors="replace")
+        if "SAMPLES " in text:
+            sessions.extend(parse_dumps(text.splitlines()))
+            continue
+        for line in text.splitlines():
+            line = line.strip()
+            if not line.startswith("{"):
+                continue
+            record = json.loads(line)
+            if "results" in record:
+                benchmarks.append(record)
+            elif "targets" in record:
+                probes.append(record)
+    for session in sessions:
+        # The board's clock has no time zone, so its fields are read back the way it counts them
+        session["boot"] = calendar.timegm(session["time"]) - session["monotonic_ms"] / 1000
+    return sessions, benchmarks, probes
+
+
+def windows(benchmarks, probes):
+    """A Window for each benchmark in each run, and each target in each probe run. Skips runs saved
+    before results had their times."""
+    result = []
+    skipped = 0
+    for record in benchmarks:
+        if "monotonic_ms" not in record:
+            skipped += 1
+            continue
+        for name, stats in record["results"].items():
+            if "start_ms" in stats:
+                result.append(Window("bench", name, stats["median"], "ns", record, stats["start_ms"], stats["end_ms"]))
+    for record in probes:
+        if record.get("start_ms") is None:
+            skipped += 1
+            continue
+        for row in record["targets"]:
+            result.append(Window("probe", row["target"], row["mean_ms"], "ms", record,
+                                 record["start_ms"], record["end_ms"]))
+    return result, skipped
+
+
+def _samples_for(session, start_ms, end_ms):
+    """The samples taken between start_ms and end_ms. If there weren't any, the nearest one on either
+    side, if it's within two intervals."""
+    start_ms = (start_ms - SLACK_MS) % WRAP
+    end_ms = (end_ms + SLACK_MS) % WRAP
+    reach = 2 * session["interval_ms"]
+    inside = []
+    before = after = None
+    for record in session["records"]:
+        ms = record[0]
+        if ms < start_ms:
+            if start_ms - ms <= reach:
+                before = record
+        elif ms <= end_ms:
+            inside.append(record)
+        elif after is None and ms - end_ms <= reach:
+            after = record
+    if inside:
+        return inside
+    return ([before] if before else []) + ([after] if after else [])
+
+
+def _boot_distance(a, b):
+    """Seconds between two boot times, allowing for ticks_ms() having wrapped in between"""
+    period = WRAP / 1000
+    difference = (a - b) % period
+    return min(difference, period - difference)
+
+
+def align(sessions, found, tolerance=TOLERANCE):
+    """Set each window's session and samples. A window goes with a session from the same board,
+    firmware and boot; if several match, which happens when the board's clock wasn't set, the one with
+    the most samples around it wins and the window is marked ambiguous."""
+    for window in found:
+        candidates = []
+        for session in sessions:
+            if session["board_id"] != window.board_id or session["release"] != window.release:
+                continue
+            if _boot_distance(session["boot"], window.boot) > tolerance:
+                continue
+            samples = _samples_for(session, window.start_ms, window.end_ms)
+            if samples:
+                candidates.append((len(samples), session, samples))
+        if candidates:
+            candidates.sort(key=lambda candidate: -candidate[0])
+            _, window.session, window.samples = candidates[0]
+            window.ambiguous = len(candidates) > 1
+
+
+def _typical_voltage(session):
+    voltages = sorted(record[3] for record in session["records"] if record[3] is not None)
+    return voltages[len(voltages) // 2] if voltages else None
+
+
+def conditions(window):
+    """(MHz low, MHz high, hottest C, lowest V, least free bytes, flags) over the window's samples"""
+    samples = window.samples
+    frequencies = [record[1] for record in samples]
+    temperatures = [record[2] for record in samples if record[2] is not None]
+    voltages = [record[3] for record in samples if record[3] is not None]
+    flags = []
+    top = max(record[1] for record in window.session["records"])
+    if min(frequencies) < top:
+        flags.append("THROTTLED")
+    typical = _typical_voltage(window.session)
+    if voltages and typical and min(voltages) < typical * SAG:
+        flags.append("SAG")
+    if window.ambiguous:
+        flags.append("AMBIGUOUS")
+    return (min(frequencies), max(frequencies), max(temperatures) if temperatures else None,
+            min(voltages) if voltages else None, min(record[4] for record in samples), flags)
+
+
+def pearson(xs, ys):
+    """Correlation of two lists of numbers, or None if either doesn't vary"""
+    n = len(xs)
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    syy = sum((y - mean_y) ** 2 for y in ys)
+    if sxx == 0 or syy == 0:
+        return None
+    return sxy / (sxx * syy) ** 0.5
+
+
+def _cell(value, fmt, width):
+    return ("-" if value is None else format(value, fmt)).rjust(width)
+
+
+def print_sessions(sessions, out=sys.stdout):
+    out.write(f"{'board':<28} {'release':<10} {'samples':>8} {'seconds':>9} {'every ms':>9}\n")
+    for session in sessions:
+        records = session["records"]
+        span = (records[-1][0] - records[0][0]) / 1000 if len(records) > 1 else 0
+        out.write(f"{session['board_id']:<28} {session['release']:<10} {len(records):>8} {span:>9.1f} "
+                  f"{session['interval_ms']:>9}\n")
+
+
+def print_windows(found, out=sys.stdout):
+    out.write(f"\n{'kind':<6} {'name':<28} {'result':>12} {'samples':>8} {'MHz':>9} {'max C':>7} {'min V':>7} "
+              f"{'min free KB':>12}  flags\n")
+    for window in found:
+        value = _cell(window.value, ".1f", 9) + f" {window.unit:<2}"
+        if window.session is None:
+            out.write(f"{window.kind:<6} {window.name[:28]:<28} {value} {'no samples':>8}\n")
+            continue
+        low, high, hottest, lowest, least, flags = conditions(window)
+        mhz = f"{low}" if low == high else f"{low}-{high}"
+        out.write(f"{window.kind:<6} {window.name[:28]:<28} {value} {len(window.samples):>8} {mhz:>9} "
+                  f"{_cell(hottest, '.1f', 7)} {_cell(lowest, '.3f', 7)} {least / 1024:>12.1f}  {' '.join(flags)}\n")
+
+
+def print_correlations(found, out=sys.stdout):
+    """Pearson's r between each result and each condition, over every run of the same thing. Positive
+    means the result went up with the condition: for times, slower."""
+    groups = {}
+    for window in found:
+        if window.session is not None and window.value is not None:
+            groups.setdefault((window.kind, window.name), []).append(window)
+    rows = []
+    for (kind, name), group in groups.items():
+        if len(group) < 3:
+            continue
+        values = [window.value for window in group]
+        cells = []
+        for column in range(4):
+            pairs = [(condition, value) for condition, value in
+                     zip((_condition_value(window, column) for window in group), values) if condition is not None]
+            cells.append(pearson(*zip(*pairs)) if len(pairs) >= 3 else None)
+        rows.append((kind, name, len(group), cells))
+    if not rows:
+        out.write("\nRun a benchmark or probe at least three times to see how its result follows the conditions.\n")
+        return
+    out.write(f"\n{'correlation of result with':<35} {'runs':>5} {'MHz':>7} {'temp':>7} {'volts':>7} {'free':>7}\n")
+    for kind, name, runs, cells in rows:
+        out.write(f"{kind:<6} {name[:28]:<28} {runs:>5}" + "".join(f" {_cell(cell, '+.2f', 6)}" for cell in cells) + "\n")
+
+
+def _condition_value(window, column):
+    """Mean MHz, hottest temperature, lowest voltage or least free memory over the window's samples"""
+    samples = window.samples
+    if column == 0:
+        return sum(record[1] for record in samples) / len(samples)
+    values = [record[column + 1] for record in samples if record[column + 1] is not None]
+    if not values:
+        return None
+    return max(values) if column == 1 else min(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="sampler logs or serial output, and benchmark or probe .jsonl files")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="seconds two boot times can differ by and still be the same boot")
+    args = parser.parse_args()
+
+    sessions, benchmarks, probes = load(args.files)
+    if not sessions:
+        sys.exit("No samples found. Log them with utils_sampler.SystemSampler(path=...) or print them with dump().")
+    found, skipped = windows(benchmarks, probes)
+    align(sessions, found, args.tolerance)
+    print_sessions(sessions)
+    if skipped:
+        print(f"\n{skipped} runs were saved without their times, so they can't be lined up")
+    if not found:
+        sys.exit("\nNo benchmark or probe results to line up")
+    print_windows(found)
+    print_correlations(found)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Sustained throughput of utils_accelerometer against the simulated LIS3DH in the fakes package.
+Compares calling print_values() in a loop with AccelerometerStream at several data rates,
+and shows what a slow consumer does to dropped samples. Then compares printing every sample
+with printing one Pipeline record per window, in bytes and CPU time per sample.
+
+    python tools/bench_accelerometer.py
+    python tools/bench_accelerometer.py --seconds 5 --i2c-frequency 100000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fakes
+
+PROFILE = "qtpy_esp32s3"
+DATA_RATES = (100, 400, 1344)
+# Seconds of work per block for the slow consumer runs
+SLOW_CONSUMER = (0.0, 0.05, 0.2)
+
+
+def bench_print_values(seconds):
+    """Returns (calls per second, I2C transactions per call).
+    Calls can outrun the data rate, in which case they print the same sample again."""
+    import board
+    import adafruit_lis3dh
+    import utils_accelerometer
+
+    bus = board.STEMMA_I2C()
+    lis3dh = adafruit_lis3dh.LIS3DH_I2C(bus, address=0x18)
+    lis3dh.data_rate = adafruit_lis3dh.DATARATE_1344_HZ
+    transactions = bus.transactions
+    count = 0
+    out = io.StringIO()
+    start = time.monotonic()
+    with contextlib.redirect_stdout(out):
+        while time.monotonic() - start < seconds:
+            utils_accelerometer.print_values(lis3dh)
+            count += 1
+    return count / (time.monotonic() - start), (bus.transactions - transactions) / count
+
+
+def bench_stream(seconds, data_rate, consumer_seconds=0.0):
+    """Returns (samples per second, samples read, dropped, overruns, I2C transactions per sample)"""
+    import board
+    import utils_accelerometer
+
+    bus = board.STEMMA_I2C()
+    stream = utils_accelerometer.AccelerometerStream(bus, data_rate=data_rate)
+    stream.start()
+    transactions = bus.transactions
+    count = 0
+    start = time.monotonic()
+    for samples, _ in stream.blocks():
+        stream.to_g(samples)
+        count += len(samples) // 3
+        if consumer_seconds:
+            time.sleep(consumer_seconds)
+        if time.monotonic() - start >= seconds:
+            break
+    elapsed = time.monotonic() - start
+    stream.stop()
+    per_sample = (bus.transactions - transactions) / max(1, stream.read)
+    return count / elapsed, stream.read, stream.dropped, stream.overruns, per_sample
+
+
+def bench_output(window, blocks=40):
+    """Returns [(name, bytes per sample, microseconds per sample)] for printing every sample
+    and for a few Pipeline setups, over the same recorded blocks"""
+    import board
+    import utils_accelerometer as accel
+    from array import array
+
+    stream = accel.AccelerometerStream(board.STEMMA_I2C(), data_rate=1344)
+    stream.start()
+    recorded = [(array("h", samples), array("L", timestamps)) for samples, timestamps in stream.blocks(blocks)]
+    stream.stop()
+    total = blocks * stream.block_size
+
+    def every_sample():
+        out = io.StringIO()
+        for samples, _ in recorded:
+            g = stream.to_g(samples)
+            for i in range(0, len(g), 3):
+                out.write("%0.3f,%0.3f,%0.3f\n" % (g[i], g[i + 1], g[i + 2]))
+        return len(out.getvalue())
+
+    def pipeline(**kwargs):
+        def run():
+            reduced = accel.Pipeline(stream, window=window, **kwargs)
+            out = io.StringIO()
+            for samples, timestamps in recorded:
+                for record in reduced.feed(samples, timestamps):
+                    out.write(reduced.format_record(record) + "\n")
+            return len(out.getvalue())
+        return run
+
+    cases = (
+        ("print every sample", every_sample),
+        ("pipeline: stats", pipeline()),
+        ("pipeline: rms + p2p", pipeline(reducers=(accel.MovingRMS, accel.PeakToPeak))),
+        ("pipeline: high-pass + rms", pipeline(filters=(lambda: accel.HighPass.from_cutoff(5, 1344),),
+                                               reducers=(accel.MovingRMS,))),
+    )
+    results = []
+    for name, function in cases:
+        start = time.perf_counter()
+        size = function()
+        elapsed = time.perf_counter() - start
+        results.append((name, size / total, elapsed / total * 1000000))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=2.0, help="how long each run lasts")
+    parser.add_argument("--i2c-frequency", type=int, default=400000, help="simulated bus clock in Hz")
+    parser.add_argument("--window", type=int, default=256, help="samples per Pipeline record")
+    args = parser.parse_args()
+
+    fakes.install(PROFILE, i2c_frequency=args.i2c_frequency)
+    try:
+        print(f"I2C at {args.i2c_frequency // 1000} kHz, {args.seconds:g} s per run\n")
+        calls, per_call = bench_print_values(args.seconds)
+        print(f"print_values() loop at 1344 Hz: {calls:.1f} calls/s, {per_call:.1f} I2C transactions per call.")
+        print("On the board, print and float formatting cost far more than they do here.\n")
+
+        print(f"{'data rate':>10} {'consumer':>9} {'samples/s':>10} {'read':>7} {'dropped':>8} {'overruns':>9} {'I2C/sample':>11}")
+        for data_rate in DATA_RATES:
+            for consumer_seconds in SLOW_CONSUMER:
+                rate, read, dropped, overruns, per_sample = bench_stream(args.seconds, data_rate, consumer_seconds)
+                print(f"{data_rate:>8} Hz {consumer_seconds * 1000:>6.0f} ms {rate:>10.1f} {read:>7} {dropped:>8} "
+                      f"{overruns:>9} {per_sample:>11.3f}")
+
+        print(f"\nOutput, one record per {args.window} samples\n")
+        print(f"{'':<28} {'bytes/sample':>13} {'us/sample':>10}")
+        for name, size, micros in bench_output(args.window):
+            print(f"{name:<28} {size:>13.2f} {micros:>10.2f}")
+    finally:
+        fakes.uninstall()
+
+
+if __name__ == "__main__":
+    main()
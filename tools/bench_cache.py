@@ -0,0 +1,76 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" utils_cache on every fake board: the first boot, which finds everything and stores it, and the next
+one, which reads it back.
+
+Each boot times utils_pins.build_pin_map(), utils_i2c.discover() and utils_system.collect_snapshot(),
+then checks that the second boot found the same pins and devices as the first. Before a third boot,
+a device is unplugged from each I2C bus, to check that the cache notices.
+
+    python tools/bench_cache.py
+    python tools/bench_cache.py --i2c-latency-us 200
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fakes
+from fakes.profiles import PROFILES
+
+
+def boot(profile, nvm, i2c_latency_us, unplug=False):
+    """Returns (milliseconds, pin map, devices, what's in nvm afterwards, bytes stored)"""
+    env = fakes.install(profile, i2c_latency_us=i2c_latency_us, nvm=nvm)
+    try:
+        if unplug:
+            for bus in env.buses.values():
+                if bus.devices:
+                    bus.remove_device(max(bus.devices))
+        import utils_cache
+        import utils_i2c
+        import utils_pins
+        import utils_system
+        start = time.perf_counter()
+        pin_map = utils_pins.build_pin_map()
+        table = utils_i2c.discover()
+        utils_system.collect_snapshot()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        pins = sorted(pin_map.values())
+        devices = {bus_name: {address: (info.name, info.verified) for address, info in bus_devices.items()}
+                   for bus_name, bus_devices in table.devices.items()}
+        nvm = env.microcontroller.nvm
+        stored = len(utils_cache._stored) if utils_cache._stored is not None else 0
+        return elapsed_ms, pins, devices, None if nvm is None else bytes(nvm), stored
+    finally:
+        fakes.uninstall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--i2c-latency-us", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'profile':<16} {'first ms':>9} {'next ms':>8} {'bytes':>6}  {'same':<5} {'unplugged':<9}")
+    with tempfile.TemporaryDirectory() as folder:
+        for profile in PROFILES:
+            # One file for all three boots, for the boards whose nvm is too small
+            os.environ[fakes.CACHE_PATH_SETTING] = os.path.join(folder, profile)
+            first_ms, pins, devices, nvm, stored = boot(profile, None, args.i2c_latency_us)
+            next_ms, next_pins, next_devices, nvm, _ = boot(profile, nvm, args.i2c_latency_us)
+            same = pins == next_pins and devices == next_devices
+            _, _, unplugged_devices, _, _ = boot(profile, nvm, args.i2c_latency_us, unplug=True)
+            # Every bus with devices should have lost its highest address
+            noticed = all(len(unplugged_devices[name]) == len(found) - 1 for name, found in devices.items() if found)
+            print(f"{profile:<16} {first_ms:>9.1f} {next_ms:>8.1f} {stored:>6}  {'yes' if same else 'NO':<5} "
+                  f"{'noticed' if noticed else 'MISSED':<9}")
+        os.environ.pop(fakes.CACHE_PATH_SETTING, None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" utils_capabilities on every fake board: how long a first probe takes, and a cached one.
+
+Then probes a board whose I2C devices answer slowly with a tight budget, to show detectors
+being marked slow and skipped, and the next probe filling in what was skipped.
+
+    python tools/bench_capabilities.py
+    python tools/bench_capabilities.py --budget-ms 100
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fakes
+from fakes.profiles import PROFILES
+
+REPEAT = 100
+
+
+def bench_profile(profile, budget_ms):
+    """Returns (first probe ms, cached probe us, slowest detector, its ms)"""
+    fakes.install(profile)
+    try:
+        import utils_capabilities
+        start = time.perf_counter()
+        utils_capabilities.collect_capabilities(budget_ms=budget_ms)
+        first_ms = (time.perf_counter() - start) * 1000
+        # Before the cached probes, which leave every detector at 0
+        name, (_, slowest_us) = max(utils_capabilities.status().items(), key=lambda item: item[1][1])
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            utils_capabilities.collect_capabilities(budget_ms=budget_ms)
+        cached_us = (time.perf_counter() - start) / REPEAT * 1000000
+        return first_ms, cached_us, name, slowest_us / 1000
+    finally:
+        fakes.uninstall()
+
+
+def check_budget(profile, budget_ms, i2c_latency_us):
+    fakes.install(profile, i2c_latency_us=i2c_latency_us)
+    try:
+        import utils_capabilities
+        for attempt in ("first", "second"):
+            utils_capabilities.collect_capabilities(budget_ms=budget_ms)
+            states = ", ".join(f"{name} {state}" for name, (state, _) in utils_capabilities.status().items()
+                               if state != "ok")
+            print(f"\t{attempt} probe: {states or 'all ok'}")
+    finally:
+        fakes.uninstall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=int, default=500, help="time budget for the whole probe")
+    args = parser.parse_args()
+
+    print(f"{'profile':<16} {'first ms':>9} {'cached us':>10}  slowest detector")
+    for profile in PROFILES:
+        first_ms, cached_us, name, slowest_ms = bench_profile(profile, args.budget_ms)
+        print(f"{profile:<16} {first_ms:>9.1f} {cached_us:>10.1f}  {name} {slowest_ms:.1f} ms")
+
+    print("\nclue with 3 ms I2C transactions and a 120 ms budget:")
+    check_budget("clue", 120, 3000)
+
+
+if __name__ == "__main__":
+    main()
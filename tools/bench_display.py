@@ -0,0 +1,56 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" utils_display.benchmark_display() on every fake board with a display, then one table to compare them.
+
+The fake displays take as long to refresh as sending the changed pixels over their bus would:
+SPI at 24 MHz for FourWire, 10 MB/s for ParallelBus, and a second per e-ink refresh.
+The results have the same form as utils_benchmark's, so the table is built the same way
+tools/benchmark_report.py builds one from results saved on real boards.
+
+    python tools/bench_display.py
+    python tools/bench_display.py --frames 60 --region 64
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fakes
+from fakes.profiles import PROFILES
+
+COLUMNS = ("display_full_refresh", "display_partial_refresh", "display_batched_frame",
+           "display_update_loop", "display_auto_refresh_loop", "display_rotate_90", "display_eink_refresh")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--region", type=int, default=32, help="size of the partial refresh square")
+    args = parser.parse_args()
+
+    rows = {}
+    for name, profile in PROFILES.items():
+        if profile["display"] is None:
+            continue
+        env = fakes.install(name)
+        try:
+            import utils_display
+            print(f"\n######## {name} ########")
+            rows[name] = (utils_display.benchmark_display(args.frames, args.region), env.display.bytes_sent)
+        finally:
+            fakes.uninstall()
+
+    print("\nMedian ms" + "".join(f" | {column[8:]}" for column in COLUMNS) + " | bytes sent")
+    for name, (results, sent) in rows.items():
+        cells = []
+        for column in COLUMNS:
+            stats = results.get(column)
+            cells.append("" if stats is None else f"{stats['median'] / 1000000:.3f}")
+        print(name + "".join(f" | {cell}" for cell in cells) + f" | {sent}")
+
+
+if __name__ == "__main__":
+    main()
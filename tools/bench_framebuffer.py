@@ -0,0 +1,90 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" utils_framebuffer on the fake color displays, with a made-up dashboard.
+
+Each frame redraws the whole dashboard, the way simple dashboard code does: a background, a row of
+readouts of which only a few change, and a bar that grows. Pushes it twice, once sending every frame
+in full and once sending only what changed, and checks that the fake display's memory ends up the
+same as the framebuffer after every push. The fake bus takes as long as the bytes would on the real one.
+
+    python tools/bench_framebuffer.py
+    python tools/bench_framebuffer.py --frames 100 --tile 8
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fakes
+
+PROFILES = ("clue", "pyportal_titano")
+FRAMES = 30
+READOUTS = 12
+# Readouts whose value changes each frame
+CHANGING = 2
+
+
+def draw_dashboard(frame, number, values):
+    from utils_framebuffer import color565
+
+    frame.fill(color565(0, 0, 32))
+    width = frame.width // 4
+    for i, value in enumerate(values):
+        x = (i % 4) * width + 4
+        y = (i // 4) * 40 + 8
+        frame.fill_rect(x, y, width - 8, 32, color565(0, 64, 0))
+        # The value, as a bar inside the readout
+        frame.fill_rect(x + 2, y + 2, value * (width - 12) // 100, 28, color565(0, 255, 0))
+    frame.fill_rect(0, frame.height - 20, number * 3 % frame.width, 12, color565(255, 128, 0))
+
+
+def run(profile, frames, tile, diff, seed):
+    """Returns (framebuffer, mismatched pushes)"""
+    env = fakes.install(profile)
+    try:
+        import utils_framebuffer
+        rng = random.Random(seed)
+        frame = utils_framebuffer.for_display(tile=tile)
+        values = [rng.randrange(100) for _ in range(READOUTS)]
+        mismatches = 0
+        for number in range(frames):
+            for i in rng.sample(range(READOUTS), CHANGING):
+                values[i] = rng.randrange(100)
+            draw_dashboard(frame, number, values)
+            if not diff:
+                frame.invalidate()
+            frame.push()
+            if env.display.bus.ram != frame.buffer:
+                mismatches += 1
+        return frame, mismatches
+    finally:
+        fakes.uninstall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=FRAMES)
+    parser.add_argument("--tile", type=int, default=16, help="tile size in pixels")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.frames} frames, {READOUTS} readouts with {CHANGING} changing each frame, {args.tile} pixel tiles\n")
+    print(f"{'profile':<16} {'push':<8} {'fps':>8} {'ms/frame':>9} {'KB/frame':>9} {'rects':>6} {'saved':>7} {'matches':>8}")
+    for profile in PROFILES:
+        for diff in (False, True):
+            frame, mismatches = run(profile, args.frames, args.tile, diff, args.seed)
+            saved = 100 - frame.bytes_sent * 100 / frame.bytes_full
+            print(f"{profile:<16} {'changes' if diff else 'full':<8} {frame.fps():>8.1f} "
+                  f"{frame.push_us / frame.frames / 1000:>9.2f} {frame.bytes_sent / frame.frames / 1024:>9.1f} "
+                  f"{frame.rects_sent / frame.frames:>6.1f} {saved:>6.1f}% {'yes' if not mismatches else 'NO':>8}")
+
+    print("\nReport for the last run:")
+    frame.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" HTTP timings for utils_wifi, against the local server in fakes/http_server.py.
+
+The fake radio from the fakes package adds its ping time to every DNS lookup and TCP connect,
+like a board on wifi. First prints utils_wifi.test_http_timings(), which splits a request into
+DNS, connect, TLS and first byte. Then compares building a new socket pool, SSL context and
+session for every request, like test_wifi() used to, with the shared session from get_session().
+
+    python tools/bench_http.py
+    python tools/bench_http.py --requests 50 --ping-ms 40
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fakes
+from fakes import http_server
+
+REQUESTS = 20
+
+
+def bench_new_sessions(url, requests):
+    """Returns (ms per request, sockets opened) for a new pool, context and session per request"""
+    import wifi
+    import socketpool
+    import ssl
+    import adafruit_requests
+
+    sockets = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        pool = socketpool.SocketPool(wifi.radio)
+        session = adafruit_requests.Session(pool, ssl.create_default_context())
+        session.get(url).content
+        sockets += pool.sockets_created
+        # The old code dropped the session with the connection still open
+        for sock in session._open_sockets.values():
+            sock.close()
+    return (time.perf_counter() - start) / requests * 1000, sockets
+
+
+def bench_shared_session(url, requests):
+    """Returns (ms per request, sockets opened) through utils_wifi.get_session()"""
+    import utils_wifi
+
+    utils_wifi.close_session(reset=True)
+    start = time.perf_counter()
+    for _ in range(requests):
+        utils_wifi.get_session().get(url).content
+    elapsed = time.perf_counter() - start
+    sockets = utils_wifi.get_socket_pool().sockets_created
+    utils_wifi.close_session()
+    return elapsed / requests * 1000, sockets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=REQUESTS, help="requests per case")
+    parser.add_argument("--ping-ms", type=float, default=25.0, help="simulated wifi round trip")
+    parser.add_argument("--server-delay-ms", type=int, default=0, help="time the server takes to answer")
+    args = parser.parse_args()
+
+    server, base = http_server.start(delay_ms=args.server_delay_ms)
+    # By name, so there's a DNS lookup to time
+    url = base.replace("127.0.0.1", "localhost") + "/index.html"
+    env = fakes.install("magtag")
+    try:
+        import utils_wifi
+        env.radio.ping_ms = args.ping_ms
+        env.radio.connect(env.radio.networks[0][0], "password")
+
+        utils_wifi.test_http_timings(url)
+
+        print(f"\n{args.requests} requests, {args.ping_ms:g} ms round trip\n")
+        print(f"{'':<34} {'ms/request':>11} {'sockets':>8}")
+        for name, bench in (("new pool, context, session each", bench_new_sessions),
+                            ("shared session", bench_shared_session)):
+            ms, sockets = bench(url, args.requests)
+            print(f"{name:<34} {ms:>11.1f} {sockets:>8}")
+    finally:
+        fakes.uninstall()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" I2C discovery on the fake boards in the fakes package.
+
+For each profile, shows how long utils_i2c.discover() takes to lock, scan and fingerprint each bus,
+how many bus transactions that costs, and what a repeat query costs once the table is cached.
+Then checks that a busy bus is locked after a few retries, that a hot-plugged device shows up
+after invalidate(), and that I2CHealthMonitor spots a flaky device and a slow one.
+
+    python tools/bench_i2c.py
+    python tools/bench_i2c.py --i2c-frequency 400000 --repeat 100
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fakes
+from fakes.profiles import PROFILES
+
+REPEAT = 1000
+HEALTH_ROUNDS = 200
+# try_lock() calls that fail before the bus is free, as if another task were using it
+LOCK_CONTENTION = 4
+
+
+def transactions(env):
+    return sum(bus.transactions for bus in set(env.buses.values()))
+
+
+def bench_profile(profile, i2c_frequency, repeat):
+    """Returns {bus name: (devices, identified, scan ms)}, cached query microseconds and
+    transactions for (first discover, repeat queries)"""
+    env = fakes.install(profile, i2c_frequency=i2c_frequency)
+    try:
+        import utils_i2c
+
+        before = transactions(env)
+        table = utils_i2c.discover()
+        first = transactions(env) - before
+
+        before = transactions(env)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            utils_i2c.discover()
+        cached_us = (time.perf_counter() - start) / repeat * 1000000
+        cached = transactions(env) - before
+
+        buses = {}
+        for name, devices in table.devices.items():
+            identified = sum(1 for info in devices.values() if info.verified)
+            buses[name] = (len(devices), identified, table.scan_us[name] / 1000)
+        return buses, cached_us, first, cached
+    finally:
+        fakes.uninstall()
+
+
+def check_lock_contention(profile):
+    """Returns (scanned, ms) for a bus that fails LOCK_CONTENTION try_lock() calls first"""
+    env = fakes.install(profile)
+    try:
+        import utils_i2c
+        bus = env.buses["I2C"]
+        bus.lock_contention = LOCK_CONTENTION
+        table = utils_i2c.discover()
+        return "I2C" in table.devices, table.scan_us["I2C"] / 1000
+    finally:
+        fakes.uninstall()
+
+
+def check_hot_plug(profile):
+    """Returns (found while cached, found after invalidate) for a device plugged in after discover()"""
+    env = fakes.install(profile)
+    try:
+        import utils_i2c
+        from fakes.i2c import DEVICE_TYPES
+        name = "STEMMA_I2C" if "STEMMA_I2C" in env.buses else "I2C"
+        utils_i2c.discover()
+        env.buses[name].add_device(DEVICE_TYPES["bme280"](0x76))
+        cached = 0x76 in utils_i2c.discover().devices[name]
+        utils_i2c.invalidate(name)
+        info = utils_i2c.discover().devices[name].get(0x76)
+        return cached, info is not None and info.verified
+    finally:
+        fakes.uninstall()
+
+
+def check_health(profile, rounds):
+    """Make one device NACK now and then and another stretch the clock, then print the monitor's report"""
+    env = fakes.install(profile)
+    try:
+        import utils_i2c
+        devices = env.buses["I2C"].devices
+        addresses = sorted(devices)
+        devices[addresses[0]].nack_rate = 0.05
+        devices[addresses[-1]].stretch_us = 2000
+        monitor = utils_i2c.I2CHealthMonitor(interval=0)
+        monitor.run(rounds)
+        monitor.report()
+    finally:
+        fakes.uninstall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--i2c-frequency", type=int, default=100000, help="simulated bus clock in Hz")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="cached queries to time")
+    parser.add_argument("--rounds", type=int, default=HEALTH_ROUNDS, help="health monitor rounds")
+    args = parser.parse_args()
+
+    print(f"I2C at {args.i2c_frequency // 1000} kHz\n")
+    print(f"{'profile':<16} {'bus':<11} {'devices':>8} {'identified':>11} {'scan ms':>8} "
+          f"{'cached us':>10} {'transactions':>13}")
+    for profile in PROFILES:
+        buses, cached_us, first, cached = bench_profile(profile, args.i2c_frequency, args.repeat)
+        for name, (devices, identified, scan_ms) in buses.items():
+            print(f"{profile:<16} {name:<11} {devices:>8} {identified:>11} {scan_ms:>8.1f} "
+                  f"{cached_us:>10.1f} {f'{first} then {cached}':>13}")
+
+    scanned, scan_ms = check_lock_contention("magtag")
+    print(f"\nBus busy for {LOCK_CONTENTION} tries: {'scanned' if scanned else 'gave up'} in {scan_ms:.1f} ms")
+    cached, found = check_hot_plug("qtpy_esp32s3")
+    print(f"Hot-plugged BME280: {'seen' if cached else 'not seen'} while cached, "
+          f"{'found' if found else 'not found'} after invalidate()")
+
+    print(f"\nHealth monitor on clue, {args.rounds} rounds, with the first device NACKing 5% of pings "
+          f"and the last one stretching the clock by 2 ms:")
+    check_health("clue", args.rounds)
+
+
+if __name__ == "__main__":
+    main()
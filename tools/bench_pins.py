@@ -0,0 +1,192 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Desktop benchmarks for utils_pins.
+Runs under regular Python, using fake board and microcontroller modules with lots of pins.
+Covers classify_pin() and build_pin_map().
+
+    python tools/bench_pins.py
+"""
+
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+NUM_PINS = 320
+REPEAT = 20
+PIN_MAP_SIZES = (50, 100, 250, 500, 1000)
+PIN_MAP_REPEAT = 3
+
+
+def make_fake_board(num_pins=NUM_PINS):
+    """Build a stand-in board module with a realistic mix of pin names."""
+    board = types.ModuleType("board")
+    board.board_id = "fake_board"
+    names = [
+        "LED", "NEOPIXEL", "DISPLAY", "SPI", "MOSI", "MISO", "SCK", "I2C", "SCL", "SDA",
+        "STEMMA_I2C", "UART", "TX", "RX", "BUTTON", "BUTTON_A", "BUTTON_B", "TFT_CS", "TFT_DC",
+        "TFT_BACKLIGHT", "EPD_BUSY", "SD_CS", "SPEAKER", "LIGHT", "ESP_CS", "ESP_BUSY", "BATTERY",
+        "ACCELEROMETER_INTERRUPT", "CAMERA_DATA2", "CAMERA_VSYNC",
+    ]
+    i = 0
+    while len(names) < num_pins:
+        names.append(("A%d", "D%d", "IO%d", "LCD_DATA%d", "TX%d", "SCL%d", "GPIO%d")[i % 7] % (i // 7))
+        i += 1
+    for name in names:
+        setattr(board, name, object())
+    return board
+
+
+class FakePin:
+    """Stand-in for microcontroller.Pin. Compared and hashed by identity, like the real thing."""
+
+
+def make_fake_pin_modules(num_pins):
+    """Build stand-in board and microcontroller modules.
+    Every GPIO has two board aliases, and microcontroller.pin also holds a few non-Pin items."""
+    microcontroller = types.ModuleType("microcontroller")
+    microcontroller.Pin = FakePin
+    microcontroller.pin = types.ModuleType("microcontroller.pin")
+    board = types.ModuleType("board")
+    board.board_id = "fake_board"
+    for i in range(num_pins):
+        pin = FakePin()
+        setattr(microcontroller.pin, f"GPIO{i}", pin)
+        setattr(board, f"D{i}", pin)
+        setattr(board, f"IO{i}", pin)
+    microcontroller.pin.NOT_A_PIN = 42
+    board.I2C = lambda: None
+    return board, microcontroller
+
+
+def legacy_get_matching_pins(board, microcontroller):
+    """The original get_matching_pins() lookup: for every GPIO, scan every board alias."""
+    microcontroller_pins = []
+    for pin in dir(microcontroller.pin):
+        pin_attr = getattr(microcontroller.pin, pin)
+        if isinstance(pin_attr, microcontroller.Pin):
+            pins = []
+            for alias in dir(board):
+                if getattr(board, alias) is getattr(microcontroller.pin, pin):
+                    pins.append(f"board.{alias}")
+            if pins:
+                pins.append(f"({str(pin)})")
+                microcontroller_pins.append(" ".join(pins))
+    return microcontroller_pins
+
+
+def legacy_get_board_pins(board, pin_descriptions_source):
+    """The original get_board_pins() lookup: dictionary rebuilt on every call,
+    a linear scan for each pin, then a chain of startswith checks."""
+    pin_descriptions = dict(pin_descriptions_source)
+    result = []
+    pins = dir(board)
+    pins.sort()
+    for item in pins:
+        descriptor = ""
+        for prefix, description in pin_descriptions.items():
+            if item == prefix:
+                descriptor = description
+                break
+        if item.startswith("UART"):
+            descriptor = "UART"
+        elif item.startswith("TX"):
+            descriptor = "UART transmit"
+        elif item.startswith("RX"):
+            descriptor = "UART receive"
+        elif item.startswith("I2C"):
+            descriptor = "I2C bus"
+        elif item.startswith("SCL"):
+            descriptor = "I2C serial clock line"
+        elif item.startswith("SDA"):
+            descriptor = "I2C serial data line"
+        elif item.startswith("BUTTON"):
+            descriptor = "Built-in button"
+        elif item.startswith("LCD_DATA"):
+            descriptor = "LCD data"
+        elif len(item) >= 2 and item[0] == "A" and item[1].isdigit():
+            descriptor = "Generic analog pin"
+        elif len(item) >= 2 and item[0] == "D" and item[1].isdigit():
+            descriptor = "Generic digital pin"
+        result.append(descriptor)
+    return result
+
+
+def indexed_get_board_pins(board, classify_pin):
+    result = []
+    pins = dir(board)
+    pins.sort()
+    for item in pins:
+        pin_class = classify_pin(item)
+        result.append(pin_class.description if pin_class is not None else "")
+    return result
+
+
+def best_time(function, *args, repeat=REPEAT):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_classify_pin():
+    board = make_fake_board()
+    sys.modules["board"] = board
+    import utils_pins
+
+    # The original dictionary had ~130 entries, including every instance that the prefixes cover
+    legacy_descriptions = [(name, entry[2]) for name, entry in utils_pins.PIN_DESCRIPTIONS.items()]
+    for prefix, _, _, description in utils_pins.PIN_PREFIXES:
+        if len(prefix) > 1:
+            legacy_descriptions.append((prefix, description))
+            legacy_descriptions.extend((f"{prefix}{n}", description) for n in range(8))
+
+    legacy = best_time(legacy_get_board_pins, board, legacy_descriptions)
+    indexed = best_time(indexed_get_board_pins, board, utils_pins.classify_pin)
+
+    print(f"pins on fake board:      {len(dir(board))}")
+    print(f"descriptions (legacy):   {len(legacy_descriptions)}")
+    print(f"legacy lookup:           {legacy * 1000:.3f} ms")
+    print(f"classify_pin lookup:     {indexed * 1000:.3f} ms")
+    print(f"speedup:                 {legacy / indexed:.1f}x")
+
+
+def bench_pin_map():
+    import utils_cache
+    import utils_pins
+
+    # Time building the map, not reading it back from the last run
+    utils_cache.ENABLED = False
+
+    print(f"{'GPIO pins':>10} {'aliases':>8} {'legacy ms':>12} {'pin map ms':>12} {'speedup':>8}")
+    for num_pins in PIN_MAP_SIZES:
+        board, microcontroller = make_fake_pin_modules(num_pins)
+        sys.modules["board"] = board
+        sys.modules["microcontroller"] = microcontroller
+
+        legacy = best_time(legacy_get_matching_pins, board, microcontroller, repeat=PIN_MAP_REPEAT)
+        indexed = best_time(utils_pins.build_pin_map, True, repeat=PIN_MAP_REPEAT)
+        assert len(utils_pins.build_pin_map()) == len(legacy_get_matching_pins(board, microcontroller))
+
+        print(
+            f"{num_pins:>10} {num_pins * 2:>8} {legacy * 1000:>12.3f} {indexed * 1000:>12.3f}"
+            f" {legacy / indexed:>7.1f}x"
+        )
+
+
+def main():
+    print("=== classify_pin ===")
+    bench_classify_pin()
+    print("\n=== build_pin_map ===")
+    bench_pin_map()
+
+
+if __name__ == "__main__":
+    main()
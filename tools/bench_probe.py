@@ -0,0 +1,98 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" utils_wifi_probe: how close the streaming percentiles get, and a probe run on the fake radio.
+
+First feeds QuantileEstimator latencies from a few made-up distributions, including one with a slow
+tail like a busy wifi channel, and compares its p50, p90 and p99 with the exact values from sorting
+every sample. Then runs a LatencyProbe on a fake board with some packet loss, pinging the gateway
+and timing TCP connects and HTTP requests to the local server in fakes/http_server.py.
+
+    python tools/bench_probe.py
+    python tools/bench_probe.py --samples 100000 --rounds 200 --loss 0.1
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fakes
+from fakes import http_server
+
+SAMPLES = 10000
+ROUNDS = 50
+
+
+def distributions(rng):
+    """name -> function returning one latency in ms"""
+    return {
+        "normal 25 +- 5 ms": lambda: max(1.0, rng.gauss(25, 5)),
+        "lognormal": lambda: math.exp(rng.gauss(3.2, 0.5)),
+        "5% slow tail": lambda: rng.gauss(20, 3) if rng.random() > 0.05 else rng.uniform(100, 400),
+    }
+
+
+def exact(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def bench_estimators(samples, seed):
+    from utils_wifi_probe import PERCENTILES, QuantileEstimator
+
+    rng = random.Random(seed)
+    print(f"{samples} samples per distribution, estimate vs exact, ms\n")
+    print(f"{'distribution':<20}" + "".join(f"{f'p{round(q * 100)}':>18}" for q in PERCENTILES) + f"{'us/sample':>11}")
+    for name, draw in distributions(rng).items():
+        values = [draw() for _ in range(samples)]
+        estimators = [QuantileEstimator(q) for q in PERCENTILES]
+        start = time.perf_counter()
+        for value in values:
+            for estimator in estimators:
+                estimator.add(value)
+        per_sample = (time.perf_counter() - start) / samples * 1000000
+        cells = "".join(f"{f'{e.value():.1f} vs {exact(values, e.quantile):.1f}':>18}" for e in estimators)
+        print(f"{name:<20}{cells}{per_sample:>11.1f}")
+
+
+def bench_probe(rounds, loss, seed):
+    server, base = http_server.start()
+    port = base.rsplit(":", 1)[1]
+    env = fakes.install("magtag")
+    try:
+        import utils_wifi_probe
+        random.seed(seed)
+        env.radio.ping_loss = loss
+        env.radio.connect(env.radio.networks[0][0], "password")
+        probe = utils_wifi_probe.LatencyProbe(
+            ["gateway", "dns", f"tcp://localhost:{port}", f"{base}/index.html", "tcp://127.0.0.1:9"],
+            interval=0, timeout=0.2)
+        print(f"\nLatencyProbe on the fake radio, {rounds} rounds, {env.radio.ping_ms:g} +- "
+              f"{env.radio.ping_jitter_ms:g} ms round trip, {loss:.0%} of pings lost. "
+              f"Nothing listens on port 9, so that one always fails.")
+        probe.run(rounds)
+        probe.report()
+    finally:
+        fakes.uninstall()
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=SAMPLES, help="values fed to each estimator")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="probe rounds on the fake radio")
+    parser.add_argument("--loss", type=float, default=0.05, help="fraction of pings the fake radio drops")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    bench_estimators(args.samples, args.seed)
+    bench_probe(args.rounds, args.loss, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Heap benchmark for the REPL reports, on a fake board from the fakes package.
+
+Calls every report 1,000 times and measures what each call allocates, next to the print()
+versions the reports used before utils_report. On the board, every temporary string a report
+makes is a hole in the heap until the next garbage collection, so the peak bytes per call is
+what fragments a long-running board. Also counts writes to stdout, since each one is a USB or UART transfer.
+
+On a computer, tracemalloc also counts things the board gets for free: integers above 256,
+floats and import statements all allocate on CPython, but not on CircuitPython. So the
+writer's numbers here are an upper bound. On the board, turn on utils_profile and call the
+reports to see the real numbers.
+
+    python tools/bench_reports.py
+    python tools/bench_reports.py --profile clue --calls 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fakes
+
+CALLS = 1000
+# Calls profiled one at a time for the peak, since profiling each call collects garbage
+PROFILED_CALLS = 50
+
+
+class Sink:
+    """Stand-in for sys.stdout that throws the text away, counting writes and bytes.
+    It has a buffer attribute like the real one, so ReportWriter writes bytes to it."""
+
+    def __init__(self):
+        self.writes = 0
+        self.bytes = 0
+        self.buffer = self
+
+    def write(self, data):
+        self.writes += 1
+        self.bytes += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+# The print() versions of the reports, as they were before utils_report
+
+def legacy_get_os_info():
+    import utils_system
+    print("\n=== os module info ===\n")
+    snapshot = utils_system.collect_snapshot()
+    print("Board name:\t", snapshot.machine)
+    print("System name (CPU):\t", snapshot.sysname)
+    print("CircuitPython ver:\t", snapshot.release)
+    print("Version:\t\t", snapshot.version)
+    free_memory = snapshot.mem_free / 1024
+    allocated_memory = snapshot.mem_alloc / 1024
+    total_memory = allocated_memory + free_memory
+    print("Free memory:\t", free_memory, "KB")
+    print("Total memory:\t", total_memory, "KB")
+    fs_stat = snapshot.statvfs
+    print("Disk size:\t", fs_stat[0] * fs_stat[2] / 1024, "KB")
+    print("Disk free space:\t", fs_stat[0] * fs_stat[3] / 1024, "KB")
+    print("statvfs /")
+    print("\t", fs_stat)
+
+
+def legacy_get_board_pins():
+    import board
+    import utils_pins
+    print("\n=== board pin details ===\n")
+    pins = dir(board)
+    pins.sort()
+    for item in pins:
+        pin_class = utils_pins.classify_pin(item)
+        descriptor = pin_class.description if pin_class is not None else ""
+        print(f"\t{item: <{utils_pins.COLUMN1_WIDTH}} {descriptor}")
+
+
+def legacy_get_matching_pins():
+    import utils_pins
+    print("\n=== pin name info ===\n")
+    microcontroller_pins = []
+    for gpio_names, aliases in utils_pins.build_pin_map().values():
+        names = [f"board.{alias}" for alias in aliases]
+        names.append(f"({'/'.join(gpio_names)})")
+        microcontroller_pins.append(" ".join(names))
+    for pins in sorted(microcontroller_pins):
+        print(pins)
+
+
+def legacy_get_i2c_device_addresses(i2c_bus):
+    i2c_bus.try_lock()
+    i2c_addresses = i2c_bus.scan()
+    print("\tI2C device(s) found at:")
+    for address in i2c_addresses:
+        print("\t\t" + hex(address))
+    i2c_bus.unlock()
+
+
+def legacy_wifi_details():
+    import wifi
+    print("\tIP:", wifi.radio.ipv4_address)
+    mac_formatted = '-'.join(['{:02X}'.format(byte) for byte in wifi.radio.mac_address])
+    print("\tMAC address:", mac_formatted)
+    print("\tDNS server:", wifi.radio.ipv4_dns)
+    print("\tGateway:", wifi.radio.ipv4_gateway)
+    print("\tSubnet:", wifi.radio.ipv4_subnet)
+    print("\tAP Authmode:", wifi.radio.ap_info.authmode)
+    print("\tAP SSID:", wifi.radio.ap_info.ssid)
+    bssid_formatted = '-'.join(['{:02X}'.format(byte) for byte in wifi.radio.ap_info.bssid])
+    print("\tAP BSSID:", bssid_formatted)
+    print("\tAP Channel:", wifi.radio.ap_info.channel)
+    print("\tAP Country:", wifi.radio.ap_info.country)
+    print("\tAP RSSI:", wifi.radio.ap_info.rssi)
+
+
+def wifi_details():
+    """The part of utils_wifi.test_wifi() that formats the connection details"""
+    import wifi
+    from utils_report import writer
+    out = writer()
+    radio = wifi.radio
+    ap_info = radio.ap_info
+    out.row(b"\tIP:", radio.ipv4_address)
+    out.key(b"\tMAC address:")
+    out.hex_bytes(radio.mac_address)
+    out.newline()
+    out.row(b"\tDNS server:", radio.ipv4_dns)
+    out.row(b"\tGateway:", radio.ipv4_gateway)
+    out.row(b"\tSubnet:", radio.ipv4_subnet)
+    out.row(b"\tAP Authmode:", ap_info.authmode)
+    out.row(b"\tAP SSID:", ap_info.ssid)
+    out.key(b"\tAP BSSID:")
+    out.hex_bytes(ap_info.bssid)
+    out.newline()
+    out.row(b"\tAP Channel:", ap_info.channel)
+    out.row(b"\tAP Country:", ap_info.country)
+    out.row(b"\tAP RSSI:", ap_info.rssi, b"dBm")
+    out.flush()
+
+
+def measure(function, calls):
+    """Returns (max peak bytes per call, bytes retained after all calls, writes per call, microseconds per call)"""
+    import utils_profile
+
+    sink = Sink()
+    real_stdout = sys.stdout
+    sys.stdout = sink
+    try:
+        # Warm up, so one-time costs like the shared ReportWriter buffer aren't counted
+        function()
+        peak = 0
+        for _ in range(PROFILED_CALLS):
+            with utils_profile.profile() as result:
+                function()
+            peak = max(peak, result.peak)
+
+        writes = sink.writes
+        with utils_profile.profile() as whole:
+            start = time.perf_counter()
+            for _ in range(calls):
+                function()
+            elapsed = time.perf_counter() - start
+        writes = (sink.writes - writes) / calls
+    finally:
+        sys.stdout = real_stdout
+    return peak, whole.retained, writes, elapsed / calls * 1000000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", default="magtag", help="fake board profile")
+    parser.add_argument("--calls", type=int, default=CALLS, help="calls per report")
+    args = parser.parse_args()
+
+    env = fakes.install(args.profile)
+    try:
+        import board
+        import wifi
+        import utils_display
+        import utils_i2c
+        import utils_pins
+        import utils_system
+
+        bus = board.I2C()
+        # Scanning sleeps for the simulated bus time, which isn't what this measures
+        bus.latency_us = 0
+        bus.frequency = 10 ** 12
+        wifi.radio.connect(env.radio.networks[0][0], "password")
+
+        reports = (
+            ("get_os_info", legacy_get_os_info, utils_system.get_os_info),
+            ("get_board_info", None, utils_system.get_board_info),
+            ("get_microcontroller_info", None, utils_system.get_microcontroller_info),
+            ("get_board_pins", legacy_get_board_pins, utils_pins.get_board_pins),
+            ("get_microcontroller_pins", None, utils_pins.get_microcontroller_pins),
+            ("get_matching_pins", legacy_get_matching_pins, utils_pins.get_matching_pins),
+            ("get_i2c_device_addresses", lambda: legacy_get_i2c_device_addresses(bus),
+             lambda: utils_i2c.get_i2c_device_addresses(bus)),
+            ("get_display_info", None, utils_display.get_display_info),
+            ("test_wifi details", legacy_wifi_details, wifi_details),
+        )
+
+        print(f"{args.calls} calls per report on {args.profile}\n")
+        print(f"{'report':<26} {'version':<8} {'peak B':>8} {'kept B':>8} {'writes':>7} {'us/call':>9}")
+        for name, legacy, current in reports:
+            versions = (("print", legacy), ("writer", current)) if legacy is not None else (("writer", current),)
+            for version, function in versions:
+                peak, retained, writes, micros = measure(function, args.calls)
+                print(f"{name:<26} {version:<8} {peak:>8} {retained:>8} {writes:>7.1f} {micros:>9.1f}")
+    finally:
+        fakes.uninstall()
+
+
+if __name__ == "__main__":
+    main()
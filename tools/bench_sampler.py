@@ -0,0 +1,128 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" utils_sampler: what a sample and a flush cost, and a made-up heat soak lined up by tools/align_log.py.
+
+First times SystemSampler.sample() and flush() on a fake board, and checks that the log decodes back
+to what the ring holds. Then runs benchmarks and a LatencyProbe several times on the fake magtag while
+the fake CPU warms up and slows down, and the fake radio's pings get slower with it. The benchmarks
+run on this computer, so their speed doesn't follow the fake CPU; the pings do, so their row in the
+correlation table should be strongly negative for MHz and positive for temperature.
+
+    python tools/bench_sampler.py
+    python tools/bench_sampler.py --runs 8 --samples 5000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fakes
+
+SAMPLES = 2000
+RUNS = 5
+
+
+def bench_costs(samples, folder):
+    env = fakes.install("magtag")
+    try:
+        import utils_sampler
+        path = os.path.join(folder, "cost.bin")
+        sampler = utils_sampler.SystemSampler(interval=0)
+        sampler.sample()
+        start = time.perf_counter()
+        for _ in range(samples):
+            sampler.sample()
+        sample_us = (time.perf_counter() - start) / samples * 1000000
+        # A batch as big as the ring never flushes on its own, so each flush can be timed by itself
+        logger = utils_sampler.SystemSampler(interval=0, path=path, batch=utils_sampler.CAPACITY)
+        flush_s = 0
+        flushes = max(1, samples // utils_sampler.BATCH)
+        for _ in range(flushes):
+            for _ in range(utils_sampler.BATCH):
+                logger.sample()
+            start = time.perf_counter()
+            logger.flush()
+            flush_s += time.perf_counter() - start
+        size = os.path.getsize(path)
+        with open(path, "rb") as file:
+            logged = utils_sampler.decode(file.read())[0]["records"]
+        same = len(logged) == logger.count and logged[-logger.capacity:] == list(logger.records())
+        print(f"Sampling on the fake {env.profile['board_id']}\n")
+        print(f"{'us per sample':<32} {sample_us:>8.2f}")
+        print(f"{'us per flush of ' + str(utils_sampler.BATCH):<32} {flush_s / flushes * 1000000:>8.1f}")
+        print(f"{'bytes per sample in the ring':<32} {utils_sampler.RECORD_SIZE:>8}")
+        print(f"{'bytes per sample in the log':<32} {size / len(logged):>8.2f}")
+        print(f"{'log matches the ring':<32} {'yes' if same else 'NO':>8}")
+    finally:
+        fakes.uninstall()
+
+
+def heat_soak(runs, folder, seed):
+    env = fakes.install("magtag")
+    try:
+        import utils_benchmark
+        import utils_sampler
+        import utils_wifi_probe
+        random.seed(seed)
+        cpu = env.microcontroller.cpu
+        radio = env.radio
+        radio.ping_jitter_ms = 1.0
+        radio.connect(radio.networks[0][0], "password")
+        top = cpu.frequency
+        sample_path = os.path.join(folder, "samples.bin")
+        bench_path = os.path.join(folder, "benchmarks.jsonl")
+        probe_path = os.path.join(folder, "probes.jsonl")
+        sampler = utils_sampler.SystemSampler(interval=0.01, path=sample_path, batch=16)
+        for run in range(runs):
+            # Warm up a few degrees a run, and throttle once it's past 60 C
+            cpu.temperature = 45.0 + 6 * run
+            cpu.frequency = top if cpu.temperature < 60 else top * 3 // 4 if cpu.temperature < 70 else top // 2
+            cpu.voltage = 3.3 - 0.02 * run
+            radio.ping_ms = 10.0 * top / cpu.frequency
+            print(f"\nRun {run + 1}: {cpu.temperature:.0f} C, {cpu.frequency // 1000000} MHz, "
+                  f"pings {radio.ping_ms:.0f} ms")
+            results = utils_benchmark.run_benchmark(["int_math", "dict_set_get"], iterations=2000, repeat=3,
+                                                    sampler=sampler)
+            utils_benchmark.save_results(results, bench_path)
+            probe = utils_wifi_probe.LatencyProbe(["gateway"], interval=0, timeout=0.5)
+            probe.run(5, sampler=sampler)
+            probe.save_results(probe_path)
+        sampler.flush()
+        print()
+        sampler.report()
+        return [sample_path, bench_path, probe_path]
+    finally:
+        fakes.uninstall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=SAMPLES, help="samples for timing sample()")
+    parser.add_argument("--runs", type=int, default=RUNS, help="benchmark and probe runs in the heat soak")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        bench_costs(args.samples, folder)
+        paths = heat_soak(args.runs, folder, args.seed)
+
+        import align_log
+        sessions, benchmarks, probes = align_log.load(paths)
+        found, _ = align_log.windows(benchmarks, probes)
+        align_log.align(sessions, found)
+        print("\nLined up by tools/align_log.py:\n")
+        align_log.print_sessions(sessions)
+        align_log.print_windows(found)
+        align_log.print_correlations(found)
+        missing = sum(1 for window in found if not window.samples)
+        print(f"\n{len(found) - missing} of {len(found)} results lined up with samples")
+
+
+if __name__ == "__main__":
+    main()
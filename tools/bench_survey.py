@@ -0,0 +1,100 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" utils_wifi_survey on the fake radio from the fakes package.
+
+Surveys a crowded street of made-up access points, more than the survey has room for, then checks:
+that memory stops growing once every slot is in use, that the mean and standard deviation match the
+RSSI and noise the fake radio was given, and that encode() and decode() round-trip. Prints the
+survey report and the size of the CSV and binary exports.
+
+    python tools/bench_survey.py
+    python tools/bench_survey.py --networks 60 --scans 500 --rssi-noise 6
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fakes
+from fakes.profiles import DEFAULT_NETWORKS
+
+NETWORKS = 40
+SCANS = 200
+# Scans before memory is measured, so every slot is in use and the ssid list is full
+WARMUP_SCANS = 5
+
+
+def make_networks(count, seed):
+    """DEFAULT_NETWORKS plus made-up neighbours, mostly on channels 1, 6 and 11 like real ones"""
+    rng = random.Random(seed)
+    networks = list(DEFAULT_NETWORKS)
+    for i in range(count - len(networks)):
+        channel = rng.choice((1, 1, 6, 6, 6, 11, 11, 3, 9, 36, 149))
+        bssid = bytes([0x02, 0x00, 0x00, 0x00, i >> 8, i & 0xFF])
+        networks.append((f"Neighbor-{i}", bssid, channel, rng.randint(-92, -55), "WPA2_PSK"))
+    return networks[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--networks", type=int, default=NETWORKS, help="access points in range")
+    parser.add_argument("--scans", type=int, default=SCANS)
+    parser.add_argument("--rssi-noise", type=float, default=3.0, help="standard deviation of each RSSI reading")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    networks = make_networks(args.networks, args.seed)
+    env = fakes.install("magtag", networks=networks)
+    try:
+        import utils_wifi_survey
+        random.seed(args.seed)
+        env.radio.scan_delay = 0
+        env.radio.rssi_noise = args.rssi_noise
+
+        survey = utils_wifi_survey.WifiSurvey()
+        survey.run(WARMUP_SCANS, interval=0)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        survey.run(args.scans - WARMUP_SCANS, interval=0)
+        elapsed = time.perf_counter() - start
+        growth = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        survey.report()
+
+        print(f"\n{args.networks} access points, room for {survey.max_networks}, {args.scans} scans")
+        print(f"\t{elapsed / (args.scans - WARMUP_SCANS) * 1000:.2f} ms per scan to record")
+        print(f"\tMemory growth after the first {WARMUP_SCANS} scans: {growth} bytes")
+
+        actual = {bssid: rssi for _, bssid, _, rssi, _ in networks}
+        mean_error = max(abs(survey.mean[slot] - actual[bytes(survey.bssids[slot * 6:slot * 6 + 6])])
+                         for slot in range(survey.count))
+        stddevs = [survey.stddev(slot) for slot in range(survey.count)]
+        print(f"\tWorst mean error: {mean_error:.2f} dB")
+        print(f"\tStandard deviation: {min(stddevs):.2f} to {max(stddevs):.2f} dB, "
+              f"noise was {args.rssi_noise:g} dB (readings are rounded to whole dBm)")
+
+        csv = io.StringIO()
+        survey.write_csv(csv)
+        encoded = survey.encode()
+        decoded = utils_wifi_survey.decode(encoded)
+        matches = all(
+            network["bssid"] == survey.bssid_text(slot) and network["samples"] == survey.samples[slot]
+            and abs(network["rssi_mean"] - survey.mean[slot]) < 0.01
+            for slot, network in enumerate(decoded["networks"]))
+        print(f"\tCSV export: {len(csv.getvalue().encode())} bytes, binary: {len(encoded)} bytes, "
+              f"decode() {'matches' if matches else 'DOES NOT MATCH'}")
+    finally:
+        fakes.uninstall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Desktop round-trip and size benchmark for utils_telemetry.
+Compares the binary payload against the text the print functions produce for the same data.
+
+    python tools/bench_telemetry.py
+"""
+
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fakes
+
+PROFILE = "magtag"
+I2C_ADDRESSES = {"I2C": [0x18, 0x44, 0x77], "STEMMA_I2C": [0x10, 0x3C]}
+REPEAT = 200
+
+
+def printed_size():
+    import utils_system
+    import utils_pins
+
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        utils_system.get_os_info()
+        utils_system.get_board_info()
+        utils_system.get_microcontroller_info()
+        utils_pins.get_matching_pins()
+        for bus_name, addresses in I2C_ADDRESSES.items():
+            print("\nScanning I2C bus at board." + bus_name)
+            print("\tI2C device(s) found at:")
+            for address in addresses:
+                print("\t\t" + hex(address))
+    return len(out.getvalue().encode())
+
+
+def best_time(function, *args):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    fakes.install(PROFILE)
+    import utils_system
+    import utils_pins
+    import utils_telemetry
+
+    snapshot = utils_system.collect_snapshot()
+    pin_map = utils_pins.build_pin_map()
+
+    payload = utils_telemetry.encode(snapshot, pin_map, I2C_ADDRESSES)
+    decoded = utils_telemetry.decode(payload)
+
+    # Round trip
+    expected = snapshot.as_dict()
+    for key, value in decoded["snapshot"].items():
+        if key == "statvfs":
+            assert value[0] == expected[key][0] and value[2:] == expected[key][2:4]
+        else:
+            assert value == expected[key], key
+    assert decoded["pin_map"] == {gpio: aliases for gpios, aliases in pin_map.values() for gpio in gpios}
+    assert decoded["i2c"] == I2C_ADDRESSES
+
+    # Streaming into a preallocated buffer gives the same bytes
+    buf = bytearray(4096)
+    length = utils_telemetry.encode_into(memoryview(buf), snapshot, pin_map, I2C_ADDRESSES)
+    assert buf[:length] == payload
+
+    text = printed_size()
+    print(f"printed text:      {text} bytes")
+    print(f"binary payload:    {len(payload)} bytes ({text / len(payload):.1f}x smaller)")
+    print(f"format as text:    {best_time(printed_size) * 1000:.3f} ms")
+    print(f"encode:            {best_time(utils_telemetry.encode, snapshot, pin_map, I2C_ADDRESSES) * 1000:.3f} ms")
+    print(f"encode_into:       {best_time(utils_telemetry.encode_into, buf, snapshot, pin_map, I2C_ADDRESSES) * 1000:.3f} ms")
+    print(f"decode:            {best_time(utils_telemetry.decode, payload) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
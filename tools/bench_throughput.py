@@ -0,0 +1,71 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Download and upload throughput for utils_wifi, against the local server in fakes/http_server.py.
+
+The fake radio limits every socket to --throughput bytes per second and adds its ping time to
+each round trip, so the numbers are repeatable. Prints test_bandwidth() and test_upload() for
+large transfers, then compares the heap each download size takes when streamed with
+measure_download() against reading response.content, as test_bandwidth() used to. The server
+runs in the same process, so some of the streamed peak is the server's; what matters is that it
+stays flat as the size grows.
+
+    python tools/bench_throughput.py
+    python tools/bench_throughput.py --size 20000000 --throughput 2000000 --interval 1
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fakes
+from fakes import http_server
+
+HEAP_SIZES = (16384, 262144, 1048576, 4194304)
+
+
+def heap_peak(function):
+    import utils_profile
+    with utils_profile.profile() as result:
+        function()
+    return result.peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=8000000, help="bytes to download")
+    parser.add_argument("--upload-size", type=int, default=2000000, help="bytes to upload")
+    parser.add_argument("--throughput", type=int, default=1000000, help="simulated wifi bytes per second")
+    parser.add_argument("--ping-ms", type=float, default=25.0, help="simulated wifi round trip")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds per throughput sample")
+    args = parser.parse_args()
+
+    server, base = http_server.start()
+    env = fakes.install("magtag")
+    try:
+        import utils_wifi
+        env.radio.ping_ms = args.ping_ms
+        env.radio.throughput = args.throughput
+        env.radio.connect(env.radio.networks[0][0], "password")
+
+        utils_wifi.test_bandwidth(f"{base}/bytes/{args.size}", args.interval)
+        utils_wifi.test_upload(f"{base}/upload", args.upload_size, args.interval)
+
+        # Heap doesn't depend on throughput, so don't wait for it
+        env.radio.throughput = 0
+        print(f"\n{'download bytes':>15} {'streamed peak B':>16} {'content peak B':>15}")
+        for size in HEAP_SIZES:
+            url = f"{base}/bytes/{size}"
+            streamed = heap_peak(lambda: utils_wifi.measure_download(url))
+            content = heap_peak(lambda: utils_wifi.get_session().get(url).content)
+            print(f"{size:>15} {streamed:>16} {content:>15}")
+        utils_wifi.close_session()
+    finally:
+        fakes.uninstall()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
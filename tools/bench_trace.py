@@ -0,0 +1,140 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" What utils_trace costs, and what a trace looks like, on a fake board.
+
+Times the instrumented functions with tracing off and on, and the cost of one span when it's off,
+then traces I2C discovery, the pin map, a framebuffer dashboard and an HTTP request, and prints
+the summary tools/trace_summary.py makes of the dump.
+
+    python tools/bench_trace.py
+    python tools/bench_trace.py --profile magtag --folded
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes
+import trace_summary
+
+LOOPS = 200000
+REPEAT = 20
+
+
+def span_cost(utils_trace):
+    """Nanoseconds one span adds when tracing is off, and when it's on"""
+
+    def bare():
+        for _ in range(LOOPS):
+            pass
+
+    def instrumented():
+        for _ in range(LOOPS):
+            trace = utils_trace.begin() if utils_trace.ENABLED else 0
+            if trace:
+                utils_trace.end("bench", trace)
+
+    results = []
+    for enabled in (False, True):
+        if enabled:
+            utils_trace.start()
+        best = None
+        for function in (bare, instrumented):
+            start = time.perf_counter_ns()
+            function()
+            elapsed = time.perf_counter_ns() - start
+            best = elapsed if best is None else elapsed - best
+        utils_trace.stop()
+        results.append(best / LOOPS)
+    return results
+
+
+def best_ms(function):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def session(profile):
+    """Trace a little of everything, and return what dump() printed"""
+    env = fakes.install(profile)
+    try:
+        import utils_i2c
+        import utils_pins
+        import utils_trace
+        import utils_cache
+
+        utils_cache.ENABLED = False
+        utils_trace.start(capacity=512)
+        utils_pins.build_pin_map(refresh=True)
+        utils_i2c.discover(refresh=True)
+        if env.display is not None and not env.display.eink:
+            import utils_framebuffer
+            frame = utils_framebuffer.for_display()
+            for number in range(10):
+                frame.fill(0)
+                frame.fill_rect(10, 10, number * 10 + 1, 20, utils_framebuffer.color565(0, 255, 0))
+                frame.push()
+        if env.radio is not None:
+            import utils_wifi
+            with contextlib.redirect_stdout(io.StringIO()):
+                utils_wifi.connect_wifi(env.radio.networks[0][0], "password")
+            utils_wifi.time_request()
+        utils_trace.stop()
+
+        dumped = io.StringIO()
+        with contextlib.redirect_stdout(dumped):
+            utils_trace.dump()
+        return dumped.getvalue()
+    finally:
+        utils_cache.ENABLED = True
+        fakes.uninstall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", default="clue", help="fake board for the sample trace")
+    parser.add_argument("--folded", action="store_true", help="print the sample trace as folded stacks")
+    args = parser.parse_args()
+
+    import utils_trace
+    off_ns, on_ns = span_cost(utils_trace)
+    print(f"one span: {off_ns:.0f} ns with tracing off, {on_ns:.0f} ns with it on")
+
+    with fakes.install(args.profile):
+        import utils_cache
+        import utils_i2c
+        import utils_pins
+        utils_cache.ENABLED = False
+        try:
+            for name, function in (("build_pin_map", lambda: utils_pins.build_pin_map(refresh=True)),
+                                   ("discover", lambda: utils_i2c.discover(refresh=True))):
+                off = best_ms(function)
+                utils_trace.start(capacity=4096)
+                on = best_ms(function)
+                utils_trace.stop()
+                print(f"{name + ':':<15} {off:.3f} ms with tracing off, {on:.3f} ms with it on")
+        finally:
+            utils_cache.ENABLED = True
+
+    print(f"\nSample trace on {args.profile}:\n")
+    traces = trace_summary.parse(session(args.profile).splitlines())
+    if args.folded:
+        trace_summary.print_folded(traces[-1])
+    else:
+        trace_summary.print_summary(traces[-1])
+
+
+if __name__ == "__main__":
+    main()
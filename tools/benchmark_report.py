@@ -0,0 +1,116 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Merge and compare benchmark results saved by utils_benchmark.save_results().
+
+Copy benchmarks.jsonl off each board's CIRCUITPY drive, then:
+
+    python tools/benchmark_report.py table magtag.jsonl clue.jsonl qtpy.jsonl
+    python tools/benchmark_report.py compare old.jsonl new.jsonl
+    python tools/benchmark_report.py compare results.jsonl --board adafruit_magtag_2.9_grayscale --old 9.0.0 --new 9.1.0
+
+table prints a Markdown table of median ns per operation, one row per board and firmware version.
+compare exits with status 1 if any benchmark regressed.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import utils_benchmark
+
+
+def load(paths):
+    records = []
+    for path in paths:
+        records.extend(utils_benchmark.load_results(path))
+    return records
+
+
+def group(records):
+    """Group records by (board_id, release), keeping the order boards first appear in"""
+    groups = {}
+    for record in records:
+        groups.setdefault((record["board_id"], record["release"]), []).append(record)
+    return groups
+
+
+def table(args):
+    groups = group(load(args.files))
+    names = []
+    for records in groups.values():
+        for record in records:
+            for name in record["results"]:
+                if name not in names:
+                    names.append(name)
+    if args.benchmarks:
+        names = [name for name in names if name in args.benchmarks]
+
+    print("| Board | CircuitPython | CPU MHz | " + " | ".join(names) + " |")
+    print("| --- | --- | --- | " + " | ".join("---" for _ in names) + " |")
+    for (board_id, release), records in groups.items():
+        pooled = utils_benchmark.pool_records(records)
+        mhz = records[-1]["cpu_frequency"] / 1000000
+        cells = []
+        for name in names:
+            stats = pooled.get(name)
+            cells.append("" if stats is None else "%.1f" % stats["median"])
+        print(f"| {board_id} | {release} | {mhz:g} | " + " | ".join(cells) + " |")
+    print("\nMedian ns per operation. Lower is better.")
+
+
+def select(records, board, release):
+    chosen = [r for r in records if (board is None or r["board_id"] == board) and r["release"] == release]
+    if not chosen:
+        sys.exit(f"No results for board {board or 'any'} with release {release}")
+    return chosen
+
+
+def compare(args):
+    if args.old or args.new:
+        if not (args.old and args.new):
+            sys.exit("--old and --new must be used together")
+        records = load(args.files)
+        old = select(records, args.board, args.old)
+        new = select(records, args.board, args.new)
+    else:
+        if len(args.files) != 2:
+            sys.exit("compare takes two result files, or one or more with --old and --new")
+        old, new = load(args.files[:1]), load(args.files[1:])
+        if args.board:
+            old = [r for r in old if r["board_id"] == args.board]
+            new = [r for r in new if r["board_id"] == args.board]
+
+    comparison = utils_benchmark.compare_results(
+        utils_benchmark.pool_records(old), utils_benchmark.pool_records(new), args.threshold
+    )
+    utils_benchmark.print_comparison(comparison)
+    if any(status == "regression" for *_, status in comparison):
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    table_parser = commands.add_parser("table", help="merge result files into a Markdown table")
+    table_parser.add_argument("files", nargs="+")
+    table_parser.add_argument("--benchmarks", nargs="+", help="only include these benchmarks")
+    table_parser.set_defaults(run=table)
+
+    compare_parser = commands.add_parser("compare", help="flag regressions between two runs or firmware versions")
+    compare_parser.add_argument("files", nargs="+")
+    compare_parser.add_argument("--board", help="only use results from this board_id")
+    compare_parser.add_argument("--old", help="old CircuitPython release")
+    compare_parser.add_argument("--new", help="new CircuitPython release")
+    compare_parser.add_argument("--threshold", type=float, default=utils_benchmark.REGRESSION_THRESHOLD)
+    compare_parser.set_defaults(run=compare)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Check that every utils_* module imports cheaply, and without touching hardware.
+
+Each module is imported in a fresh Python process where CircuitPython's hardware modules
+(board, wifi, adafruit_lis3dh, ...) can't be imported at all. Importing one of them at
+module level fails the check. The heap each import keeps (measured with tracemalloc) and
+its import time are compared against the budgets below.
+
+    python tools/check_imports.py
+
+Exits with status 1 if any module fails.
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Modules that only exist on CircuitPython, or that the utils_* modules only need once you use the hardware
+HARDWARE_MODULES = (
+    "board", "microcontroller", "wifi", "socketpool", "ssl", "ipaddress", "adafruit_requests",
+    "adafruit_lis3dh", "displayio", "busio", "digitalio", "analogio", "_bleio", "storage", "asyncio",
+)
+
+# Budgets on regular Python: (bytes kept after import, milliseconds).
+# CPython objects are bigger than CircuitPython ones, so these aren't the board's numbers.
+# cputils.IMPORT_BUDGETS has those, checked on the board with cputils.measure_imports().
+HOST_BUDGETS = {
+    "cputils": (16384, 20),
+    "utils_accelerometer": (98304, 20),
+    "utils_benchmark": (65536, 50),
+    "utils_cache": (40960, 20),
+    "utils_capabilities": (49152, 20),
+    "utils_display": (40960, 20),
+    "utils_framebuffer": (49152, 20),
+    "utils_i2c": (81920, 20),
+    "utils_pins": (98304, 50),
+    "utils_profile": (49152, 50),
+    "utils_report": (32768, 20),
+    "utils_sampler": (40960, 20),
+    "utils_system": (32768, 20),
+    "utils_telemetry": (65536, 50),
+    "utils_ticks": (16384, 20),
+    "utils_trace": (24576, 20),
+    "utils_wifi": (98304, 20),
+    "utils_wifi_probe": (57344, 20),
+    "utils_wifi_survey": (49152, 20),
+}
+
+CHILD = """
+import sys, time, tracemalloc
+sys.path.insert(0, {root!r})
+blocked = {blocked!r}
+
+class Blocker:
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in blocked:
+            raise ImportError(name + " imported at module level")
+        return None
+
+sys.meta_path.insert(0, Blocker())
+# Most modules use utils_profile and utils_trace, so count them separately. Importing something first
+# also warms up Python's import machinery, which would otherwise be counted against the module.
+__import__("cputils" if {module!r} == "utils_profile" else "utils_profile")
+if {module!r} != "utils_trace":
+    __import__("utils_trace")
+tracemalloc.start()
+start = time.perf_counter()
+__import__({module!r})
+elapsed = time.perf_counter() - start
+print(tracemalloc.get_traced_memory()[0], elapsed * 1000)
+"""
+
+
+def check(module):
+    code = CHILD.format(root=ROOT, blocked=HARDWARE_MODULES, module=module)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None, None, result.stderr.strip().splitlines()[-1]
+    retained, elapsed = result.stdout.split()
+    return int(retained), float(elapsed), None
+
+
+def main():
+    failed = False
+    print(f"{'module':<22} {'bytes':>8} {'budget':>8} {'ms':>8} {'budget':>8}")
+    for module, (byte_budget, ms_budget) in sorted(HOST_BUDGETS.items()):
+        retained, elapsed, error = check(module)
+        if error:
+            print(f"{module:<22} FAILED: {error}")
+            failed = True
+            continue
+        flag = ""
+        if retained > byte_budget or elapsed > ms_budget:
+            flag = " OVER"
+            failed = True
+        print(f"{module:<22} {retained:>8} {byte_budget:>8} {elapsed:>8.2f} {ms_budget:>8}{flag}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Run the HTTP server from fakes/http_server.py on your computer, for a board on the same network to test against:
+
+    python tools/local_http_server.py --port 8080
+    >>> utils_wifi.test_http_timings("http://<your computer's IP>:8080/index.html")
+    >>> utils_wifi.test_bandwidth("http://<your computer's IP>:8080/bytes/20000000")
+    >>> utils_wifi.test_upload("http://<your computer's IP>:8080/upload", 5000000)
+
+    GET /index.html     a short text page, like the default test URL
+    GET /bytes/<n>      n bytes of data
+    POST /upload        reads and throws away the body
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fakes import http_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--delay-ms", type=int, default=0, help="wait before each answer")
+    args = parser.parse_args()
+
+    server = http_server.make_server(args.host, args.port, args.delay_ms)
+    print(f"Serving on http://{args.host}:{args.port}/index.html")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
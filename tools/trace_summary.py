@@ -0,0 +1,225 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Turn a trace printed by utils_trace.dump() into a summary of where the time went.
+
+Save what the board printed over USB serial to a file (everything around the trace is ignored), then:
+
+    python tools/trace_summary.py serial.log
+    python tools/trace_summary.py serial.log --folded > trace.folded
+
+Shows a table of each span's total and self time (time not spent in spans inside it), then the spans
+as a tree, merged by where they were called from, like a flame graph turned on its side. --folded prints
+the same tree in the folded format flamegraph.pl and speedscope read instead.
+If the file has several traces, the last one is used, or pick one with --trace.
+"""
+
+import argparse
+import sys
+
+FORMAT_VERSION = 2
+# utils_ticks.TICKS_PERIOD
+WRAP = 1 << 29
+BAR_WIDTH = 30
+
+
+class Span:
+    __slots__ = ("name", "start", "end", "children", "parent")
+
+    def __init__(self, name, start, end):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.children = []
+        self.parent = None
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    @property
+    def self_time(self):
+        return self.duration - sum(child.duration for child in self.children)
+
+    def path(self):
+        names = []
+        span = self
+        while span is not None:
+            names.append(span.name)
+            span = span.parent
+        return ";".join(reversed(names))
+
+
+class Trace:
+    """One trace from dump(): spans and counter records, with times in microseconds"""
+
+    def __init__(self, capacity, recorded, dropped):
+        self.capacity = capacity
+        self.recorded = recorded
+        self.dropped = dropped
+        self.names = {}
+        self.spans = []
+        # (name, time, increase)
+        self.counters = []
+
+
+def parse(lines):
+    """Return the traces in lines, in order"""
+    traces = []
+    trace = None
+    # The ring is in the order things finished, so each record's end time only goes forward.
+    # Times are modulo WRAP, so when one goes backwards a long way, they've wrapped.
+    wraps = 0
+    last_end = 0
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+        if fields[0] == "TRACE" and len(fields) == 5:
+            version = int(fields[1])
+            if version != FORMAT_VERSION:
+                raise ValueError("unsupported trace version %d" % version)
+            trace = Trace(*(int(field) for field in fields[2:]))
+            wraps = 0
+            last_end = 0
+            continue
+        if trace is None:
+            continue
+        kind = fields[0]
+        if kind == "END":
+            traces.append(trace)
+            trace = None
+        elif kind == "N" and len(fields) >= 3:
+            trace.names[int(fields[1])] = line.split(None, 2)[2].strip()
+        elif kind in ("S", "C") and len(fields) == 4:
+            name = trace.names[int(fields[1])]
+            start, value = int(fields[2]), int(fields[3])
+            end = (start + value if kind == "S" else start) % WRAP
+            if end + wraps * WRAP < last_end - WRAP // 2:
+                wraps += 1
+            end += wraps * WRAP
+            last_end = end
+            if kind == "S":
+                trace.spans.append(Span(name, end - value, end))
+            else:
+                trace.counters.append((name, end, value))
+    return traces
+
+
+def build_tree(spans):
+    """Set each span's parent and children from how their times nest. Returns the top level spans."""
+    roots = []
+    stack = []
+    for span in sorted(spans, key=lambda span: (span.start, -span.duration)):
+        while stack and stack[-1].end < span.end:
+            stack.pop()
+        if stack:
+            span.parent = stack[-1]
+            stack[-1].children.append(span)
+        else:
+            roots.append(span)
+        stack.append(span)
+    return roots
+
+
+def totals(spans):
+    """name -> [calls, total, self, max]"""
+    result = {}
+    for span in spans:
+        entry = result.setdefault(span.name, [0, 0, 0, 0])
+        entry[0] += 1
+        entry[1] += span.duration
+        entry[2] += span.self_time
+        entry[3] = max(entry[3], span.duration)
+    return result
+
+
+def merged_paths(spans):
+    """path -> [calls, total, self], for the tree and the folded output"""
+    result = {}
+    for span in spans:
+        entry = result.setdefault(span.path(), [0, 0, 0])
+        entry[0] += 1
+        entry[1] += span.duration
+        entry[2] += span.self_time
+    return result
+
+
+def _tree_order(paths, path):
+    """Sort key that puts each path after its parent, with the slowest siblings first"""
+    names = path.split(";")
+    return tuple((-paths[";".join(names[:i + 1])][1], names[i]) for i in range(len(names)))
+
+
+def print_summary(trace, out=sys.stdout):
+    roots = build_tree(trace.spans)
+    traced = sum(span.duration for span in roots)
+    if trace.spans:
+        wall = max(span.end for span in trace.spans) - min(span.start for span in trace.spans)
+    else:
+        wall = 0
+    out.write(f"{len(trace.spans)} spans and {len(trace.counters)} counter records over {wall / 1000:.2f} ms, "
+              f"{traced / 1000:.2f} ms of it traced\n")
+    if trace.dropped:
+        out.write(f"The oldest {trace.dropped} of {trace.recorded} records were overwritten; "
+                  f"the ring holds {trace.capacity}\n")
+
+    out.write(f"\n{'span':<24} {'calls':>6} {'total ms':>10} {'self ms':>10} {'mean ms':>10} {'max ms':>10}\n")
+    for name, (calls, total, self_time, longest) in sorted(totals(trace.spans).items(),
+                                                         key=lambda item: -item[1][2]):
+        out.write(f"{name:<24} {calls:>6} {total / 1000:>10.3f} {self_time / 1000:>10.3f} "
+                  f"{total / calls / 1000:>10.3f} {longest / 1000:>10.3f}\n")
+
+    paths = merged_paths(trace.spans)
+    if paths:
+        out.write(f"\n{'where the time went':<40} {'calls':>6} {'total ms':>10} {'%':>6}\n")
+        for path in sorted(paths, key=lambda path: _tree_order(paths, path)):
+            calls, total, _ = paths[path]
+            depth = path.count(";")
+            label = "  " * depth + path.rsplit(";", 1)[-1]
+            share = total * 100 / traced if traced else 0
+            bar = "#" * round(share * BAR_WIDTH / 100)
+            out.write(f"{label:<40} {calls:>6} {total / 1000:>10.3f} {share:>5.1f}% {bar}\n")
+
+    if trace.counters:
+        counts = {}
+        for name, _, value in trace.counters:
+            entry = counts.setdefault(name, [0, 0])
+            entry[0] += 1
+            entry[1] += value
+        out.write(f"\n{'counter':<24} {'records':>8} {'total':>12}\n")
+        for name in sorted(counts):
+            records, total = counts[name]
+            out.write(f"{name:<24} {records:>8} {total:>12}\n")
+
+
+def print_folded(trace, out=sys.stdout):
+    build_tree(trace.spans)
+    for path, (_, _, self_time) in sorted(merged_paths(trace.spans).items()):
+        if self_time > 0:
+            out.write(f"{path} {self_time}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", nargs="?", default="-", help="serial output with a trace in it, or - for stdin")
+    parser.add_argument("--trace", type=int, default=-1, help="which trace in the file, from 0; the last by default")
+    parser.add_argument("--folded", action="store_true", help="print folded stacks, in microseconds of self time")
+    args = parser.parse_args()
+
+    if args.file == "-":
+        traces = parse(sys.stdin)
+    else:
+        with open(args.file, encoding="utf-8", errors="replace") as file:
+            traces = parse(file)
+    if not traces:
+        sys.exit("No trace found. Print one on the board with utils_trace.dump().")
+    trace = traces[args.trace]
+    if args.folded:
+        print_folded(trace)
+    else:
+        print_summary(trace)
+
+
+if __name__ == "__main__":
+    main()
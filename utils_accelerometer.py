@@ -1,16 +1,499 @@
 import time
-import board
-import adafruit_lis3dh
 
-# TODO Define enum for types of output formats, such as:
-# Raw values
-# Raw values divided by -9.8 to give you Gs
-# Clamped values
+from utils_profile import profiler
+from utils_ticks import ticks_add, ticks_diff, ticks_us
 
-def print_values(lis3dh: adafruit_lis3dh.lis3dh, format="G"):
-    # lis3dh.acceleration reports values in m / s ^ 2.
-    # Returns a 3-tuple of x, y, z axis values.
-    # Divide them by adafruit_lis3dh.STANDARD_GRAVITY (9.806) to convert to Gs.
+profiled = profiler(__name__)
 
-    x, y, z = [ value / adafruit_lis3dh.STANDARD_GRAVITY for value in lis3dh.acceleration]
-    print("x= %0.3f G, y= %0.3f G, z= %0.3f G" % (x, y, z))
+# Output formats, for print_values() and Pipeline
+RAW = "raw"             # raw counts from the chip, which depend on the range
+G = "G"                 # multiples of standard gravity
+MS2 = "m/s2"            # meters per second squared, what adafruit_lis3dh's acceleration reports
+CLAMPED = "clamped"     # G, limited to +/- a clamp value, so spikes don't swamp averages
+FORMATS = (RAW, G, MS2, CLAMPED)
+
+STANDARD_GRAVITY = 9.806
+
+# Raw counts per G for each adafruit_lis3dh range constant (RANGE_2_G = 0 ... RANGE_16_G = 3)
+_DIVIDERS = (16380, 8190, 4096, 1365)
+
+
+def format_scale(format, divider):
+    """How much to multiply raw counts by, to get format"""
+    if format == RAW:
+        return 1
+    if format == MS2:
+        return STANDARD_GRAVITY / divider
+    if format in (G, CLAMPED):
+        return 1 / divider
+    raise ValueError("format must be one of " + str(FORMATS))
+
+
+@profiled
+def print_values(lis3dh, format=G, clamp_g=1.0):
+    """Print one x, y, z reading in format: RAW, G, MS2 or CLAMPED (G limited to +/- clamp_g).
+    lis3dh is an adafruit_lis3dh.LIS3DH_I2C or LIS3DH_SPI."""
+
+    # lis3dh.acceleration reports values in m / s ^ 2, as a 3-tuple of x, y, z axis values.
+    # Scale them back to counts, then to the format we want.
+    to_counts = _DIVIDERS[lis3dh.range] / STANDARD_GRAVITY
+    scale = format_scale(format, _DIVIDERS[lis3dh.range]) * to_counts
+    x, y, z = [value * scale for value in lis3dh.acceleration]
+
+    from utils_report import writer
+    out = writer()
+    if format == RAW:
+        units = None
+    elif format == MS2:
+        units = b" m/s2"
+    else:
+        units = b" G"
+        if format == CLAMPED:
+            x, y, z = [max(-clamp_g, min(clamp_g, value)) for value in (x, y, z)]
+    for label, value in ((b"x= ", x), (b", y= ", y), (b", z= ", z)):
+        out.text(label)
+        if units is None:
+            out.number(round(value))
+        else:
+            out.fixed(value, 3)
+            out.text(units)
+    out.newline()
+    out.flush()
+
+
+# LIS3DH registers used by AccelerometerStream
+_CTRL_REG1 = 0x20
+_CTRL_REG4 = 0x23
+_CTRL_REG5 = 0x24
+_OUT_X_L = 0x28
+_FIFO_CTRL_REG = 0x2E
+_FIFO_SRC_REG = 0x2F
+# Set on a register address to read several registers in one transaction
+_AUTO_INCREMENT = 0x80
+_FIFO_SIZE = 32
+
+# Output data rate in Hz -> CTRL_REG1 ODR bits, in high resolution mode
+DATA_RATES = {1: 1, 10: 2, 25: 3, 50: 4, 100: 5, 200: 6, 400: 7, 1344: 9}
+
+# Full scale range in G -> CTRL_REG4 FS bits, and raw counts per G
+RANGES = {2: (0, _DIVIDERS[0]), 4: (1, _DIVIDERS[1]), 8: (2, _DIVIDERS[2]), 16: (3, _DIVIDERS[3])}
+
+class AccelerometerStream:
+    """Stream LIS3DH samples at hundreds of Hz, using the chip's 32 sample FIFO.
+
+    Each poll() reads the whole FIFO in one I2C burst, straight into a preallocated
+    ring buffer, so nothing is allocated per sample. Read samples back in blocks:
+
+        stream = AccelerometerStream(board.I2C(), data_rate=400)
+        stream.start()
+        for samples, timestamps in stream.blocks():
+            g = stream.to_g(samples)
+
+    samples:    array('h') ring of raw x, y, z counts, interleaved
+    timestamps: array('L') ring of utils_ticks.ticks_us() timestamps, one per sample, estimated from the data rate
+    read:       samples read from the chip so far
+    dropped:    samples lost because the FIFO filled up before we read it
+    overruns:   times the FIFO filled up
+
+    Blocks are views into the ring, so use them before asking for the next one.
+    Talks to the chip directly, so don't use an adafruit_lis3dh driver on it at the same time."""
+
+    def __init__(self, i2c, address=0x18, data_rate=400, range_g=2, block_size=32, blocks=8):
+        if data_rate not in DATA_RATES:
+            raise ValueError("data_rate must be one of " + str(sorted(DATA_RATES)))
+        if range_g not in RANGES:
+            raise ValueError("range_g must be one of " + str(sorted(RANGES)))
+        self.i2c = i2c
+        self.address = address
+        self.data_rate = data_rate
+        self.range_g = range_g
+        self.block_size = block_size
+        self.capacity = block_size * blocks
+
+        from array import array
+
+        self.samples = array("h", [0] * (self.capacity * 3))
+        self.timestamps = array("L", [0] * self.capacity)
+        self._g = array("f", [0.0] * (block_size * 3))
+        self._samples_view = memoryview(self.samples)
+        self._timestamps_view = memoryview(self.timestamps)
+        # The chip sends little-endian 16 bit values, x then y then z, so a burst read can land
+        # straight in the ring. CPython needs a byte view to do that. CircuitPython's memoryview
+        # slices by item but reads and writes raw bytes, so the array view already works there.
+        try:
+            self._io_view = self._samples_view.cast("B")
+        except AttributeError:
+            self._io_view = self._samples_view
+        self._io_per_sample = len(self._io_view) // self.capacity
+        self._register = bytearray(2)
+
+        self._write_index = 0
+        self._read_index = 0
+        self.available = 0
+        self.read = 0
+        self.dropped = 0
+        self.overruns = 0
+        self._last_poll_us = 0
+        self._period_us = 1000000 // data_rate
+
+    def _lock(self):
+        while not self.i2c.try_lock():
+            pass
+
+    def _write_register(self, register, value):
+        self._register[0] = register
+        self._register[1] = value
+        self.i2c.writeto(self.address, self._register)
+
+    def _read_register(self, register):
+        self._register[0] = register
+        self.i2c.writeto_then_readfrom(self.address, self._register, self._register, out_end=1, in_start=1)
+        return self._register[1]
+
+    def start(self):
+        """Set the data rate and range, turn on the FIFO in stream mode, and empty the ring"""
+        range_bits = RANGES[self.range_g][0]
+        self._lock()
+        try:
+            # Data rate, normal power, x y and z on
+            self._write_register(_CTRL_REG1, (DATA_RATES[self.data_rate] << 4) | 0x07)
+            # Block data update, range, high resolution
+            self._write_register(_CTRL_REG4, 0x80 | (range_bits << 4) | 0x08)
+            self._write_register(_CTRL_REG5, 0x40)
+            # Stream mode: the FIFO keeps the newest 32 samples
+            self._write_register(_FIFO_CTRL_REG, 0x80)
+        finally:
+            self.i2c.unlock()
+        self._write_index = 0
+        self._read_index = 0
+        self.available = 0
+        self._last_poll_us = ticks_us()
+
+    def stop(self):
+        """Turn off the FIFO and put the chip in power down mode"""
+        self._lock()
+        try:
+            self._write_register(_FIFO_CTRL_REG, 0x00)
+            self._write_register(_CTRL_REG5, 0x00)
+            self._write_register(_CTRL_REG1, 0x07)
+        finally:
+            self.i2c.unlock()
+
+    @profiled
+    def poll(self):
+        """Move whatever is in the FIFO into the ring. Returns the number of new samples.
+        Call this at least every 32 / data_rate seconds, or samples get dropped."""
+
+        now_us = ticks_us()
+        self._lock()
+        try:
+            fifo_src = self._read_register(_FIFO_SRC_REG)
+            count = fifo_src & 0x1F
+            if fifo_src & 0x40:
+                # Full. Anything the chip made beyond these 32 samples is gone.
+                count = _FIFO_SIZE
+                self.overruns += 1
+                expected = ticks_diff(now_us, self._last_poll_us) // self._period_us
+                if expected > count:
+                    self.dropped += expected - count
+            # If the ring is full, leave the rest in the FIFO for next time
+            count = min(count, self.capacity - self.available)
+            first = self._write_index
+            remaining = count
+            while remaining:
+                # The ring may wrap, so read up to its end, then from its start
+                chunk = min(remaining, self.capacity - self._write_index)
+                start = self._write_index * self._io_per_sample
+                self._register[0] = _OUT_X_L | _AUTO_INCREMENT
+                self.i2c.writeto_then_readfrom(
+                    self.address, self._register, self._io_view[start:start + chunk * self._io_per_sample], out_end=1)
+                self._write_index = (self._write_index + chunk) % self.capacity
+                remaining -= chunk
+        finally:
+            self.i2c.unlock()
+        self._last_poll_us = now_us
+
+        # The newest sample was made about now, and the rest at the data rate before it
+        timestamps = self.timestamps
+        for i in range(count):
+            timestamps[(first + i) % self.capacity] = ticks_add(now_us, -(count - 1 - i) * self._period_us)
+        self.available += count
+        self.read += count
+        return count
+
+    def blocks(self, count=None):
+        """Yield (samples, timestamps) for each block of block_size samples, polling as needed.
+        samples holds block_size x, y, z triples of raw counts. Yields count blocks, or forever if count is None."""
+
+        # Poll when the FIFO is about half full
+        wait = min(self.block_size, _FIFO_SIZE // 2) / self.data_rate
+        size = self.block_size
+        done = 0
+        while count is None or done < count:
+            while self.available < size:
+                if self.poll() == 0:
+                    time.sleep(wait)
+            start = self._read_index
+            yield (self._samples_view[start * 3:(start + size) * 3], self._timestamps_view[start:start + size])
+            # The caller is done with the block, so the ring can reuse it
+            self._read_index = (start + size) % self.capacity
+            self.available -= size
+            done += 1
+
+    def to_g(self, samples, out=None):
+        """Convert raw counts to G, all at once. Fills and returns out, or a preallocated array('f')
+        that's reused on every call."""
+        return self.convert(samples, G, out)
+
+    def convert(self, samples, format, out=None, clamp_g=1.0):
+        """Convert raw counts to format, all at once, like to_g()"""
+        if out is None:
+            out = self._g
+        scale = format_scale(format, RANGES[self.range_g][1])
+        if format == CLAMPED:
+            for i in range(len(samples)):
+                out[i] = max(-clamp_g, min(clamp_g, samples[i] * scale))
+        else:
+            for i in range(len(samples)):
+                out[i] = samples[i] * scale
+        return out
+
+
+# Streaming reducers and filters. Each one takes one value at a time and uses fixed memory,
+# so they can run on every sample without allocating. Pipeline makes one of each per axis.
+
+class RunningStats:
+    """Mean, standard deviation, min and max, updated one value at a time (Welford's method)"""
+
+    fields = ("mean", "stddev", "min", "max")
+    per_window = True
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        return value
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def values(self):
+        return (self.mean, self.variance ** 0.5, self.min, self.max)
+
+
+class PeakToPeak:
+    """Largest minus smallest value since the last reset"""
+
+    fields = ("p2p",)
+    per_window = True
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.low = None
+        self.high = None
+
+    def update(self, value):
+        if self.low is None or value < self.low:
+            self.low = value
+        if self.high is None or value > self.high:
+            self.high = value
+        return value
+
+    def values(self):
+        return (0.0 if self.low is None else self.high - self.low,)
+
+
+class MovingRMS:
+    """Root mean square of the last window values. Keeps going across Pipeline windows."""
+
+    fields = ("rms",)
+    per_window = False
+
+    def __init__(self, window=64):
+        from array import array
+
+        self._squares = array("f", [0.0] * window)
+        self._index = 0
+        self._count = 0
+        self._sum = 0.0
+
+    def reset(self):
+        for i in range(len(self._squares)):
+            self._squares[i] = 0.0
+        self._index = 0
+        self._count = 0
+        self._sum = 0.0
+
+    def update(self, value):
+        square = value * value
+        self._sum += square - self._squares[self._index]
+        self._squares[self._index] = square
+        self._index = (self._index + 1) % len(self._squares)
+        if self._count < len(self._squares):
+            self._count += 1
+        return value
+
+    def values(self):
+        # Rounding can leave the running sum a hair below zero
+        return ((max(0.0, self._sum) / self._count) ** 0.5 if self._count else 0.0,)
+
+
+class LowPass:
+    """First order IIR low-pass filter. Returns the filtered value.
+    alpha is between 0 and 1; smaller is smoother. Use from_cutoff() to pick it from a frequency."""
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.value = None
+
+    @classmethod
+    def from_cutoff(cls, cutoff_hz, sample_rate):
+        dt = 1 / sample_rate
+        rc = 1 / (2 * 3.141592653589793 * cutoff_hz)
+        return cls(dt / (rc + dt))
+
+    def reset(self):
+        self.value = None
+
+    def update(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class HighPass(LowPass):
+    """First order IIR high-pass filter: whatever the matching low-pass filter takes out.
+    Removes gravity and slow tilts, and leaves vibration."""
+
+    def update(self, value):
+        return value - LowPass.update(self, value)
+
+
+class WindowRecord:
+    """What Pipeline emits once per window.
+    values maps each reducer field, like "rms" or "p2p", to an (x, y, z) tuple."""
+
+    __slots__ = ("start_us", "end_us", "samples", "values")
+
+    def __init__(self, start_us, end_us, samples, values):
+        self.start_us = start_us
+        self.end_us = end_us
+        self.samples = samples
+        self.values = values
+
+
+class Pipeline:
+    """Reduce AccelerometerStream samples to one record per window, instead of printing every sample.
+
+    format:    RAW, G, MS2 or CLAMPED (G limited to +/- clamp_g)
+    window:    samples per record
+    filters:   functions that make a filter for one axis, applied in order before the reducers,
+               like lambda: HighPass.from_cutoff(5, 400)
+    reducers:  functions that make a reducer for one axis, like RunningStats or lambda: MovingRMS(128)
+
+        stream = AccelerometerStream(board.I2C(), data_rate=400)
+        pipeline = Pipeline(stream, window=400, reducers=(MovingRMS, PeakToPeak))
+        pipeline.run()      # prints one line a second"""
+
+    def __init__(self, stream, format=G, window=256, filters=(), reducers=(RunningStats,), clamp_g=1.0):
+        self.stream = stream
+        self.format = format
+        self.window = window
+        self.clamp_g = clamp_g
+        self._scale = format_scale(format, RANGES[stream.range_g][1])
+        self._filters = [[make() for make in filters] for _ in range(3)]
+        self._reducers = [[make() for make in reducers] for _ in range(3)]
+        self.fields = [field for reducer in self._reducers[0] for field in reducer.fields]
+        self._count = 0
+        self._start_us = 0
+
+    def feed(self, samples, timestamps):
+        """Run a block of raw samples through the pipeline. Returns the records for any windows it finished."""
+        records = []
+        scale = self._scale
+        clamp = self.clamp_g if self.format == CLAMPED else None
+        axes = ((0, self._filters[0], self._reducers[0]),
+                (1, self._filters[1], self._reducers[1]),
+                (2, self._filters[2], self._reducers[2]))
+        for i in range(len(samples) // 3):
+            if self._count == 0:
+                self._start_us = timestamps[i]
+            for axis, filters, reducers in axes:
+                value = samples[i * 3 + axis] * scale
+                if clamp is not None:
+                    value = max(-clamp, min(clamp, value))
+                for stage in filters:
+                    value = stage.update(value)
+                for reducer in reducers:
+                    reducer.update(value)
+            self._count += 1
+            if self._count == self.window:
+                records.append(self._emit(timestamps[i]))
+        return records
+
+    def _emit(self, end_us):
+        values = {}
+        per_axis = [[value for reducer in reducers for value in reducer.values()] for reducers in self._reducers]
+        for i, field in enumerate(self.fields):
+            values[field] = (per_axis[0][i], per_axis[1][i], per_axis[2][i])
+        record = WindowRecord(self._start_us, end_us, self._count, values)
+        for reducers in self._reducers:
+            for reducer in reducers:
+                if reducer.per_window:
+                    reducer.reset()
+        self._count = 0
+        return record
+
+    def records(self, count=None):
+        """Yield count records, or forever if count is None, reading blocks from the stream"""
+        done = 0
+        for samples, timestamps in self.stream.blocks():
+            for record in self.feed(samples, timestamps):
+                yield record
+                done += 1
+                if count is not None and done >= count:
+                    return
+
+    def header(self):
+        """CSV header for format_record()"""
+        columns = ["start_us", "end_us", "samples"]
+        for field in self.fields:
+            columns += [field + "_x", field + "_y", field + "_z"]
+        return ",".join(columns)
+
+    def format_record(self, record):
+        """One CSV line for record"""
+        line = "%d,%d,%d" % (record.start_us, record.end_us, record.samples)
+        for field in self.fields:
+            line += ",%.4f,%.4f,%.4f" % record.values[field]
+        return line
+
+    def run(self, count=None):
+        """Start the stream, and print the CSV header then one line per window"""
+        self.stream.start()
+        print(self.header())
+        try:
+            for record in self.records(count):
+                print(self.format_record(record))
+        finally:
+            self.stream.stop()
@@ -2,52 +2,334 @@
 # Inspired by TodBot's circuitpython-tricks: https://github.com/todbot/circuitpython-tricks
 # And by Adafruit/Kattni Rembor's CircuitPython Essentials: https://learn.adafruit.com/circuitpython-essentials/circuitpython-essentials
 # MIT license
-""" Helper functions for learning about your boards """
+""" Micro-benchmarks for comparing boards. Also runs on regular Python, for a desktop reference:
+
+    python utils_benchmark.py
+"""
 
 import time
-import random
+import gc
+import utils_profile
+from utils_profile import profiler
+from utils_ticks import ticks_diff, ticks_ms, ticks_us
 
-# How many iterations to perform. On a microcontroller, performance almost never varies, so brief tests are fine.
-NUM_OPERATIONS = 1000000
+profiled = profiler(__name__)
 
-# Function to benchmark integer math
-def int_math():
-    print("\tPerforming", NUM_OPERATIONS, "ingeter math operations")
+# How many loop iterations make up one measurement.
+# Each benchmark can scale this down if a single operation is slow.
+ITERATIONS = 10000
+# Measurements taken and thrown away before timing, so caches and the heap settle
+WARMUP = 1
+# Measurements kept for the statistics
+REPEAT = 5
+# Where save_results() appends runs. On the board, this is the root of CIRCUITPY.
+RESULTS_FILE = "benchmarks.jsonl"
+# Changes smaller than this fraction of the old mean are never flagged by compare_results()
+REGRESSION_THRESHOLD = 0.05
 
-    int_random1 = random.randint(0,1000)
-    int_random2 = random.randint(0,1000)
-    start_time = time.monotonic()
-    result = 0
+# Registered benchmarks, as (name, function, scale), in the order they're defined.
+# Each function takes an iteration count and runs one operation per iteration.
+BENCHMARKS = []
+
+def benchmark(name, scale=1):
+    """Decorator that registers a benchmark. scale divides ITERATIONS for slow operations."""
+    def register(function):
+        BENCHMARKS.append((name, function, scale))
+        return function
+    return register
 
-    for _ in range(NUM_OPERATIONS):
-        result += int_random1
-        result -= int_random2
+# The loop on its own. Its time is subtracted from every other benchmark.
+def _empty_loop(iterations):
+    for _ in range(iterations):
+        pass
 
-    end_time = time.monotonic()
-    return end_time - start_time
+@benchmark("int_math")
+def int_math(iterations):
+    import random
+
+    a = random.randint(0, 1000)
+    b = random.randint(0, 1000)
+    result = 0
+    for _ in range(iterations):
+        result += a
+        result -= b
+    return result
 
-# Function to benchmark floating point math
-def float_math():
-    print("\tPerforming", NUM_OPERATIONS, "float math operations")
+@benchmark("float_math")
+def float_math(iterations):
+    import random
 
-    float_random1 = random.uniform(1.0,1000.0)
-    float_random2 = random.uniform(1.0,1000.0)
-    start_time = time.monotonic()
+    a = random.uniform(1.0, 1000.0)
+    b = random.uniform(1.0, 1000.0)
     result = 0.0
+    for _ in range(iterations):
+        result += a
+        result -= b
+    return result
+
+def _nothing():
+    pass
+
+@benchmark("function_call")
+def function_call(iterations):
+    function = _nothing
+    for _ in range(iterations):
+        function()
+
+class _Thing:
+    def __init__(self):
+        self.value = 1
+
+@benchmark("attribute_access")
+def attribute_access(iterations):
+    thing = _Thing()
+    result = 0
+    for _ in range(iterations):
+        result = thing.value
+    return result
+
+@benchmark("list_append_pop")
+def list_append_pop(iterations):
+    items = []
+    for i in range(iterations):
+        items.append(i)
+        items.pop()
+
+@benchmark("dict_set_get")
+def dict_set_get(iterations):
+    table = {}
+    result = 0
+    for i in range(iterations):
+        table["key"] = i
+        result = table["key"]
+    return result
+
+@benchmark("bytearray_index")
+def bytearray_index(iterations):
+    buf = bytearray(64)
+    for i in range(iterations):
+        buf[i & 63] = i & 0xFF
+
+@benchmark("string_format")
+def string_format(iterations):
+    result = ""
+    for i in range(iterations):
+        result = "%d:%d" % (i, i)
+    return result
+
+@benchmark("allocation")
+def allocation(iterations):
+    result = None
+    for _ in range(iterations):
+        result = bytearray(32)
+    return result
+
+@benchmark("gc_collect", scale=100)
+def gc_collect(iterations):
+    for _ in range(iterations):
+        gc.collect()
 
-    for _ in range(NUM_OPERATIONS):
-        result += float_random1
-        result -= float_random1
+def _time_us(function, iterations):
+    # Microseconds, so boards without long integers can time runs of more than a second
+    start = ticks_us()
+    function(iterations)
+    return ticks_diff(ticks_us(), start)
 
-    end_time = time.monotonic()
-    return end_time - start_time
+def stats(samples):
+    """min, median, mean and sample standard deviation of a list of numbers"""
+    ordered = sorted(samples)
+    count = len(ordered)
+    middle = count // 2
+    if count % 2:
+        median = ordered[middle]
+    else:
+        median = (ordered[middle - 1] + ordered[middle]) / 2
+    mean = sum(ordered) / count
+    if count > 1:
+        stddev = (sum((x - mean) ** 2 for x in ordered) / (count - 1)) ** 0.5
+    else:
+        stddev = 0.0
+    return {"min": ordered[0], "median": median, "mean": mean, "stddev": stddev, "n": count}
+
+def measure(function, iterations=ITERATIONS, repeat=REPEAT, warmup=WARMUP):
+    """Time function(iterations) repeat times, after warmup untimed runs.
+    Returns statistics in nanoseconds per operation, with the empty loop's time subtracted."""
+
+    baseline = min(_time_us(_empty_loop, iterations) for _ in range(warmup + repeat))
+
+    for _ in range(warmup):
+        function(iterations)
+
+    samples = []
+    for _ in range(repeat):
+        elapsed = _time_us(function, iterations) - baseline
+        samples.append(max(elapsed, 0) / iterations * 1000)
+    return stats(samples)
 
 # Benchmarking
-def run_benchmark():
-    print("Running math benchmark...")
+def run_benchmark(names=None, iterations=ITERATIONS, repeat=REPEAT, warmup=WARMUP, sampler=None):
+    """Run the registered benchmarks, or only those in names, and print a table.
+    Returns a dict of benchmark name -> statistics, in nanoseconds per operation.
+    Each benchmark's statistics also have the utils_ticks.ticks_ms() it started and ended at.
+    Give a utils_sampler.SystemSampler to sample the CPU's frequency, temperature and voltage
+    right before and after each benchmark."""
+
+    print("Running benchmarks...")
+    print("\t%-20s %12s %12s %12s" % ("ns per operation", "min", "median", "stddev"))
+
+    results = {}
+    for name, function, scale in BENCHMARKS:
+        if names is not None and name not in names:
+            continue
+        gc.collect()
+        if sampler is not None:
+            sampler.sample()
+        start_ms = ticks_ms()
+        if utils_profile.ENABLED:
+            # Profile each benchmark on its own, so the report shows what each one allocates
+            with utils_profile.profile("benchmark " + name):
+                stats = measure(function, max(1, iterations // scale), repeat, warmup)
+        else:
+            stats = measure(function, max(1, iterations // scale), repeat, warmup)
+        stats["start_ms"] = start_ms
+        stats["end_ms"] = ticks_ms()
+        if sampler is not None:
+            sampler.sample()
+        results[name] = stats
+        print("\t%-20s %12.1f %12.1f %12.1f" % (name, stats["min"], stats["median"], stats["stddev"]))
+    return results
+
+def _board_details():
+    """board_id, CircuitPython release and CPU frequency, or desktop equivalents on regular Python"""
+    try:
+        import utils_system
+        snapshot = utils_system.collect_snapshot()
+        return snapshot.board_id, snapshot.release, snapshot.cpu_frequency
+    except ImportError:
+        import sys
+        return "desktop_" + sys.platform, sys.implementation.name + "-" + sys.version.split()[0], 0
+
+def make_record(results):
+    """Wrap results from run_benchmark() with the board, firmware and CPU frequency they came from.
+    time and monotonic_ms, utils_ticks.ticks_ms(), are read together, so tools/align_log.py can tell
+    which boot a run was from."""
+    board_id, release, cpu_frequency = _board_details()
+    return {
+        "time": time.time(),
+        "monotonic_ms": ticks_ms(),
+        "board_id": board_id,
+        "release": release,
+        "cpu_frequency": cpu_frequency,
+        "results": results,
+    }
+
+@profiled
+def save_results(results, path=RESULTS_FILE):
+    """Append a run to path, one JSON record per line. Returns the record.
+    CIRCUITPY is read-only to code unless boot.py remounts it, so this may fail on the board."""
+    import json
+
+    record = make_record(results)
+    try:
+        with open(path, "a") as file:
+            file.write(json.dumps(record))
+            file.write("\n")
+    except OSError as e:
+        print("\tCouldn't save benchmark results to", path, e)
+        print("\tTo write to CIRCUITPY, call storage.remount('/', readonly=False) in boot.py")
+    return record
+
+def load_results(path=RESULTS_FILE):
+    """Read every record saved by save_results()"""
+    import json
+
+    records = []
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+def pool_records(records):
+    """Combine several runs into one set of statistics per benchmark, as if they were a single run.
+    Useful for comparing all runs of one firmware version against all runs of another."""
+    pooled = {}
+    for record in records:
+        for name, stats in record["results"].items():
+            current = pooled.get(name)
+            if current is None:
+                current = pooled[name] = dict(stats)
+                # A pool of runs has no one start and end
+                current.pop("start_ms", None)
+                current.pop("end_ms", None)
+                continue
+            n1, n2 = current["n"], stats["n"]
+            n = n1 + n2
+            mean = (current["mean"] * n1 + stats["mean"] * n2) / n
+            # Sums of squared differences from each mean, moved to the combined mean
+            ss = (current["stddev"] ** 2 * (n1 - 1) + n1 * (current["mean"] - mean) ** 2
+                  + stats["stddev"] ** 2 * (n2 - 1) + n2 * (stats["mean"] - mean) ** 2)
+            current["n"] = n
+            current["mean"] = mean
+            current["stddev"] = (ss / (n - 1)) ** 0.5
+            current["min"] = min(current["min"], stats["min"])
+            # Medians can't be combined exactly. Keep the one from the larger sample.
+            if n2 > n1:
+                current["median"] = stats["median"]
+    return pooled
+
+# Two-sided 95% critical values of Student's t, by degrees of freedom
+_T_CRITICAL = ((1, 12.71), (2, 4.30), (3, 3.18), (4, 2.78), (5, 2.57), (6, 2.45), (7, 2.36),
+               (8, 2.31), (9, 2.26), (10, 2.23), (15, 2.13), (20, 2.09), (30, 2.04))
+
+def _t_critical(df):
+    for limit, value in _T_CRITICAL:
+        if df <= limit:
+            return value
+    return 1.96
+
+def compare_results(old, new, threshold=REGRESSION_THRESHOLD):
+    """Compare two sets of statistics, such as results from run_benchmark() or pool_records().
+    Uses Welch's t-test on the means. A benchmark is only flagged when the change is both
+    statistically significant and larger than threshold.
+    Returns a list of (name, old mean, new mean, relative change, status),
+    where status is "regression", "improvement" or "same"."""
+
+    comparison = []
+    for name, before in old.items():
+        after = new.get(name)
+        if after is None:
+            continue
+        change = (after["mean"] - before["mean"]) / before["mean"] if before["mean"] else 0.0
+        var1 = before["stddev"] ** 2 / before["n"]
+        var2 = after["stddev"] ** 2 / after["n"]
+        spread = (var1 + var2) ** 0.5
+        status = "same"
+        if abs(change) > threshold:
+            if spread == 0:
+                significant = True
+            else:
+                t = abs(after["mean"] - before["mean"]) / spread
+                # Welch-Satterthwaite degrees of freedom
+                denominator = 0.0
+                if before["n"] > 1:
+                    denominator += var1 ** 2 / (before["n"] - 1)
+                if after["n"] > 1:
+                    denominator += var2 ** 2 / (after["n"] - 1)
+                df = (var1 + var2) ** 2 / denominator if denominator else 1
+                significant = t > _t_critical(df)
+            if significant:
+                status = "regression" if change > 0 else "improvement"
+        comparison.append((name, before["mean"], after["mean"], change, status))
+    return comparison
 
-    time_int = int_math()
-    time_float = float_math()
+def print_comparison(comparison):
+    """Print the output of compare_results()"""
+    print("\t%-20s %12s %12s %8s" % ("ns per operation", "old", "new", "change"))
+    for name, old_mean, new_mean, change, status in comparison:
+        flag = "" if status == "same" else status.upper()
+        print("\t%-20s %12.1f %12.1f %+7.1f%% %s" % (name, old_mean, new_mean, change * 100, flag))
 
-    print(f"\tInteger math: {time_int} seconds")
-    print(f"\tTime taken for floating-point math: {time_float} seconds")
+if __name__ == "__main__":
+    run_benchmark()
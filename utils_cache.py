@@ -0,0 +1,380 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Board details that only change with the firmware, kept from one boot to the next.
+
+utils_pins.build_pin_map(), utils_i2c.discover() and utils_system.collect_snapshot() keep what they
+find here, so after a reboot they don't have to work it out again. Everything is stored under the
+board's board_id and CircuitPython version, and thrown away when either one changes:
+
+    import utils_cache
+    utils_cache.get_cache_info()     # where it's kept, and what's in it
+    utils_cache.clear()              # start over
+
+It's kept in the last NVM_BYTES of microcontroller.nvm, so the start of nvm is still yours. Those bytes
+are only used if they're blank or already hold the cache, so it never writes over something of yours.
+Boards with less nvm than twice NVM_BYTES, or something else at the end of it, keep it in a file instead,
+which only works if boot.py has made CIRCUITPY writable; otherwise nothing is kept, and everything still
+works, just without the head start.
+Set CPUTILS_CACHE_PATH in settings.toml to use a different file.
+
+I2C devices can be plugged in and out, so utils_i2c still scans every bus. Only devices at
+addresses it hasn't seen before are identified again. """
+
+import struct
+
+# The CRC-32 is kept as two 16 bit halves, since boards without long integers can't hold it whole
+try:
+    from binascii import crc32
+    # Without long integers, binascii can't return most CRCs either
+    crc32(b"a")
+
+    def _crc(data):
+        """CRC-32 of data, as (high 16 bits, low 16 bits)"""
+        crc = crc32(data)
+        return crc >> 16, crc & 0xFFFF
+except (ImportError, OverflowError):
+    def _crc(data):
+        """CRC-32 of data, as (high 16 bits, low 16 bits)"""
+        high = 0xFFFF
+        low = 0xFFFF
+        for byte in data:
+            low ^= byte
+            for _ in range(8):
+                carry = low & 1
+                low = (low >> 1) | ((high & 1) << 15)
+                high >>= 1
+                if carry:
+                    high ^= 0xEDB8
+                    low ^= 0x8320
+        return high ^ 0xFFFF, low ^ 0xFFFF
+
+from utils_profile import profiler
+
+profiled = profiler(__name__)
+
+# Every stored cache starts with MAGIC and FORMAT_VERSION.
+# Bump FORMAT_VERSION whenever the layout below changes, and old caches are ignored.
+MAGIC = b"CPC"
+FORMAT_VERSION = 2
+
+# Bytes at the end of microcontroller.nvm the cache may use, if they're blank or already hold it
+NVM_BYTES = 2048
+PATH = "/.cputils_cache"
+
+# Set to False to ignore the cache and never write it
+ENABLED = True
+
+# Layout, all little-endian:
+#   header:     "CPC", version u8, body length u16, CRC-32 of the body: high u16, low u16
+#   body:       one value, a dict of section name -> value, where the key section is
+#               "board_id release". Values are a tag byte and what follows it:
+#               None, False, True; int (i32); string (length u8, UTF-8 bytes);
+#               one of the first 256 strings stored, again (index u8);
+#               list and dict (count u16, then the items).
+#               Strings are numbered in the order they first appear, so pin names
+#               that show up in several sections are only stored once.
+_HEADER = "<3sBHHH"
+_HEADER_SIZE = struct.calcsize(_HEADER)
+
+_NONE = 0
+_FALSE = 1
+_TRUE = 2
+_INT = 3
+_STRING = 4
+_STRING_REF = 5
+_LIST = 6
+_DICT = 7
+
+# Sections for this firmware, from load(), or None until it runs
+_sections = None
+# The bytes last read or written, so saving the same thing again doesn't wear out the flash
+_stored = None
+
+
+def _key():
+    import os
+    import board
+    return board.board_id + " " + os.uname().release
+
+
+def _encode(out, value, strings):
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, int):
+        out.append(_INT)
+        out.extend(struct.pack("<i", value))
+    elif isinstance(value, str):
+        index = strings.get(value)
+        if index is not None:
+            out.append(_STRING_REF)
+            out.append(index)
+            return
+        data = value.encode()
+        if len(data) > 255:
+            raise ValueError("string too long to cache: " + value[:20])
+        out.append(_STRING)
+        out.append(len(data))
+        out.extend(data)
+        if len(strings) < 256:
+            strings[value] = len(strings)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        out.extend(struct.pack("<H", len(value)))
+        for key, item in value.items():
+            _encode(out, key, strings)
+            _encode(out, item, strings)
+    else:
+        out.append(_LIST)
+        out.extend(struct.pack("<H", len(value)))
+        for item in value:
+            _encode(out, item, strings)
+
+
+def _decode(data, pos, strings):
+    """Returns (value, position after it)"""
+    tag = data[pos]
+    pos += 1
+    if tag == _NONE:
+        return None, pos
+    if tag == _FALSE:
+        return False, pos
+    if tag == _TRUE:
+        return True, pos
+    if tag == _INT:
+        return struct.unpack_from("<i", data, pos)[0], pos + 4
+    if tag == _STRING:
+        end = pos + 1 + data[pos]
+        value = bytes(data[pos + 1:end]).decode()
+        if len(strings) < 256:
+            strings.append(value)
+        return value, end
+    if tag == _STRING_REF:
+        return strings[data[pos]], pos + 1
+    if tag == _LIST or tag == _DICT:
+        count = struct.unpack_from("<H", data, pos)[0]
+        pos += 2
+        if tag == _LIST:
+            items = []
+            for _ in range(count):
+                item, pos = _decode(data, pos, strings)
+                items.append(item)
+            return items, pos
+        items = {}
+        for _ in range(count):
+            key, pos = _decode(data, pos, strings)
+            items[key], pos = _decode(data, pos, strings)
+        return items, pos
+    raise ValueError("unknown tag %d" % tag)
+
+
+def encode(sections):
+    """Encode a dict of sections, with a header and checksum, into a new bytearray"""
+    body = bytearray()
+    _encode(body, sections, {})
+    if len(body) > 0xFFFF:
+        raise ValueError("cache too big")
+    crc_high, crc_low = _crc(body)
+    data = bytearray(struct.pack(_HEADER, MAGIC, FORMAT_VERSION, len(body), crc_high, crc_low))
+    data.extend(body)
+    return data
+
+
+def decode(data):
+    """Decode what encode() made. Returns the dict of sections, or None if it's missing, damaged or
+    from a different FORMAT_VERSION."""
+    if len(data) < _HEADER_SIZE:
+        return None
+    magic, version, length, crc_high, crc_low = struct.unpack_from(_HEADER, data, 0)
+    if magic != MAGIC or version != FORMAT_VERSION or _HEADER_SIZE + length > len(data):
+        return None
+    body = memoryview(data)[_HEADER_SIZE:_HEADER_SIZE + length]
+    if _crc(body) != (crc_high, crc_low):
+        return None
+    try:
+        return _decode(body, 0, [])[0]
+    except (ValueError, IndexError):
+        return None
+
+
+def _nvm():
+    """microcontroller.nvm, if it's big enough to lend NVM_BYTES of its end to the cache"""
+    import microcontroller
+    nvm = getattr(microcontroller, "nvm", None)
+    if nvm is None or len(nvm) < 2 * NVM_BYTES:
+        return None
+    return nvm
+
+
+def _nvm_ours(nvm, start):
+    """Whether the cache may write nvm from start: it's there already, or the bytes are blank,
+    all 0xFF like erased flash or all 0x00. Anything else belongs to someone else."""
+    if nvm[start:start + 3] == MAGIC:
+        return True
+    blank = nvm[start]
+    if blank != 0xFF and blank != 0x00:
+        return False
+    for byte in nvm[start:]:
+        if byte != blank:
+            return False
+    return True
+
+
+def _release(nvm, start):
+    """Make the copy in nvm unreadable, keeping MAGIC so the bytes stay the cache's.
+    Version 0 is never a FORMAT_VERSION."""
+    if nvm[start + 3] != 0:
+        nvm[start + 3] = 0
+
+
+def _path():
+    import os
+    return os.getenv("CPUTILS_CACHE_PATH") or PATH
+
+
+def _read():
+    """What's stored, from nvm or the file, as (bytes, where), or (None, None)"""
+    nvm = _nvm()
+    if nvm is not None:
+        start = len(nvm) - NVM_BYTES
+        # A released copy has version 0, and the cache is in the file, if anywhere
+        if nvm[start:start + 3] == MAGIC and nvm[start + 3] != 0:
+            return nvm[start:], "nvm"
+    try:
+        with open(_path(), "rb") as file:
+            return file.read(), "file"
+    except OSError:
+        return None, None
+
+
+def _write(data):
+    """Store data in nvm if it fits, or the file. Returns where, or None if neither worked."""
+    nvm = _nvm()
+    if nvm is not None:
+        start = len(nvm) - NVM_BYTES
+        if len(data) <= NVM_BYTES and _nvm_ours(nvm, start):
+            if nvm[start:start + len(data)] != data:
+                nvm[start:start + len(data)] = data
+            return "nvm"
+        if nvm[start:start + 3] == MAGIC:
+            # Too big for nvm now, so make sure the old copy there isn't read instead of the file
+            _release(nvm, start)
+    try:
+        with open(_path(), "wb") as file:
+            file.write(data)
+        return "file"
+    except OSError:
+        # CIRCUITPY is read-only unless boot.py remounts it
+        return None
+
+
+@profiled
+def load():
+    """Read the cache, once per boot. Returns its sections, or an empty dict if there's nothing
+    stored for this board and firmware."""
+    global _sections, _stored
+    if _sections is None:
+        _sections = {}
+        data, _ = _read()
+        if data is not None:
+            sections = decode(data)
+            if sections is not None and sections.get("key") == _key():
+                _sections = sections
+                _stored = bytes(data[:_HEADER_SIZE + struct.unpack_from("<H", data, 4)[0]])
+    return _sections
+
+
+def get(name):
+    """The value stored for section name, or None"""
+    if not ENABLED:
+        return None
+    return load().get(name)
+
+
+def put(name, value):
+    """Store value as section name, writing the cache if anything changed.
+    value can be None, a bool, an int, a string, or a list, tuple or dict of those.
+    Tuples come back as lists. Returns True if it's stored, and False if there's nowhere to keep it."""
+    if not ENABLED:
+        return False
+    sections = load()
+    sections[name] = value
+    return save()
+
+
+@profiled
+def save():
+    """Write the cache, unless it's already stored. Returns True if it's stored."""
+    global _stored
+    sections = load()
+    sections["key"] = _key()
+    data = encode(sections)
+    if data == _stored:
+        return True
+    if _write(data) is None:
+        return False
+    _stored = bytes(data)
+    return True
+
+
+def reset():
+    """Forget what's in memory, as if the board had rebooted, so the next load() reads the cache again"""
+    global _sections, _stored
+    _sections = None
+    _stored = None
+
+
+def clear():
+    """Forget everything, stored and in memory"""
+    global _sections, _stored
+    _sections = {}
+    _stored = None
+    nvm = _nvm()
+    if nvm is not None:
+        start = len(nvm) - NVM_BYTES
+        if nvm[start:start + 3] == MAGIC:
+            _release(nvm, start)
+    try:
+        import os
+        os.remove(_path())
+    except OSError:
+        pass
+
+
+@profiled
+def get_cache_info():
+    """Show where the cache is kept and what's in it"""
+
+    from utils_report import writer
+    out = writer()
+    out.heading(b"cache info")
+
+    sections = load()
+    data, where = _read()
+    if not ENABLED:
+        out.line(b"Turned off")
+    if data is None:
+        out.line(b"Nothing stored")
+        out.flush()
+        return
+    out.row(b"Stored in:", where)
+    if _stored is not None:
+        out.key(b"Size:")
+        out.number(len(_stored))
+        out.line(b" bytes")
+    if not sections:
+        out.line(b"Nothing stored for this board and firmware")
+    for name, value in sections.items():
+        out.byte(9)
+        out.text(name)
+        out.pad(24)
+        if isinstance(value, str):
+            out.line(value)
+        else:
+            out.number(len(value) if isinstance(value, (list, dict)) else 1)
+            out.line(b" entries")
+    out.flush()
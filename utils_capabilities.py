@@ -0,0 +1,330 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" What this board can do, as a dict you can use from code, instead of text to read.
+
+Runs a set of small detectors: built-in modules, libraries, wifi, bluetooth, display, I2C sensors,
+SD card and buttons. Each one has a time budget, and the whole probe has one too, so it's safe to call
+at boot. Results are cached until you ask for new ones:
+
+    import utils_capabilities
+    capabilities = utils_capabilities.collect_capabilities()
+    if capabilities["wifi"]["type"] == "native":
+        ...
+    utils_capabilities.get_capabilities()       # print them
+
+CircuitPython can't stop a function partway, so a detector that runs over its budget still finishes,
+and is marked "slow". The ones that loop, like the module check, stop early and are marked "partial".
+Detectors left when the whole probe's budget runs out are "skipped". Only results from detectors that
+finished are cached, so the next call fills in the partial, skipped and failed ones. Every detector leaves the hardware the way it found it,
+so the async version can run alongside your other tasks. """
+
+from utils_profile import profiler
+from utils_ticks import ticks_add, ticks_diff, ticks_us
+
+profiled = profiler(__name__)
+
+# Milliseconds the whole probe may take, and each detector unless it says otherwise
+PROBE_BUDGET_MS = 500
+DETECTOR_BUDGET_MS = 50
+
+# Built-in modules to check for. Importing a built-in costs almost nothing.
+MODULES = (
+    "alarm", "analogio", "audiobusio", "audioio", "audiomp3", "audiopwmio", "bitbangio", "bitmaptools",
+    "busio", "camera", "countio", "digitalio", "displayio", "espcamera", "espidf", "frequencyio", "i2cperipheral",
+    "keypad", "memorymap", "neopixel_write", "nvm", "ps2io", "pulseio", "pwmio", "rgbmatrix", "rotaryio", "rtc",
+    "sdcardio", "sdioio", "socketpool", "ssl", "storage", "touchio", "ulab", "usb_cdc", "usb_hid", "usb_midi",
+    "vectorio", "watchdog", "wifi", "_bleio",
+)
+# Libraries to look for in /lib. They're only looked for, not imported, since importing them uses memory.
+LIBRARIES = (
+    "adafruit_requests", "adafruit_esp32spi", "adafruit_ble", "adafruit_display_text", "adafruit_bitmap_font",
+    "adafruit_sdcard", "adafruit_lis3dh", "adafruit_bme280", "adafruit_magtag", "adafruit_pyportal",
+    "adafruit_clue", "neopixel", "adafruit_debouncer", "asyncio",
+)
+LIBRARY_PATH = "/lib/"
+
+# Registered detectors, as (name, function, budget in ms), in the order they run.
+# Each function takes the utils_ticks.ticks_us() deadline it should finish by, and returns its result.
+# expired(deadline) says when it's passed.
+DETECTORS = []
+
+# Results and (status, microseconds) for each detector, from the last probe that ran it
+_results = {}
+_status = {}
+
+
+class Partial(Exception):
+    """Raised by a detector that ran out of time, with what it found so far"""
+
+    def __init__(self, result):
+        super().__init__("Out of time")
+        self.result = result
+
+
+def expired(deadline):
+    """Whether a detector's deadline has passed"""
+    return ticks_diff(ticks_us(), deadline) > 0
+
+
+def detector(name, budget_ms=DETECTOR_BUDGET_MS):
+    """Decorator that registers a detector"""
+    def register(function):
+        DETECTORS.append((name, function, budget_ms))
+        return function
+    return register
+
+
+def _board_pins(bus):
+    """Names of the board's pins utils_pins classifies as bus, like "button", sorted"""
+    import board
+    from utils_pins import classify_pin
+
+    names = []
+    for name in dir(board):
+        pin_class = classify_pin(name)
+        if pin_class is not None and pin_class.bus == bus:
+            names.append(name)
+    names.sort()
+    return names
+
+
+@detector("modules")
+def _detect_modules(deadline):
+    """Which of MODULES can be imported, as a dict of name -> bool"""
+    import sys
+
+    found = {}
+    for name in MODULES:
+        if name in sys.modules:
+            found[name] = True
+        else:
+            try:
+                __import__(name)
+                found[name] = True
+            except ImportError:
+                found[name] = False
+        if expired(deadline):
+            raise Partial(found)
+    return found
+
+
+@detector("libraries")
+def _detect_libraries(deadline):
+    """Which of LIBRARIES are in /lib, as .mpy, .py or a package"""
+    import os
+
+    found = []
+    for name in LIBRARIES:
+        for suffix in (".mpy", ".py", ""):
+            try:
+                os.stat(LIBRARY_PATH + name + suffix)
+            except OSError:
+                continue
+            found.append(name)
+            break
+        if expired(deadline):
+            raise Partial(found)
+    return found
+
+
+@detector("wifi")
+def _detect_wifi(deadline):
+    """Native wifi, an ESP32 co-processor on SPI (the ESP_CS and ESP_BUSY pins), or None"""
+    try:
+        import wifi
+    except ImportError:
+        wifi = None
+    if wifi is not None:
+        radio = wifi.radio
+        return {"type": "native", "enabled": radio.enabled, "connected": radio.connected,
+                "mac_address": bytes(radio.mac_address)}
+    esp32_pins = _board_pins("esp32")
+    if "ESP_CS" in esp32_pins and "ESP_BUSY" in esp32_pins:
+        return {"type": "esp32spi", "pins": esp32_pins}
+    return {"type": None}
+
+
+@detector("ble")
+def _detect_ble(deadline):
+    """Whether there's a bluetooth adapter. _bleio can be built in on boards without one."""
+    try:
+        import _bleio
+    except ImportError:
+        return {"adapter": False}
+    adapter = getattr(_bleio, "adapter", None)
+    if adapter is None:
+        return {"adapter": False}
+    address = adapter.address
+    return {"adapter": True, "enabled": adapter.enabled,
+            "address": None if address is None else bytes(address.address_bytes)}
+
+
+@detector("display")
+def _detect_display(deadline):
+    """The built-in display's size and bus, and whether it's e-ink, or None"""
+    import utils_display
+
+    info = utils_display.collect_display_info()
+    if info is None:
+        return None
+    return {"width": info["width"], "height": info["height"], "bus": info["bus"],
+            "type": "eink" if info["auto_refresh"] is None else "color"}
+
+
+@detector("sensors", budget_ms=250)
+def _detect_sensors(deadline):
+    """Devices on the I2C buses, from utils_i2c.discover(), and the board's own sensor pins"""
+    import utils_i2c
+
+    table = utils_i2c.discover()
+    devices = []
+    for bus_name, bus_devices in table.devices.items():
+        for address, info in bus_devices.items():
+            devices.append({"bus": bus_name, "address": address, "name": info.name, "verified": info.verified})
+    return {"i2c": devices, "pins": _board_pins("sensor")}
+
+
+@detector("sd_card")
+def _detect_sd_card(deadline):
+    """Whether there's an SD card slot, and whether a card is mounted at /sd"""
+    import os
+
+    pins = _board_pins("sd")
+    try:
+        mounted = "sd" in os.listdir("/")
+    except OSError:
+        mounted = False
+    return {"slot": bool(pins), "pins": pins, "mounted": mounted}
+
+
+@detector("buttons")
+def _detect_buttons(deadline):
+    """The board's built-in buttons, by pin name"""
+    return _board_pins("button")
+
+
+def _run(name, function, budget_ms, probe_deadline, refresh):
+    """Run one detector, if it isn't cached and there's time left. Returns the result."""
+    if not refresh and name in _results:
+        _status[name] = ("cached", 0)
+        return _results[name]
+    start = ticks_us()
+    left_us = ticks_diff(probe_deadline, start)
+    if left_us <= 0:
+        _status[name] = ("skipped", 0)
+        return None
+    deadline = ticks_add(start, min(left_us, budget_ms * 1000))
+    try:
+        result = function(deadline)
+        status = "ok"
+    except Partial as partial:
+        result = partial.result
+        status = "partial"
+    except Exception as error:
+        # One broken detector shouldn't stop the others
+        result = None
+        status = "error: " + str(error)
+    elapsed_us = ticks_diff(ticks_us(), start)
+    if status == "ok" and elapsed_us > budget_ms * 1000:
+        status = "slow"
+    _status[name] = (status, elapsed_us)
+    # Only what finished is kept, so the next probe tries the rest again
+    if status == "ok" or status == "slow":
+        _results[name] = result
+    else:
+        _results.pop(name, None)
+    return result
+
+
+def _selected(names):
+    return [entry for entry in DETECTORS if names is None or entry[0] in names]
+
+
+@profiled
+def collect_capabilities(names=None, refresh=False, budget_ms=PROBE_BUDGET_MS):
+    """Run the detectors, or only those in names, and return a dict of name -> result.
+    Cached results are used unless refresh is True. See status() for how each one went."""
+    probe_deadline = ticks_add(ticks_us(), budget_ms * 1000)
+    capabilities = {}
+    for name, function, detector_budget_ms in _selected(names):
+        capabilities[name] = _run(name, function, detector_budget_ms, probe_deadline, refresh)
+    return capabilities
+
+
+async def collect_capabilities_async(names=None, refresh=False, budget_ms=PROBE_BUDGET_MS):
+    """Like collect_capabilities(), but gives other tasks a turn between detectors"""
+    import asyncio
+
+    probe_deadline = ticks_add(ticks_us(), budget_ms * 1000)
+    capabilities = {}
+    for name, function, detector_budget_ms in _selected(names):
+        capabilities[name] = _run(name, function, detector_budget_ms, probe_deadline, refresh)
+        await asyncio.sleep(0)
+    return capabilities
+
+
+def status():
+    """Return a dict of detector name -> (status, microseconds) from the last probe that asked for each one.
+    status is "ok", "slow", "partial", "skipped", "cached" if the probe used the result from an earlier one,
+    or "error: " and the message."""
+    return dict(_status)
+
+
+def invalidate(name=None):
+    """Forget one detector's cached result, or all of them"""
+    if name is None:
+        _results.clear()
+    else:
+        _results.pop(name, None)
+
+
+def _write_value(out, value):
+    if isinstance(value, (bytes, bytearray)):
+        out.hex_bytes(value)
+    elif isinstance(value, (list, tuple)):
+        for i, item in enumerate(value):
+            if i:
+                out.text(b", ")
+            _write_value(out, item)
+    elif isinstance(value, dict):
+        first = True
+        for key, item in value.items():
+            if not first:
+                out.text(b", ")
+            first = False
+            out.text(key)
+            out.byte(61)
+            _write_value(out, item)
+    elif isinstance(value, int) and not isinstance(value, bool):
+        out.number(value)
+    else:
+        out.value(value)
+
+
+@profiled
+def get_capabilities(refresh=False):
+    """Print what collect_capabilities() finds, with how long each detector took"""
+    from utils_report import writer
+
+    capabilities = collect_capabilities(refresh=refresh)
+    out = writer()
+    out.heading(b"board capabilities")
+    for name, result in capabilities.items():
+        state, elapsed_us = _status[name]
+        out.text(name)
+        out.pad(12)
+        out.fixed(elapsed_us / 1000, 1, 7)
+        out.text(b" ms  ")
+        if state != "ok":
+            out.text(state)
+            out.text(b"  ")
+        if name == "modules" and result is not None:
+            # Only the ones that are there, since most boards have fewer than half
+            result = [module for module, present in result.items() if present]
+        elif name == "sensors" and result is not None:
+            result = ["%s 0x%02x %s" % (device["bus"], device["address"], device["name"] or "?")
+                      for device in result["i2c"]] + result["pins"]
+        _write_value(out, result)
+        out.newline()
+    out.flush()
@@ -5,49 +5,325 @@
 
 """ Helper functions for your board's buit-in display """
 
-import board
+import utils_trace
+from utils_profile import profiler
+from utils_ticks import ticks_diff, ticks_us
+
+profiled = profiler(__name__)
+
+
+@profiled
+def collect_display_info():
+    """Return details about the built-in display as a dict, or None if the board doesn't have one.
+    auto_refresh and brightness are None on displays without them, like e-ink."""
+
+    import board
+
+    # Almost always set to board.DISPLAY pin
+    if not hasattr(board, "DISPLAY"):
+        return None
+
+    display = board.DISPLAY
+    return {
+        "width": display.width,
+        "height": display.height,
+        "rotation": display.rotation,
+        "bus": str(display.bus),
+        # Some displays, like epaper, do not have auto-refresh or brightness properties
+        "auto_refresh": getattr(display, "auto_refresh", None),
+        "brightness": getattr(display, "brightness", None),
+    }
 
 # See if the board has a display. If so, show details.
-# Almost always set to board.DISPLAY pin
+@profiled
 def get_display_info():
     """Check for a builtin or onboard display, and show its details.
     Will not show details about a display that you add yourself."""
 
-    print("\n=== Built-in Display info ===\n")
-
-    if hasattr(board, "DISPLAY"):
-        print("board.DISPLAY pin found")
-
-        display = board.DISPLAY
-        print(
-            f"{"size":<20}",
-            display.width,
-            "x",
-            display.height
-        )
-        print(f"{"rotation":<20}", display.rotation)
-        print(f"{"bus":<20}", display.bus)
-        
-        # Auto-refresh
-        # Some displays, like epaper, do not have an auto-refresh property
-        if hasattr(display, 'auto_refresh'):
-            auto_refresh_attribute = display.auto_refresh
-        else:
-            auto_refresh_attribute = "None (probably e-ink)"
-        print(f"{"auto_refresh":<20}", auto_refresh_attribute)
-        
-        # Brightness
-        # Some displays, like epaper, do not have a brightness property
-        if hasattr(display, 'brightness'):
-            brightness_attribute = display.brightness
-        else:
-            brightness_attribute = "None (probably e-ink)"
-        print(f"{"brightness":<20}", brightness_attribute)
-    
-    else:
-        print("board.DISPLAY pin not found")
-    
+    import board
+    import utils_system
+    from utils_report import writer
+
+    out = writer()
+    out.heading(b"Built-in Display info")
+
+    info = utils_system.collect_snapshot().display
+    if info is None:
+        out.line(b"board.DISPLAY pin not found")
+        out.flush()
+        return
+
+    out.line(b"board.DISPLAY pin found")
+    out.key(b"size")
+    out.number(info["width"])
+    out.text(b" x ")
+    out.number(info["height"])
+    out.newline()
+    out.row(b"rotation", info["rotation"])
+    out.row(b"bus", info["bus"])
+
+    # Code can change these at any time, so they're read from the display rather than the snapshot
+    auto_refresh_attribute = getattr(board.DISPLAY, "auto_refresh", None)
+    if auto_refresh_attribute is None:
+        auto_refresh_attribute = b"None (probably e-ink)"
+    out.row(b"auto_refresh", auto_refresh_attribute)
+
+    brightness_attribute = getattr(board.DISPLAY, "brightness", None)
+    if brightness_attribute is None:
+        brightness_attribute = b"None (probably e-ink)"
+    out.row(b"brightness", brightness_attribute)
+    out.flush()
+
+
+@profiled
 def rotate_display(angle):
+    import board
+
     display = board.DISPLAY
+    trace = utils_trace.begin() if utils_trace.ENABLED else 0
     display.rotation = angle
-    print("\nDisplay rotated to", angle)
\ No newline at end of file
+    if trace:
+        utils_trace.end("display.rotate", trace)
+    print("\nDisplay rotated to", angle)
+
+    # Keep the cached snapshot in step with the display. Width and height swap at 90 and 270.
+    import utils_system
+    utils_system.update_display(rotation=angle, width=display.width, height=display.height)
+
+
+# Display benchmark settings
+# Frames timed for each refresh test
+FRAMES = 30
+# Width and height in pixels of the square the partial refresh test changes
+REGION = 32
+# Small squares the auto_refresh test changes each frame, like the readouts on a dashboard
+BATCH_REGIONS = 8
+# Seconds each auto_refresh sample runs for, and the most samples taken
+AUTO_REFRESH_WINDOW = 0.1
+AUTO_REFRESH_SAMPLES = 10
+# Rotations to time, and how many times each
+ANGLES = (0, 90, 180, 270)
+ROTATION_REPEAT = 3
+# Bits sent over the bus for each pixel. The built-in color displays are all RGB565.
+COLOR_DEPTH = 16
+# Longest to wait, in seconds, for an e-ink display to allow another refresh
+EINK_MAX_WAIT = 10
+
+
+def _elapsed_ns(start):
+    # Nanoseconds since start, a ticks_us(), as a float so it never needs a long integer
+    return ticks_diff(ticks_us(), start) * 1000.0
+
+
+def _show(display, group):
+    # root_group replaced show() in CircuitPython 9
+    if hasattr(display, "root_group"):
+        display.root_group = group
+    else:
+        display.show(group)
+
+
+def _time_frames(display, bitmaps, frames):
+    """Change every bitmap, then refresh, frames times. Returns ns per frame for each."""
+    samples = []
+    for frame in range(frames):
+        start = ticks_us()
+        for bitmap in bitmaps:
+            bitmap.fill(frame & 1)
+        trace = utils_trace.begin() if utils_trace.ENABLED else 0
+        display.refresh()
+        if trace:
+            utils_trace.end("display.refresh", trace)
+        samples.append(_elapsed_ns(start))
+    return samples
+
+
+def _time_loops(display, bitmaps, samples):
+    """Change every bitmap over and over without calling refresh(), for AUTO_REFRESH_WINDOW seconds
+    per sample. Returns ns per loop for each sample. Each sample is long enough for several
+    auto refreshes, so their cost is spread over the loops the way it would be in your code."""
+    window = AUTO_REFRESH_WINDOW * 1000000000
+    results = []
+    for sample in range(min(samples, AUTO_REFRESH_SAMPLES)):
+        loops = 0
+        start = ticks_us()
+        while True:
+            for bitmap in bitmaps:
+                bitmap.fill((loops + sample) & 1)
+            loops += 1
+            elapsed = _elapsed_ns(start)
+            if elapsed >= window:
+                break
+        results.append(elapsed / loops)
+    return results
+
+
+def _write_result(out, label, stats, per_second=None, unit=b""):
+    out.text(label)
+    out.pad(26)
+    out.fixed(stats["median"] / 1000000, 3, 10)
+    out.text(b" ms")
+    if per_second is not None:
+        out.fixed(per_second, 1, 12)
+        out.byte(32)
+        out.text(unit)
+    out.newline()
+
+
+@profiled
+def benchmark_display(frames=FRAMES, region=REGION, angles=ANGLES):
+    """Time how fast board.DISPLAY can be updated, and print a table.
+
+    For color displays: full screen and partial refreshes, the bus throughput they imply,
+    changing the rotation to each of angles, and a loop of small updates with auto_refresh
+    against the same loop with one refresh() per frame. For e-ink: how long one refresh takes
+    and how soon the next one is allowed.
+
+    Returns a dict of name -> statistics in nanoseconds, in the same form as
+    utils_benchmark.run_benchmark(), so utils_benchmark.save_results() and
+    tools/benchmark_report.py can compare boards. Returns None if there's no display.
+    The display shows black and white test patterns while this runs, then goes back to what it showed."""
+
+    import board
+    import displayio
+    from utils_report import writer
+
+    out = writer()
+    out.heading(b"Display benchmark")
+    if not hasattr(board, "DISPLAY"):
+        out.line(b"board.DISPLAY pin not found")
+        out.flush()
+        return None
+
+    display = board.DISPLAY
+    width = display.width
+    height = display.height
+    eink = not hasattr(display, "auto_refresh")
+    previous_group = getattr(display, "root_group", None)
+    previous_auto_refresh = getattr(display, "auto_refresh", None)
+    previous_rotation = display.rotation
+
+    palette = displayio.Palette(2)
+    palette[0] = 0x000000
+    palette[1] = 0xFFFFFF
+    screen = displayio.Bitmap(width, height, 2)
+    group = displayio.Group()
+    group.append(displayio.TileGrid(screen, pixel_shader=palette))
+
+    results = {}
+    try:
+        _show(display, group)
+        if eink:
+            _benchmark_eink(display, screen, results, out)
+        else:
+            _benchmark_color(display, displayio, group, palette, screen, frames, region, angles, results, out)
+    finally:
+        if previous_auto_refresh is not None:
+            display.auto_refresh = previous_auto_refresh
+        if display.rotation != previous_rotation:
+            display.rotation = previous_rotation
+        _show(display, previous_group)
+    out.flush()
+    return results
+
+
+def _benchmark_color(display, displayio, group, palette, screen, frames, region, angles, results, out):
+    import utils_benchmark
+
+    width = display.width
+    height = display.height
+    out.line(b"                            median ms      per second")
+    display.auto_refresh = False
+    display.refresh()
+
+    samples = _time_frames(display, (screen,), frames)
+    stats = results["display_full_refresh"] = utils_benchmark.stats(samples)
+    _write_result(out, b"full screen", stats, 1000000000 / stats["median"], b"fps")
+
+    # Effective bus speed, including the time to fill the bitmap and start each refresh
+    frame_bytes = width * height * COLOR_DEPTH // 8
+    stats = results["display_bus_byte"] = utils_benchmark.stats([sample / frame_bytes for sample in samples])
+    out.text(b"bus throughput")
+    out.pad(40)
+    out.fixed(1000 / stats["median"], 2, 10)
+    out.line(b" MB/s")
+
+    region = min(region, width, height)
+    square = displayio.Bitmap(region, region, 2)
+    group.append(displayio.TileGrid(square, pixel_shader=palette, x=(width - region) // 2, y=(height - region) // 2))
+    display.refresh()
+    stats = results["display_partial_refresh"] = utils_benchmark.stats(_time_frames(display, (square,), frames))
+    out.text(b"partial, ")
+    out.number(region)
+    out.text(b" x ")
+    out.number(region)
+    _write_result(out, b"", stats, 1000000000 / stats["median"], b"fps")
+    group.pop()
+
+    # The same small updates in a loop: on their own, with one refresh() after each frame's changes,
+    # and with auto_refresh sending them whenever it gets around to it
+    size = max(1, min(width, height) // 8)
+    squares = []
+    for i in range(BATCH_REGIONS):
+        bitmap = displayio.Bitmap(size, size, 2)
+        squares.append(bitmap)
+        group.append(displayio.TileGrid(bitmap, pixel_shader=palette, x=(i * size * 2) % (width - size),
+                                        y=(i * size * 2) // (width - size) * size * 2 % (height - size)))
+    display.refresh()
+    stats = results["display_update_loop"] = utils_benchmark.stats(_time_loops(display, squares, frames))
+    _write_result(out, b"updates only", stats, 1000000000 / stats["median"], b"loops/s")
+    stats = results["display_batched_frame"] = utils_benchmark.stats(_time_frames(display, squares, frames))
+    _write_result(out, b"updates, refresh()", stats, 1000000000 / stats["median"], b"fps")
+    display.auto_refresh = True
+    stats = results["display_auto_refresh_loop"] = utils_benchmark.stats(_time_loops(display, squares, frames))
+    _write_result(out, b"updates, auto_refresh", stats, 1000000000 / stats["median"], b"loops/s")
+    display.auto_refresh = False
+    for _ in range(BATCH_REGIONS):
+        group.pop()
+
+    # A new rotation redraws the whole screen
+    samples = {angle: [] for angle in angles}
+    for _ in range(ROTATION_REPEAT):
+        for angle in angles:
+            start = ticks_us()
+            display.rotation = angle
+            display.refresh()
+            samples[angle].append(_elapsed_ns(start))
+    for angle in angles:
+        stats = results["display_rotate_%d" % angle] = utils_benchmark.stats(samples[angle])
+        out.text(b"rotate to ")
+        out.number(angle)
+        _write_result(out, b"", stats)
+
+
+def _benchmark_eink(display, screen, results, out):
+    import time
+    import utils_benchmark
+
+    wait = display.time_to_refresh
+    if wait > EINK_MAX_WAIT:
+        out.text(b"e-ink display can't refresh for another ")
+        out.number(int(wait))
+        out.line(b" seconds, skipped")
+        return
+    time.sleep(wait)
+
+    screen.fill(1)
+    start = ticks_us()
+    display.refresh()
+    pushed = _elapsed_ns(start)
+    while display.busy:
+        time.sleep(0.01)
+    refreshed = _elapsed_ns(start)
+    # time_to_refresh counts from when the refresh started
+    interval = refreshed + display.time_to_refresh * 1000000000
+
+    out.line(b"e-ink                          seconds")
+    for name, label, value in (("display_eink_send", b"send the image", pushed),
+                               ("display_eink_refresh", b"refresh until not busy", refreshed),
+                               ("display_eink_min_interval", b"shortest time between", interval)):
+        results[name] = utils_benchmark.stats([value])
+        out.text(label)
+        out.pad(26)
+        out.fixed(value / 1000000000, 2, 10)
+        out.newline()
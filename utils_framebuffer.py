@@ -0,0 +1,355 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" A shadow framebuffer for board.DISPLAY that only sends the parts of each frame that changed.
+
+Draw into the framebuffer, then push(). It compares the new frame with the last one pushed, tile by tile,
+joins the changed tiles into a few rectangles, and sends just those straight to the display's controller
+with the MIPI DCS commands most color display chips understand (column range, row range, write pixels).
+On a dashboard where most of the screen stays the same, that's a small fraction of a full refresh:
+
+    import utils_framebuffer
+    frame = utils_framebuffer.for_display()
+    frame.fill(0)
+    while True:
+        frame.fill_rect(10, 10, 100, 20, utils_framebuffer.color565(255, 0, 0))
+        frame.push()
+    frame.report()
+
+displayio is told to stop refreshing, so it doesn't draw over what's pushed.
+The framebuffer holds two copies of the screen, 2 bytes a pixel each, which is too much for a large display
+on a board without PSRAM. Pass a smaller width and height, and x_offset and y_offset, to cover just the part
+of the screen that changes. Pixels go to the controller's memory as it's laid out at rotation 0, and some
+displays, like the TTGO T-Display, need the column and row offsets from their board definition too. """
+
+import struct
+
+import utils_trace
+from utils_profile import profiler
+from utils_ticks import ticks_diff, ticks_us
+
+profiled = profiler(__name__)
+
+# Width and height of the tiles frames are compared in, in pixels
+TILE_SIZE = 16
+# Bytes each extra rectangle costs on the bus: the column and row commands with their 4 bytes each,
+# and the write command. Rectangles closer than this are cheaper to send as one.
+RECT_OVERHEAD = 11
+# Most rectangles one push sends. Past this, neighbours are joined even if that sends extra pixels.
+MAX_RECTS = 16
+# Most bytes of a rectangle copied and sent at once, when its rows aren't next to each other in memory
+SCRATCH_BYTES = 4096
+
+CASET = 0x2A
+RASET = 0x2B
+RAMWR = 0x2C
+
+# Comparing memoryviews compares what's in them on CPython, which costs no memory.
+# On boards it compares identity, so the two slices are copied into a preallocated pair of
+# buffers and compared there instead.
+_VIEWS_COMPARE = memoryview(b"ab") == memoryview(bytearray(b"ab"))
+
+
+def color565(red, green, blue):
+    """Return a 24 bit color as the 16 bit RGB565 value the display takes"""
+    return ((red & 0xF8) << 8) | ((green & 0xFC) << 3) | (blue >> 3)
+
+
+class ShadowFramebuffer:
+    """A width x height RGB565 framebuffer, and the last frame pushed, for finding what changed.
+
+    bus:                 a displayio bus with send(), like board.DISPLAY.bus. None to only count,
+                         which is handy for testing.
+    x_offset, y_offset:  where the framebuffer's top left corner is in the controller's memory
+
+    frames, rects_sent, bytes_sent and bytes_full (what full refreshes would have sent) add up over
+    every push, and push_us is the microseconds spent pushing."""
+
+    def __init__(self, width, height, bus=None, tile=TILE_SIZE, x_offset=0, y_offset=0):
+        self.width = width
+        self.height = height
+        self.bus = bus
+        self.tile = tile
+        self.x_offset = x_offset
+        self.y_offset = y_offset
+        self.buffer = bytearray(width * height * 2)
+        self.previous = bytearray(width * height * 2)
+        self._view = memoryview(self.buffer)
+        self._previous_view = memoryview(self.previous)
+        self.tiles_x = (width + tile - 1) // tile
+        self.tiles_y = (height + tile - 1) // tile
+        self._dirty = bytearray(self.tiles_x * self.tiles_y)
+        # At least a row, so fill_rect() can build any row in it
+        self._scratch = bytearray(max(width * 2, min(SCRATCH_BYTES, width * height * 2)))
+        self._scratch_view = memoryview(self._scratch)
+        self._window = bytearray(4)
+        # Buffers for comparing a row, a tile and the last (narrower) tile, keyed by length
+        self._compare = {}
+        if not _VIEWS_COMPARE:
+            last = (width - (self.tiles_x - 1) * tile) * 2
+            for length in (width * 2, tile * 2, last):
+                if length not in self._compare:
+                    pair = (bytearray(length), bytearray(length))
+                    self._compare[length] = pair + (memoryview(pair[0]), memoryview(pair[1]))
+        # What's on the display to start with is unknown, so the first push sends everything
+        self._full = True
+        self.frames = 0
+        self.rects_sent = 0
+        self.bytes_sent = 0
+        self.bytes_full = 0
+        # A float, since the total outgrows a small int after about 18 minutes
+        self.push_us = 0.0
+
+    def invalidate(self):
+        """Send the whole frame next push, like after something else drew on the display"""
+        self._full = True
+
+    # Drawing. Colors are RGB565, like color565() returns.
+
+    def _pattern(self, color, count):
+        """Fill the start of the scratch buffer with count pixels of color. Returns a view of them."""
+        scratch = self._scratch
+        scratch[0] = color >> 8
+        scratch[1] = color & 0xFF
+        filled = 2
+        # Double the pattern each copy, so a row takes a few copies instead of one per pixel
+        while filled < count * 2:
+            step = min(filled, count * 2 - filled)
+            self._scratch_view[filled:filled + step] = self._scratch_view[:step]
+            filled += step
+        return self._scratch_view[:count * 2]
+
+    def fill_rect(self, x, y, width, height, color):
+        x1 = max(0, x)
+        y1 = max(0, y)
+        x2 = min(self.width, x + width)
+        y2 = min(self.height, y + height)
+        if x2 <= x1 or y2 <= y1:
+            return
+        view = self._view
+        row_bytes = (x2 - x1) * 2
+        pattern = self._pattern(color, x2 - x1)
+        for row in range(y1, y2):
+            start = (row * self.width + x1) * 2
+            view[start:start + row_bytes] = pattern
+
+    def fill(self, color):
+        self.fill_rect(0, 0, self.width, self.height, color)
+
+    def pixel(self, x, y, color):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            start = (y * self.width + x) * 2
+            self.buffer[start] = color >> 8
+            self.buffer[start + 1] = color & 0xFF
+
+    def blit(self, x, y, width, height, data):
+        """Copy width x height pixels of RGB565 data, 2 bytes each, high byte first, to x, y.
+        Parts outside the framebuffer are left out."""
+        data = memoryview(data)
+        x1 = max(0, x)
+        x2 = min(self.width, x + width)
+        if x2 <= x1:
+            return
+        count = (x2 - x1) * 2
+        for row in range(max(0, y), min(self.height, y + height)):
+            source = ((row - y) * width + x1 - x) * 2
+            start = (row * self.width + x1) * 2
+            self._view[start:start + count] = data[source:source + count]
+
+    # Finding what changed
+
+    def _same(self, start, end):
+        if _VIEWS_COMPARE:
+            return self._view[start:end] == self._previous_view[start:end]
+        new, old, new_view, old_view = self._compare[end - start]
+        new_view[:] = self._view[start:end]
+        old_view[:] = self._previous_view[start:end]
+        return new == old
+
+    def _diff(self):
+        """Mark the tiles that differ from the last frame pushed. Returns how many there are."""
+        tile = self.tile
+        row_bytes = self.width * 2
+        tile_bytes = tile * 2
+        dirty = self._dirty
+        count = 0
+        for y in range(self.height):
+            start = y * row_bytes
+            # Most rows of a dashboard don't change at all, and one comparison says so
+            if self._same(start, start + row_bytes):
+                continue
+            first = (y // tile) * self.tiles_x
+            for tile_x in range(self.tiles_x):
+                if dirty[first + tile_x]:
+                    continue
+                left = start + tile_x * tile_bytes
+                if not self._same(left, min(left + tile_bytes, start + row_bytes)):
+                    dirty[first + tile_x] = 1
+                    count += 1
+        return count
+
+    def _tile_rects(self):
+        """Join the dirty tiles into rectangles, as [x, y, width, height] in tiles: first each run of
+        tiles along a row, then runs directly below with the same ends"""
+        dirty = self._dirty
+        rects = []
+        open_rects = {}
+        for tile_y in range(self.tiles_y):
+            still_open = {}
+            tile_x = 0
+            row = tile_y * self.tiles_x
+            while tile_x < self.tiles_x:
+                if not dirty[row + tile_x]:
+                    tile_x += 1
+                    continue
+                end = tile_x
+                while end < self.tiles_x and dirty[row + end]:
+                    end += 1
+                rect = open_rects.get((tile_x, end))
+                if rect is None:
+                    rect = [tile_x, tile_y, end - tile_x, 1]
+                    rects.append(rect)
+                else:
+                    rect[3] += 1
+                still_open[(tile_x, end)] = rect
+                tile_x = end
+            open_rects = still_open
+        return rects
+
+    def dirty_rects(self):
+        """Return the rectangles that changed since the last push, as [x, y, width, height] in pixels,
+        without pushing them. Neighbours are joined where sending the space between them costs less than
+        another rectangle, and until there are no more than MAX_RECTS."""
+        if self._full:
+            return [[0, 0, self.width, self.height]]
+        self._diff()
+        tile = self.tile
+        rects = []
+        for tile_x, tile_y, tiles_wide, tiles_high in self._tile_rects():
+            x = tile_x * tile
+            y = tile_y * tile
+            rects.append([x, y, min(self.width, x + tiles_wide * tile) - x, min(self.height, y + tiles_high * tile) - y])
+
+        # Join neighbours, in top to bottom order, while it saves bytes or there are too many
+        while len(rects) > 1:
+            best = None
+            best_cost = None
+            for i in range(len(rects) - 1):
+                a = rects[i]
+                b = rects[i + 1]
+                x1 = min(a[0], b[0])
+                y1 = min(a[1], b[1])
+                x2 = max(a[0] + a[2], b[0] + b[2])
+                y2 = max(a[1] + a[3], b[1] + b[3])
+                cost = ((x2 - x1) * (y2 - y1) - a[2] * a[3] - b[2] * b[3]) * 2 - RECT_OVERHEAD
+                if best_cost is None or cost < best_cost:
+                    best = (i, [x1, y1, x2 - x1, y2 - y1])
+                    best_cost = cost
+            if best_cost > 0 and len(rects) <= MAX_RECTS:
+                break
+            i, joined = best
+            rects[i:i + 2] = [joined]
+        return rects
+
+    # Sending
+
+    def _send_window(self, command, start, end):
+        struct.pack_into(">HH", self._window, 0, start, end)
+        self.bus.send(command, self._window)
+
+    def _send(self, x, y, width, height):
+        """Send one rectangle to the display, and copy it into the last frame pushed"""
+        row_bytes = width * 2
+        stride = self.width * 2
+        view = self._view
+        previous = self._previous_view
+        if self.bus is not None:
+            self._send_window(CASET, x + self.x_offset, x + width - 1 + self.x_offset)
+        if width == self.width:
+            # Whole rows are next to each other in memory, so they go straight from the framebuffer
+            start = y * stride
+            end = start + height * stride
+            if self.bus is not None:
+                self._send_window(RASET, y + self.y_offset, y + height - 1 + self.y_offset)
+                self.bus.send(RAMWR, view[start:end])
+            previous[start:end] = view[start:end]
+            return
+        rows_at_once = max(1, len(self._scratch) // row_bytes)
+        scratch = self._scratch_view
+        for top in range(y, y + height, rows_at_once):
+            rows = min(rows_at_once, y + height - top)
+            for row in range(rows):
+                start = ((top + row) * self.width + x) * 2
+                scratch[row * row_bytes:(row + 1) * row_bytes] = view[start:start + row_bytes]
+                previous[start:start + row_bytes] = view[start:start + row_bytes]
+            if self.bus is not None:
+                self._send_window(RASET, top + self.y_offset, top + rows - 1 + self.y_offset)
+                self.bus.send(RAMWR, scratch[:rows * row_bytes])
+
+    @profiled
+    def push(self):
+        """Send what changed since the last push. Returns the rectangles sent, as [x, y, width, height]."""
+        start = ticks_us()
+        trace = utils_trace.begin() if utils_trace.ENABLED else 0
+        rects = self.dirty_rects()
+        if trace:
+            utils_trace.end("display.diff", trace)
+        for x, y, width, height in rects:
+            self._send(x, y, width, height)
+            self.bytes_sent += width * height * 2 + RECT_OVERHEAD
+        if trace:
+            utils_trace.end("display.push", trace)
+            utils_trace.count("display.rects", len(rects))
+        if rects:
+            dirty = self._dirty
+            for i in range(len(dirty)):
+                dirty[i] = 0
+        self._full = False
+        self.frames += 1
+        self.rects_sent += len(rects)
+        self.bytes_full += self.width * self.height * 2 + RECT_OVERHEAD
+        self.push_us += ticks_diff(ticks_us(), start)
+        return rects
+
+    def fps(self):
+        """Pushes a second, counting only the time spent in push()"""
+        return self.frames / self.push_us * 1000000 if self.push_us else None
+
+    @profiled
+    def report(self):
+        from utils_report import writer
+        out = writer()
+        out.heading(b"framebuffer")
+        out.key(b"Frames pushed:")
+        out.number(self.frames)
+        out.newline()
+        if not self.frames:
+            out.flush()
+            return
+        out.key(b"Rectangles per frame:")
+        out.fixed(self.rects_sent / self.frames, 1)
+        out.newline()
+        out.key(b"Bytes sent:")
+        out.kilobytes(self.bytes_sent)
+        out.text(b" of ")
+        out.kilobytes(self.bytes_full)
+        out.text(b" for full frames, ")
+        out.fixed(100 - self.bytes_sent * 100 / self.bytes_full, 1)
+        out.line(b"% saved")
+        out.key(b"Push time per frame:")
+        out.fixed(self.push_us / self.frames / 1000, 2)
+        out.text(b" ms, ")
+        out.fixed(self.fps(), 1)
+        out.line(b" fps")
+        out.flush()
+
+
+def for_display(display=None, width=None, height=None, x_offset=0, y_offset=0, tile=TILE_SIZE):
+    """Return a ShadowFramebuffer that pushes to display, or board.DISPLAY, covering the whole screen
+    unless width and height say otherwise. Turns off auto_refresh, so displayio doesn't draw over it."""
+    if display is None:
+        import board
+        display = board.DISPLAY
+    if hasattr(display, "auto_refresh"):
+        display.auto_refresh = False
+    return ShadowFramebuffer(width or display.width, height or display.height, display.bus, tile, x_offset, y_offset)
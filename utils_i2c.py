@@ -5,69 +5,581 @@
 
 """ Helper functions for i2c bus and devices """
 
+import time
+
+import utils_trace
+from utils_profile import profiler
+from utils_ticks import ticks_diff, ticks_us
+
+profiled = profiler(__name__)
+
+# try_lock() retries before giving up on a bus, and the wait before the first retry in seconds.
+# The wait doubles after every retry, up to LOCK_BACKOFF_MAX.
+LOCK_RETRIES = 8
+LOCK_BACKOFF = 0.001
+LOCK_BACKOFF_MAX = 0.05
+
+# Devices to look for at each address, as (name, register, value).
+# register is a chip ID register, and the device matches if it reads back value.
+# For Sensirion sensors, which have no ID register, register is the command that reads the serial number
+# and value is None; the device matches if the 6 byte answer has valid CRCs.
+# If register is None, there's no way to check, so the name is only a guess from the address.
+KNOWN_DEVICES = {
+    0x18: (("LIS3DH accelerometer", 0x0F, 0x33),),
+    0x19: (("LIS3DH accelerometer", 0x0F, 0x33),),
+    0x1C: (("LIS3MDL magnetometer", 0x0F, 0x3D),),
+    0x1E: (("LIS3MDL magnetometer", 0x0F, 0x3D),),
+    0x29: (("VL53L0X distance sensor", 0xC0, 0xEE),),
+    0x39: (("APDS9960 light and gesture sensor", 0x92, 0xAB),),
+    0x3C: (("SSD1306 OLED display", None, None),),
+    0x3D: (("SSD1306 OLED display", None, None),),
+    0x44: (("SHT4x temperature/humidity sensor", b"\x89", None),
+           ("SHT3x temperature/humidity sensor", b"\x37\x80", None)),
+    0x45: (("SHT3x temperature/humidity sensor", b"\x37\x80", None),),
+    0x48: (("ADT7410 temperature sensor", 0x0B, 0xCB),),
+    0x49: (("ADT7410 temperature sensor", 0x0B, 0xCB),),
+    0x4A: (("ADT7410 temperature sensor", 0x0B, 0xCB),),
+    0x4B: (("ADT7410 temperature sensor", 0x0B, 0xCB),),
+    0x68: (("MPU6050 accelerometer and gyro", 0x75, 0x68),),
+    0x69: (("MPU6050 accelerometer and gyro", 0x75, 0x68),),
+    0x6A: (("LSM6DS33 accelerometer and gyro", 0x0F, 0x69), ("LSM6DSOX accelerometer and gyro", 0x0F, 0x6C),
+           ("ISM330DHCX accelerometer and gyro", 0x0F, 0x6B)),
+    0x6B: (("LSM6DS33 accelerometer and gyro", 0x0F, 0x69), ("LSM6DSOX accelerometer and gyro", 0x0F, 0x6C),
+           ("ISM330DHCX accelerometer and gyro", 0x0F, 0x6B)),
+    0x76: (("BME280 temperature/humidity/pressure sensor", 0xD0, 0x60), ("BMP280 pressure sensor", 0xD0, 0x58),
+           ("BME680 gas sensor", 0xD0, 0x61)),
+    0x77: (("BME280 temperature/humidity/pressure sensor", 0xD0, 0x60), ("BMP280 pressure sensor", 0xD0, 0x58),
+           ("BME680 gas sensor", 0xD0, 0x61)),
+}
+
+# The board functions that return a bus, in the order they're scanned
+BOARD_BUSES = ("I2C", "STEMMA_I2C")
+
+class I2CDeviceInfo:
+    """One device found on a bus.
+    name is None for addresses that aren't in KNOWN_DEVICES. verified is True if the chip confirmed its name."""
+
+    __slots__ = ("bus_name", "address", "name", "verified")
+
+    def __init__(self, bus_name, address, name=None, verified=False):
+        self.bus_name = bus_name
+        self.address = address
+        self.name = name
+        self.verified = verified
+
+    def __repr__(self):
+        return "I2CDeviceInfo({!r}, 0x{:02X}, {!r}, {})".format(self.bus_name, self.address, self.name, self.verified)
+
+
+class I2CDeviceTable:
+    """The devices on every bus, from discover().
+
+    buses:    bus name -> bus object. A bus that's shared by two board functions is only listed once.
+    devices:  bus name -> {address: I2CDeviceInfo}
+    scan_us:  bus name -> microseconds it took to lock, scan and fingerprint the bus
+    errors:   bus name -> why the bus couldn't be scanned, like a missing pull-up or a bus that stayed locked"""
+
+    __slots__ = ("buses", "devices", "scan_us", "errors")
+
+    def __init__(self):
+        self.buses = {}
+        self.devices = {}
+        self.scan_us = {}
+        self.errors = {}
+
+    def find(self, name):
+        """Return the devices whose name starts with name, like "LIS3DH" or "SHT" """
+        return [info for devices in self.devices.values() for info in devices.values()
+                if info.name is not None and info.name.startswith(name)]
+
+    def addresses(self, bus_name):
+        """Return the sorted addresses found on bus_name"""
+        return sorted(self.devices.get(bus_name, ()))
+
+
+def lock_bus(i2c_bus, retries=LOCK_RETRIES, backoff=LOCK_BACKOFF):
+    """Lock i2c_bus, retrying with a doubling wait if something else holds it.
+    Returns True once it's locked, or False after retries failed attempts."""
+
+    for attempt in range(retries + 1):
+        if i2c_bus.try_lock():
+            return True
+        if utils_trace.ENABLED:
+            utils_trace.count("i2c.lock_busy")
+        if attempt < retries:
+            time.sleep(backoff)
+            backoff = min(backoff * 2, LOCK_BACKOFF_MAX)
+    return False
+
+
+def _crc8(data, start, end):
+    """Sensirion's CRC-8: polynomial 0x31, starting at 0xFF"""
+    crc = 0xFF
+    for i in range(start, end):
+        crc ^= data[i]
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+# Scratch space for fingerprint reads, so probing doesn't allocate
+_register = bytearray(1)
+_answer = bytearray(6)
+
+
+def fingerprint(i2c_bus, address):
+    """Identify the device at address on a locked bus.
+    Returns (name, verified), or (None, False) if it's not a known device."""
+
+    guess = None
+    last_register = None
+    value = None
+    for name, register, expected in KNOWN_DEVICES.get(address, ()):
+        if register is None:
+            guess = name
+            continue
+        try:
+            if isinstance(register, int):
+                # Candidates at one address usually share an ID register, so read it once
+                if register != last_register:
+                    _register[0] = register
+                    i2c_bus.writeto_then_readfrom(address, _register, _answer, in_end=1)
+                    value = _answer[0]
+                    last_register = register
+                if value == expected:
+                    return name, True
+            else:
+                i2c_bus.writeto(address, register)
+                # The serial number takes about a millisecond to be ready
+                time.sleep(0.001)
+                i2c_bus.readfrom_into(address, _answer)
+                if _crc8(_answer, 0, 2) == _answer[2] and _crc8(_answer, 3, 5) == _answer[5]:
+                    return name, True
+        except OSError:
+            # The device NACKed the read, so it's not this one
+            pass
+    return guess, False
+
+
+def scan_bus(i2c_bus, bus_name=None, identify=True, known=None):
+    """Lock i2c_bus, scan it, and fingerprint what's there.
+    known is {address: (name, verified)} for devices already identified, which aren't fingerprinted again.
+    Returns {address: I2CDeviceInfo}. Raises RuntimeError if the bus stays locked."""
+
+    if not lock_bus(i2c_bus):
+        raise RuntimeError("I2C bus stayed locked")
+    try:
+        devices = {}
+        trace = utils_trace.begin() if utils_trace.ENABLED else 0
+        addresses = i2c_bus.scan()
+        if trace:
+            utils_trace.end("i2c.scan", trace)
+        for address in addresses:
+            if known is not None and address in known:
+                name, verified = known[address]
+            elif identify:
+                trace = utils_trace.begin() if utils_trace.ENABLED else 0
+                name, verified = fingerprint(i2c_bus, address)
+                if trace:
+                    utils_trace.end("i2c.fingerprint", trace)
+            else:
+                name, verified = None, False
+            devices[address] = I2CDeviceInfo(bus_name, address, name, verified)
+        return devices
+    finally:
+        i2c_bus.unlock()
+
+
+def board_buses():
+    """Return [(name, bus)] for each of BOARD_BUSES the board has, listing a shared bus once.
+    Buses that can't be created, usually because of missing pull-ups, come back as (name, RuntimeError)."""
+
+    import board
+
+    buses = []
+    for name in BOARD_BUSES:
+        function = getattr(board, name, None)
+        if function is None:
+            continue
+        try:
+            bus = function()
+        except RuntimeError as error:
+            buses.append((name, error))
+            continue
+        if not any(bus is other for _, other in buses):
+            buses.append((name, bus))
+    return buses
+
+
+# Cached result of discover(), until invalidate() is called
+_device_table = None
+
+
+@profiled
+def discover(buses=None, refresh=False, identify=True):
+    """Find and identify the devices on every I2C bus, in one pass.
+    buses is a list of (name, bus), and defaults to board_buses().
+    The table is cached, so later calls don't touch the bus. Buses dropped by invalidate() are scanned again.
+    What each device is, is kept in utils_cache, so after a reboot only devices at new addresses are
+    fingerprinted. refresh=True fingerprints them all again.
+    Returns an I2CDeviceTable."""
+
+    import utils_cache
+
+    global _device_table
+    table = _device_table
+    if table is None or refresh:
+        table = I2CDeviceTable()
+    if buses is None:
+        buses = board_buses()
+    # bus name -> [[address, name, verified]], from the last time each bus was identified
+    identified = utils_cache.get("i2c") or {}
+    changed = False
+
+    for name, bus in buses:
+        # Errors aren't cached, since a bus that was busy or missing pull-ups may work next time
+        if name in table.devices:
+            continue
+        if isinstance(bus, Exception):
+            table.errors[name] = str(bus)
+            continue
+        table.buses[name] = bus
+        trace = utils_trace.begin() if utils_trace.ENABLED else 0
+        known = None
+        if identify and not refresh and name in identified:
+            known = {address: (device_name, verified) for address, device_name, verified in identified[name]}
+        start = ticks_us()
+        try:
+            table.devices[name] = scan_bus(bus, name, identify, known)
+            table.errors.pop(name, None)
+        except RuntimeError as error:
+            table.errors[name] = str(error)
+        table.scan_us[name] = ticks_diff(ticks_us(), start)
+        if trace:
+            utils_trace.end("i2c.scan_bus", trace)
+        if identify and name in table.devices:
+            devices = [[address, info.name, info.verified] for address, info in table.devices[name].items()]
+            if identified.get(name) != devices:
+                identified[name] = devices
+                changed = True
+
+    if changed:
+        utils_cache.put("i2c", identified)
+    _device_table = table
+    return table
+
+
+def invalidate(bus_name=None):
+    """Forget what discover() found on bus_name, or on every bus, so the next discover() scans it again.
+    Call this after plugging in or unplugging a device."""
+
+    global _device_table
+    if _device_table is None:
+        return
+    if bus_name is None:
+        _device_table = None
+    else:
+        for part in (_device_table.devices, _device_table.scan_us, _device_table.errors, _device_table.buses):
+            part.pop(bus_name, None)
+
+
+@profiled
 def get_i2c_info():
     """Look for I2C and STEMMA QT I2C pins on the board.
     STEMMA_I2C pin often indicates a solderless connector for connecting devices, but not always.
     On some boards, I2C and STEMMA_I2C are the same pins, which we check for here."""
 
-    print("\n=== i2c info ===\n")
-    print("i2c pins found:")
+    from utils_report import writer
+    out = writer()
+    out.heading(b"i2c info")
+    out.line(b"i2c pins found:")
 
     import board
 
-    i2c_pin_found = False
-    stemma_i2c_pin_found = False
-    stemma_i2c_same = False
-
     for item in dir(board):
         if item == "SCL":
-            descriptor = "I2C Serial Clock Line"
+            descriptor = b"I2C Serial Clock Line"
         elif item == "SDA":
-            descriptor = "I2C Serial Data Line"
+            descriptor = b"I2C Serial Data Line"
         elif item == "SCK":
-            descriptor = "I2C Serial Clock"
+            descriptor = b"I2C Serial Clock"
         elif item == "I2C":
-            descriptor = "I2C Bus"
-            i2c_pin_found = True
+            descriptor = b"I2C Bus"
         elif item == "STEMMA_I2C":
-            descriptor = "Stemma I2C Connector"
-            stemma_i2c_pin_found = True
+            descriptor = b"Stemma I2C Connector"
         else:
-            descriptor = ""
-        if descriptor != "":
-            print(f"\t{item}\t{descriptor}")
-
-    if i2c_pin_found and stemma_i2c_pin_found:
-        if board.I2C() == board.STEMMA_I2C():
-            print("\n\tI2C and STEMMA_I2C are the same bus")
-            stemma_i2c_same = True
+            descriptor = None
+        if descriptor is not None:
+            out.byte(9)
+            out.text(item)
+            out.byte(9)
+            out.line(descriptor)
+
+    buses = board_buses()
+    if not buses:
+        out.line(b"No I2C or STEMMA_I2C pin found")
+        out.flush()
+        return
+
+    table = discover(buses)
+    if hasattr(board, "I2C") and hasattr(board, "STEMMA_I2C"):
+        out.newline()
+        # Two entries only mean two buses if both came up, since a bus that failed is listed on its own
+        failed = [name for name, _ in buses if name in table.errors]
+        if len(buses) == 1:
+            out.line(b"\tI2C and STEMMA_I2C are the same bus")
+        elif not failed:
+            out.line(b"\tI2C and STEMMA_I2C are separate buses")
+        for name in failed:
+            out.text(b"\tboard.")
+            out.text(name)
+            out.text(b" failed: ")
+            out.line(table.errors[name])
+
+    for name, _ in buses:
+        out.newline()
+        out.text(b"Scanning I2C bus at board.")
+        out.text(name)
+        if name in table.scan_us:
+            out.text(b" (")
+            out.fixed(table.scan_us[name] / 1000, 1)
+            out.text(b" ms)")
+        out.newline()
+        if name in table.errors:
+            out.text(b"\tCouldn't scan: ")
+            out.line(table.errors[name])
         else:
-            print("\tI2C and STEMMA_I2C are separate buses")
-
-    if i2c_pin_found:
-            print("\nScanning I2C bus at board.I2C")
-            i2c = board.I2C()
-            get_i2c_device_addresses(i2c)
-    if stemma_i2c_pin_found:
-        if (stemma_i2c_same == False):
-            print("\nScanning I2C bus at board.STEMMA_I2C")
-            stemma_i2c = board.STEMMA_I2C()
-            get_i2c_device_addresses(stemma_i2c)
+            _write_devices(out, table.devices[name])
+    out.flush()
+
+
+def _write_devices(out, devices):
+    if not devices:
+        out.line(b"\tNo connected I2C devices found")
+        return
+    out.line(b"\tI2C device(s) found at:")
+    for address in sorted(devices):
+        info = devices[address]
+        out.text(b"\t\t")
+        out.hex(address)
+        if info.name is not None:
+            out.byte(9)
+            out.text(info.name)
+            if not info.verified:
+                out.text(b" (by address only)")
+        out.newline()
 
-    else:
-        print("No I2C or STEMMA_I2C pin found")
 
+@profiled
 def get_i2c_device_addresses(i2c_bus):
-    """Scan the specified I2C bus for devices, and report their addresses in hex."""
-
-    if not i2c_bus.try_lock():
-        print("Failed to lock I2C bus for scanning. Trying again...")
-        pass
-    i2c_addresses = i2c_bus.scan()
-    if len(i2c_addresses) == 0:
-        print("\tNo connected I2C devices found")
-    else:
-        print("\tI2C device(s) found at:")
-        for address in i2c_addresses:
-            print("\t\t" + hex(address))
-    i2c_bus.unlock()
+    """Scan the specified I2C bus for devices, and report their addresses in hex and what they are.
+    Returns the list of addresses found."""
+
+    from utils_report import writer
+    out = writer()
+
+    try:
+        devices = scan_bus(i2c_bus)
+    except RuntimeError:
+        out.line(b"\tFailed to lock I2C bus for scanning")
+        out.flush()
+        return []
+    _write_devices(out, devices)
+    out.flush()
+    return sorted(devices)
+
+
+# Upper bounds of the latency histogram buckets, in microseconds. One more bucket holds everything slower.
+LATENCY_BUCKETS_US = (100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000)
+
+# errno for an address that doesn't answer. CircuitPython raises OSError with this for a NACK.
+_ENODEV = 19
+
+# Written to each device as a ping: just the address byte, like scan() sends
+_PING = b""
+
+
+class DeviceHealth:
+    """What the I2CHealthMonitor has seen from one device.
+
+    histogram:  pings per latency bucket, as an array, so recording one doesn't allocate
+    nacks:      pings the device didn't answer
+    errors:     pings that failed some other way, like a timeout from a stuck clock line"""
+
+    __slots__ = ("bus_name", "address", "name", "pings", "nacks", "errors", "histogram",
+                 "total_us", "max_us", "last_error")
+
+    def __init__(self, bus_name, address, name=None):
+        from array import array
+        self.bus_name = bus_name
+        self.address = address
+        self.name = name
+        self.pings = 0
+        self.nacks = 0
+        self.errors = 0
+        self.histogram = array("L", [0] * (len(LATENCY_BUCKETS_US) + 1))
+        self.total_us = 0
+        self.max_us = 0
+        self.last_error = None
+
+    def record(self, micros):
+        bucket = 0
+        for bound in LATENCY_BUCKETS_US:
+            if micros <= bound:
+                break
+            bucket += 1
+        self.histogram[bucket] += 1
+        self.total_us += micros
+        if micros > self.max_us:
+            self.max_us = micros
+
+    def percentile(self, fraction):
+        """Estimate the latency the given fraction of answered pings were at or under, like 0.99.
+        Only the bucket counts are kept, so this assumes the pings in the bucket it lands in
+        are spread evenly between its bounds. The last bucket runs up to max_us.
+        None if nothing answered."""
+        answered = sum(self.histogram)
+        if answered == 0:
+            return None
+        wanted = answered * fraction
+        count = 0
+        lower = 0
+        for bucket, pings in enumerate(self.histogram):
+            upper = LATENCY_BUCKETS_US[bucket] if bucket < len(LATENCY_BUCKETS_US) else self.max_us
+            upper = min(upper, self.max_us)
+            if pings and count + pings >= wanted:
+                return lower + int((upper - lower) * (wanted - count) / pings)
+            count += pings
+            lower = upper
+        return self.max_us
+
+    def mean_us(self):
+        answered = self.pings - self.nacks - self.errors
+        return self.total_us // answered if answered else None
+
+
+class I2CHealthMonitor:
+    """Pings every device discover() found, over and over, and keeps latency and error counts for each.
+
+    interval:  seconds between rounds
+    table:     an I2CDeviceTable to monitor. Defaults to discover().
+    retries:   try_lock() retries per bus each round. A bus that stays busy counts a lock failure and is skipped.
+
+    Call poll() for one round from your own loop, run() to loop forever, or run_async() as an asyncio task."""
+
+    def __init__(self, interval=1.0, table=None, retries=2):
+        if table is None:
+            table = discover()
+        self.interval = interval
+        self.retries = retries
+        self.buses = table.buses
+        self.devices = {}
+        for bus_name, devices in table.devices.items():
+            self.devices[bus_name] = [DeviceHealth(bus_name, info.address, info.name) for info in devices.values()]
+        self.rounds = 0
+        self.lock_failures = {bus_name: 0 for bus_name in self.devices}
+
+    def poll_bus(self, bus_name):
+        """Ping each device on one bus once. Returns False if the bus couldn't be locked."""
+        bus = self.buses[bus_name]
+        if not lock_bus(bus, self.retries):
+            self.lock_failures[bus_name] += 1
+            return False
+        try:
+            for health in self.devices[bus_name]:
+                health.pings += 1
+                start = ticks_us()
+                try:
+                    bus.writeto(health.address, _PING)
+                except OSError as error:
+                    if error.args and error.args[0] == _ENODEV:
+                        health.nacks += 1
+                    else:
+                        health.errors += 1
+                        health.last_error = error
+                    continue
+                health.record(ticks_diff(ticks_us(), start))
+        finally:
+            bus.unlock()
+        return True
+
+    @profiled
+    def poll(self):
+        """Ping every device once"""
+        for bus_name in self.devices:
+            self.poll_bus(bus_name)
+        self.rounds += 1
+
+    def run(self, rounds=None):
+        """Poll every interval seconds, for rounds rounds or forever"""
+        while rounds is None or self.rounds < rounds:
+            self.poll()
+            time.sleep(self.interval)
+
+    async def run_async(self, rounds=None):
+        """Like run(), but gives other tasks a turn between buses and while waiting:
+
+            asyncio.create_task(monitor.run_async())
+        """
+        import asyncio
+        while rounds is None or self.rounds < rounds:
+            for bus_name in self.devices:
+                self.poll_bus(bus_name)
+                await asyncio.sleep(0)
+            self.rounds += 1
+            await asyncio.sleep(self.interval)
+
+    def summary(self):
+        """Return one dict per device, with its counts and p50, p99 and max latency in microseconds.
+        p50 and p99 are estimated from the latency buckets."""
+        rows = []
+        for devices in self.devices.values():
+            for health in devices:
+                rows.append({
+                    "bus": health.bus_name,
+                    "address": health.address,
+                    "name": health.name,
+                    "pings": health.pings,
+                    "nacks": health.nacks,
+                    "errors": health.errors,
+                    "mean_us": health.mean_us(),
+                    "p50_us": health.percentile(0.5),
+                    "p99_us": health.percentile(0.99),
+                    "max_us": health.max_us,
+                })
+        return rows
+
+    @profiled
+    def report(self):
+        """Print the summary as a table"""
+        from utils_report import writer
+        out = writer()
+        out.heading(b"i2c health")
+        out.text(b"Rounds: ")
+        out.number(self.rounds)
+        out.newline()
+        out.line(b"bus         addr  pings  nacks errors   mean us    p50 us    p99 us    max us")
+        for bus_name, devices in self.devices.items():
+            for health in devices:
+                out.text(bus_name)
+                out.pad(12)
+                out.hex(health.address)
+                out.number(health.pings, 7)
+                out.number(health.nacks, 7)
+                out.number(health.errors, 7)
+                for value in (health.mean_us(), health.percentile(0.5), health.percentile(0.99), health.max_us):
+                    if value is None:
+                        out.text(b"         -")
+                    else:
+                        out.number(value, 10)
+                if health.name is not None:
+                    out.text(b"  ")
+                    out.text(health.name)
+                out.newline()
+            if self.lock_failures[bus_name]:
+                out.text(bus_name)
+                out.text(b": busy for ")
+                out.number(self.lock_failures[bus_name])
+                out.line(b" rounds")
+        out.line(b"p50 and p99 are estimates, from how many pings fell in each latency bucket")
+        out.flush()
@@ -5,253 +5,367 @@
 
 """ Helper functions for board pins """
 
-import board
+from collections import namedtuple
+
+import utils_trace
+from utils_profile import profiler
+
+profiled = profiler(__name__)
 
 COLUMN1_WIDTH = 25
 
+# Result of classify_pin()
+# bus:         pin family, such as "i2c", "uart" or "tft"
+# role:        what the pin does within that family, such as "clock" or "tx"
+# instance:    trailing number for pins with several instances (UART1, A3, LCD_DATA5), otherwise None
+# description: human readable description, as printed by get_board_pins()
+PinClass = namedtuple("PinClass", ("bus", "role", "instance", "description"))
+
+# Exact pin names, mapped to (bus, role, description).
+# Built once at import time, so looking up a pin is a single dictionary access.
+PIN_DESCRIPTIONS = {
+    "LED": ("led", "led", "Built-in LED"),
+    "WHITE_LEDS": ("led", "led", "Built-in white LEDs"),
+    "NEOPIXEL": ("led", "neopixel", "Built-in Neopixel"),
+    "APA102_SCK": ("led", "clock", "Built-in DotStar LED Serial Clock"),
+    "APA102_MOSI": ("led", "data", "Built-in DotStar LED Master Out Slave In"),
+    "DOTSTAR_CLOCK": ("led", "clock", "Built-in DotStar LED Serial Clock"),
+    "DOTSTAR_DATA": ("led", "data", "Built-in DotStar color data"),
+
+    # I2C bus
+    "STEMMA_I2C": ("i2c", "bus", "Stemma I2C Connector"),
+    "SCK": ("i2c", "clock", "I2C Serial Clock"),
+
+    # SPI bus
+    "SPI": ("spi", "bus", "SPI Bus"),
+    "MOSI": ("spi", "mosi", "SPI Master Out Slave In"),
+    "MISO": ("spi", "miso", "SPI Master In Slave Out"),
+    "SS": ("spi", "cs", "SPI Slave Select"),
+    "CS": ("spi", "cs", "SPI Slave Select (alt name)"),
+
+    # Misc buttons
+    "SLIDE_SWITCH": ("button", "switch", "Built-in switch"),
+    "POWER_SWITCH": ("button", "switch", "Built-in power switch"),
+
+    # Built-in Display
+    "DISPLAY": ("display", "display", "Built-in display"),
+
+    # TFT display pins
+    "TFT_BACKLIGHT": ("tft", "backlight", "TFT display backlight control"),
+    "TFT_CS": ("tft", "cs", "TFT display chip select for SPI bus"),
+    "TFT_RS": ("tft", "dc", "TFT register or display data/command select"),
+    "TFT_DC": ("tft", "dc", "TFT register or display data/command select"),
+    "TFT_MOSI": ("tft", "mosi", "TFT display SPI Master Out Slave In"),
+    "TFT_RESET": ("tft", "reset", "TFT display reset"),
+    "TFT_SCK": ("tft", "clock", "TFT display SPI serial clock"),
+    "TFT_TE": ("tft", "te", "TFT tearing effect/prevention"),
+    "TFT_WR": ("tft", "write", "TFT display write"),
+    "TFT_RD": ("tft", "read", "TFT display read"),
+
+    # TFT pins on Qualia devices
+    "TFT_PINS": ("tft", "pins", "GPIO connections for dot clock TFT displays"),
+    "TFT_TIMINGS": ("tft", "timings", "TFT timings for single-display boards "),
+    "TFT_INIT_SEQUENCE": ("tft", "init", "board's built in display initialization sequence"),
+    "TFT_IO_EXPANDER": ("tft", "expander", "I/O expander, for when SPI bus is on an I2C I/O expander"),
+
+    # LCD display pins
+    "LCD_BCKL": ("lcd", "backlight", "LCD display backlight control"),
+    "LCD_CLK": ("lcd", "clock", "LCD display  SPI serial clock"),
+    "LCD_CS": ("lcd", "cs", "LCD display chip select"),
+    "LCD_D_C": ("lcd", "dc", "LCD display data/command select"),
+    "LCD_MOSI": ("lcd", "mosi", "LCD display SPI Master Out Slave In"),
+    "LCD_RST": ("lcd", "reset", "LCD display reset"),
+
+    # E-ink display
+    "EPD_BUSY": ("epd", "busy", "E-ink display busy signal"),
+    "EPD_CS": ("epd", "cs", "E-ink display chip select for SPI bus"),
+    "EPD_DC": ("epd", "dc", "E-ink display data/command select"),
+    "EPD_MISO": ("epd", "miso", "E-ink display SPI Master In Slave Out"),
+    "EPD_MOSI": ("epd", "mosi", "E-ink display SPI Master Out Slave In"),
+    "EPD_RESET": ("epd", "reset", "E-ink display display reset"),
+    "EPD_SCK": ("epd", "clock", "E-ink display display SPI serial clock"),
+
+    # Touchscreen pins
+    "TOUCH_XL": ("touch", "xl", "Touchscreen X left"),
+    "TOUCH_XR": ("touch", "xr", "Touchscreen X right"),
+    "TOUCH_YD": ("touch", "yd", "Touchscreen Y down"),
+    "TOUCH_YU": ("touch", "yu", "Touchscreen Y up"),
+
+    # Audio in and out
+    "SPEAKER": ("audio", "speaker", "Speaker output"),
+    "AUDIO_OUT": ("audio", "speaker", "Speaker output"),
+    "SPEAKER_ENABLE": ("audio", "enable", "Speaker enable"),
+    "MICROPHONE_DATA": ("audio", "data", "Microphone PDM data"),
+    "MICROPHONE_CLOCK": ("audio", "clock", "Microphone PDM clock"),
+
+    # Other misc sensors
+    "LIGHT": ("sensor", "light", "Light sensor"),
+    "L": ("sensor", "light", "Light sensor"),
+    "TEMPERATURE": ("sensor", "temperature", "Temperature sensor"),
+
+    # ESP32 co-processor pins
+    "ESP_BUSY": ("esp32", "busy", "ESP32 co-processor busy status"),
+    "ESP_CS": ("esp32", "cs", "ESP32 co-processor SPI chip select"),
+    "ESP_RESET": ("esp32", "reset", "ESP32 co-processor reset"),
+    "ESP_RTS": ("esp32", "rts", "ESP32 co-processor request-to-send for UART"),
+    "ESP_TX": ("esp32", "tx", "ESP32 co-processor transmit to MCU"),
+    "ESP_RX": ("esp32", "rx", "ESP32 co-processor receive from MCU"),
+    "ESP_GPIO0": ("esp32", "boot", "ESP32 boot select"),
+
+    # Power pins
+    "VOLTAGE_MONITOR": ("power", "monitor", "Supply voltage monitor"),
+    "BATTERY": ("power", "monitor", "Battery voltage monitor"),
+    "VBUS_SENSE": ("power", "vbus", "USB VBUS power detection"),
+    "SMPS_MODE": ("power", "smps", "Switched-Mode Power Supply control"),
+    "PE_POWER": ("power", "enable", "Peripheral power"),
+
+    # Boot pins
+    "BOOT0": ("boot", "boot", "Bootloader select"),
+
+    # SD card
+    "SD_CS": ("sd", "cs", "SD card SPI chip select"),
+    "SD_CLK": ("sd", "clock", "SD card SPI clock"),
+    "SD_CARD_DETECT": ("sd", "detect", "SD card detection"),
+    "SD_MISO": ("sd", "miso", "SD card SPI Master In Slave Out"),
+    "SD_MOSI": ("sd", "mosi", "SD card SPI Master Out Slave In"),
+
+    # Camera
+    "CAMERA_VSYNC": ("camera", "vsync", "Camera vertical sync signal"),
+    "CAMERA_HSYNC": ("camera", "hsync", "Camera horizontal sync signal"),
+    "CAMERA_HREF": ("camera", "href", "Camera horizontal reference"),
+    "CAMERA_XCLK": ("camera", "xclk", "Camera external clock"),
+    "CAMERA_PCLK": ("camera", "pclk", "Camera pixel clock"),
+    "CAMERA_PWDN": ("camera", "power", "Camera power down"),
+    "CAMERA_RESET": ("camera", "reset", "Camera reset"),
+}
+
+# Pins that can have multiple instances, such as UART1, TX2, SCL1 or LCD_DATA7.
+# Each entry is (prefix, bus, role, description). Anything after the prefix
+# is treated as the instance number.
+PIN_PREFIXES = (
+    # UART pins
+    ("UART", "uart", "bus", "UART"),
+    ("TX", "uart", "tx", "UART transmit"),
+    ("RX", "uart", "rx", "UART receive"),
+
+    # I2C
+    ("I2C", "i2c", "bus", "I2C bus"),
+    ("SCL", "i2c", "clock", "I2C serial clock line"),
+    ("SDA", "i2c", "data", "I2C serial data line"),
+
+    # Buttons
+    ("BUTTON", "button", "button", "Built-in button"),
+
+    # LCD and camera data lines
+    ("LCD_DATA", "lcd", "data", "LCD data"),
+    ("CAMERA_DATA", "camera", "data", "Camera data"),
+
+    # Generic A and D pins. These only match when followed by a digit.
+    ("A", "analog", "analog", "Generic analog pin"),
+    ("D", "digital", "digital", "Generic digital pin"),
+)
+
+# Prefix table, indexed by first letter so each lookup only tries a couple of prefixes.
+# Longest prefixes come first, so LCD_DATA wins over a shorter match.
+_prefix_index = {}
+for _entry in sorted(PIN_PREFIXES, key=lambda entry: len(entry[0]), reverse=True):
+    _prefix_index.setdefault(_entry[0][0], []).append(_entry)
+del _entry
+
+
+def _instance_number(name, start):
+    """Return the number starting at position start in name, or None if there isn't one.
+    An underscore before it is skipped, and anything after it is ignored, so D13_LED gives 13."""
+    if start < len(name) and name[start] == "_":
+        start += 1
+    end = start
+    while end < len(name) and name[end].isdigit():
+        end += 1
+    if end == start:
+        return None
+    return int(name[start:end])
+
+
+def classify_pin(name):
+    """Classify a pin name from dir(board).
+    Returns a PinClass of (bus, role, instance, description), or None if the name isn't recognized."""
+
+    entry = PIN_DESCRIPTIONS.get(name)
+    if entry is not None:
+        return PinClass(entry[0], entry[1], None, entry[2])
+
+    candidates = _prefix_index.get(name[:1])
+    if candidates is None:
+        return None
+    for prefix, bus, role, description in candidates:
+        if name.startswith(prefix):
+            instance = _instance_number(name, len(prefix))
+            # A and D only count as generic pins when a number follows, so ACCELEROMETER doesn't match
+            if len(prefix) == 1 and instance is None:
+                continue
+            return PinClass(bus, role, instance, description)
+    return None
+
+
+@profiled
 def get_board_pins():
     """ Show pins from board module """
-    print("\n=== board pin details ===\n")
-
-    # Dictionary mapping pin name prefixes or exact names to descriptions
-    pin_descriptions = {
-        "LED": "Built-in LED",
-        "WHITE_LEDS": "Built-in white LEDs",
-        "NEOPIXEL": "Built-in Neopixel",
-        "APA102_SCK": "Built-in DotStar LED Serial Clock",
-        "APA102_MOSI":"Built-in DotStar LED Master Out Slave In",
-        "DOTSTAR_CLOCK": "Built-in DotStar LED Serial Clock",
-        "DOTSTAR_DATA": "Built-in DotStar color data",
-
-        # I2C bus
-
-        "STEMMA_I2C": "Stemma I2C Connector",
-        "SCK": "I2C Serial Clock",
-
-        # SPI bus
-        "SPI": "SPI Bus",
-        "MOSI": "SPI Master Out Slave In",
-        "MISO": "SPI Master In Slave Out",
-        "SS": "SPI Slave Select",
-        "CS": "SPI Slave Select (alt name)",
-
-        # UART
-        "UART": "UART",
-        "UART1": "UART",
-        "UART2": "UART",
-        "RX": "UART receive",
-        "RX0": "UART receive",
-        "RX1": "UART receive",
-        "TX": "UART transmit",
-        "TX0": "UART transmit",
-        "TX1": "UART transmit",
-
-        # Misc buttons
-        "BUTTON": "Built-in button",
-        "SLIDE_SWITCH": "Built-in switch",
-        "POWER_SWITCH": "Built-in power switch",
-
-        # Built-in Displau
-        "DISPLAY": "Built-in display",
-
-        # TFT display pins
-        "TFT_BACKLIGHT": "TFT display backlight control",
-        "TFT_CS":"TFT display chip select for SPI bus",
-        "TFT_RS": "TFT register or display data/command select",
-        "TFT_DC": "TFT register or display data/command select",
-        "TFT_MOSI": "TFT display SPI Master Out Slave In",
-        "TFT_RESET": "TFT display reset",
-        "TFT_SCK": "TFT display SPI serial clock",
-        "TFT_TE": "TFT tearing effect/prevention",
-        "TFT_WR": "TFT display write",
-        "TFT_RD": "TFT display read",
-
-        # TFT pins on Qualia devices 
-        "TFT_PINS": "GPIO connections for dot clock TFT displays",
-        "TFT_TIMINGS": "TFT timings for single-display boards ",
-        "TFT_INIT_SEQUENCE": "board's built in display initialization sequence",
-        "TFT_IO_EXPANDER": "I/O expander, for when SPI bus is on an I2C I/O expander",
-
-        # LCD display pins
-        "LCD_BCKL": "LCD display backlight control",
-        "LCD_CLK": "LCD display  SPI serial clock",
-        "LCD_CS": "LCD display chip select",
-        "LCD_D_C": "LCD display data/command select",
-        "LCD_MOSI": "LCD display SPI Master Out Slave In",
-        "LCD_RST": "LCD display reset",
-        "LCD_DATA0": "LCD data",  
-        "LCD_DATA1": "LCD data",                 
-        "LCD_DATA2": "LCD data",                 
-        "LCD_DATA3": "LCD data",                 
-        "LCD_DATA4": "LCD data",                 
-        "LCD_DATA5": "LCD data",                 
-        "LCD_DATA6": "LCD data",                 
-        "LCD_DATA7": "LCD data",                 
-
-        # LCD pins
-        "LCD_DATA": "LCD data",
-
-        # E-ink display
-        "EPD_BUSY": "E-ink display busy signal",
-        "EPD_CS": "E-ink display chip select for SPI bus",
-        "EPD_DC": "E-ink display data/command select",
-        "EPD_MISO": "E-ink display SPI Master In Slave Out",
-        "EPD_MOSI": "E-ink display SPI Master Out Slave In",
-        "EPD_RESET": "E-ink display display reset",
-        "EPD_SCK": "E-ink display display SPI serial clock",
-
-        # Touchscreen pins
-        "TOUCH_XL":"Touchscreen X left",
-        "TOUCH_XR": "Touchscreen X right",
-        "TOUCH_YD": "Touchscreen Y down",
-        "TOUCH_YU": "Touchscreen Y up",
-
-        # Audio in and out
-        "SPEAKER": "Speaker output",
-        "AUDIO_OUT": "Speaker output",
-        "SPEAKER_ENABLE": "Speaker enable",
-        "MICROPHONE_DATA": "Microphone PDM data",
-        "MICROPHONE_CLOCK": "Microphone PDM clock",
-
-        # Other misc sensors
-        "LIGHT" : "Light sensor",
-        "L" : "Light sensor",
-        "TEMPERATURE": "Temperature sensor",
-
-        # ESP32 co-processor pins
-        "ESP_BUSY": "ESP32 co-processor busy status",
-        "ESP_CS": "ESP32 co-processor SPI chip select",
-        "ESP_RESET": "ESP32 co-processor reset",
-        "ESP_RTS": "ESP32 co-processor request-to-send for UART",
-        "ESP_TX": "ESP32 co-processor transmit to MCU",
-        "ESP_RX": "ESP32 co-processor receive from MCU",
-        "ESP_GPIO0": "ESP32 boot select",
-
-
-        # Power pins
-        "VOLTAGE_MONITOR": "Supply voltage monitor",
-        "BATTERY": "Battery voltage monitor",
-        "VBUS_SENSE": "USB VBUS power detection",
-        "SMPS_MODE": "Switched-Mode Power Supply control",
-        "PE_POWER": "Peripheral power",
-
-        # Boot pins
-        "BOOT0": "Bootloader select",
-
-        # SD card
-        "SD_CS": "SD card SPI chip select",
-        "SD_CLK": "SD card SPI clock",
-        "SD_CARD_DETECT": "SD card detection",
-        "SD_MISO":"SD card SPI Master In Slave Out",
-        "SD_MOSI": "SD card SPI Master Out Slave In",
-
-        # Camera
-        "CAMERA_VSYNC":"Camera vertical sync signal",
-        "CAMERA_HSYNC": "Camera horizontal sync signal",
-        "CAMERA_HREF": "Camera horizontal reference",
-        "CAMERA_XCLK": "Camera external clock",
-        "CAMERA_PCLK": "Camera pixel clock",
-        "CAMERA_PWDN": "Camera power down",
-        "CAMERA_RESET": "Camera reset",
-        "CAMERA_DATA":"Camera data",
-        "CAMERA_DATA2": "Camera data",
-
-    }
 
+    import board
+    from utils_report import writer
+
+    out = writer()
+    out.heading(b"board pin details")
+
+    trace = utils_trace.begin() if utils_trace.ENABLED else 0
     pins = dir(board)
     pins.sort()
+    if trace:
+        utils_trace.end("pins.list", trace)
 
     for item in pins:
-        descriptor = ""  # Default to empty descriptor
-
-        # First, check the dictionary for matching pin names
-        for prefix, description in pin_descriptions.items():
-            if item == prefix:
-                descriptor = description
-                break  # Break if a match is found
-
-        # Then check for pins that can have multiple instances
-        # UART pins
-        if item.startswith("UART"):
-                descriptor = "UART"  
-        elif item.startswith("TX"):
-            descriptor = "UART transmit"  
-        elif item.startswith("RX"):
-            descriptor = "UART receive"  
-    
-        # I2C 
-        elif item.startswith("I2C"):
-            descriptor = "I2C bus"  
-        elif item.startswith("SCL"):
-            descriptor = "I2C serial clock line"  
-        elif item.startswith("SDA"):
-            descriptor = "I2C serial data line" 
-        
-        # Buttons
-        elif item.startswith("BUTTON"):
-            descriptor = "Built-in button"
-        
-        # LCD pins
-        elif item.startswith("LCD_DATA"):
-            descriptor = "LCD data"
-
-        # then check for generic A and D pins
-        elif len(item) >= 2 and item[0] == "A" and item[1].isdigit():
-            descriptor = "Generic analog pin"
-        elif len(item) >= 2 and item[0] == "D" and item[1].isdigit():
-            descriptor = "Generic digital pin"
-        
-        print(f"\t{item: <{COLUMN1_WIDTH}} {descriptor}")
-
+        pin_class = classify_pin(item)
+        out.byte(9)
+        out.text(item)
+        out.pad(COLUMN1_WIDTH + 1)
+        out.byte(32)
+        if pin_class is not None:
+            out.text(pin_class.description)
+        out.newline()
+    out.flush()
+
+@profiled
 def get_microcontroller_pins():
     """Show microcontroller pin details"""
 
-    print("\n=== microcontroller pins ===\n")
-
     import microcontroller
+    from utils_report import writer
 
-    print("Microcontroller pins:")
-    for pin in dir(microcontroller.pin):
-        print("\t" + pin)
+    out = writer()
+    out.heading(b"microcontroller pins")
 
+    out.line(b"Microcontroller pins:")
+    for pin in dir(microcontroller.pin):
+        out.byte(9)
+        out.line(pin)
+    out.flush()
+
+# Cached result of build_pin_map(). Pins don't change until the board reboots.
+_pin_map = None
+
+@profiled
+def build_pin_map(refresh=False):
+    """Map each microcontroller Pin to its GPIO names and board aliases.
+    Returns a dict of Pin -> ((gpio names), [board aliases]), including only pins that appear in board.
+    Most Pins have one GPIO name, but some ports list a Pin under several, and all of them are kept.
+    Built in a single pass over board and microcontroller.pin, then cached, and kept in utils_cache
+    for the next boot."""
+
+    global _pin_map
+    if _pin_map is not None and not refresh:
+        return _pin_map
+
+    import board
+    import microcontroller
+    import utils_cache
+
+    trace = utils_trace.begin() if utils_trace.ENABLED else 0
+    if not refresh:
+        pin_map = _cached_pin_map(utils_cache.get("pin_map"), microcontroller)
+        if pin_map is not None:
+            _pin_map = pin_map
+            if trace:
+                utils_trace.end("pins.cached_map", trace)
+            return pin_map
+
+    Pin = microcontroller.Pin
+
+    # One pass over board, grouping aliases by the Pin object they point to
+    aliases_by_pin = {}
+    for alias in dir(board):
+        pin = getattr(board, alias)
+        if isinstance(pin, Pin):
+            aliases = aliases_by_pin.get(pin)
+            if aliases is None:
+                aliases_by_pin[pin] = [alias]
+            else:
+                aliases.append(alias)
+
+    # One pass over microcontroller.pin, which contains some other things than Pins
+    pin_map = {}
+    for gpio_name in dir(microcontroller.pin):
+        pin = getattr(microcontroller.pin, gpio_name)
+        if isinstance(pin, Pin):
+            aliases = aliases_by_pin.get(pin)
+            if aliases is not None:
+                entry = pin_map.get(pin)
+                gpio_names = (gpio_name,) if entry is None else entry[0] + (gpio_name,)
+                pin_map[pin] = (gpio_names, aliases)
+    if trace:
+        utils_trace.end("pins.build_map", trace)
+
+    if utils_cache.ENABLED:
+        entries = [[list(gpio_names), aliases] for gpio_names, aliases in pin_map.values()]
+        if utils_cache.get("pin_map") != entries:
+            utils_cache.put("pin_map", entries)
+    _pin_map = pin_map
+    return pin_map
+
+def _cached_pin_map(entries, microcontroller):
+    """The pin map from the entries utils_cache kept last boot, or None if there aren't any"""
+    if entries is None:
+        return None
+    pin_map = {}
+    for gpio_names, aliases in entries:
+        if isinstance(gpio_names, str):
+            # Kept before Pins had all their GPIO names
+            return None
+        pin = getattr(microcontroller.pin, gpio_names[0], None)
+        if pin is None:
+            return None
+        pin_map[pin] = (tuple(gpio_names), aliases)
+    return pin_map
+
+def reset():
+    """Forget the pin map, so the next build_pin_map() builds it again, or reads it from utils_cache"""
+    global _pin_map
+    _pin_map = None
+
+@profiled
 def get_matching_pins():
     """Show how microprocessor and board pins match up"""
 
-    print("\n=== pin name info ===\n")
+    from utils_report import writer
 
-    import microcontroller
+    out = writer()
+    out.heading(b"pin name info")
 
-    microcontroller_pins = []
+    # The board aliases, followed by the original GPIO names in parentheses, sorted by alias
+    for gpio_names, aliases in sorted(build_pin_map().values(), key=_first_alias):
+        for alias in aliases:
+            out.text(b"board.")
+            out.text(alias)
+            out.byte(32)
+        out.byte(40)
+        for i, gpio_name in enumerate(gpio_names):
+            if i:
+                out.byte(47)
+            out.text(gpio_name)
+        out.line(b")")
+    out.flush()
 
-    # get the list provided by microcontroller.pin,
-    # which contains some other things than Pins
-    for pin in dir(microcontroller.pin):
-        # check each item to see if it's a Pin
-        pin_attr = getattr(microcontroller.pin, pin)
-        if (isinstance(pin_attr, microcontroller.Pin) ):
-            # the list of pin names associated with the Pin
-            pins = []
-            # dir(board) has some items that are aliases
-            # look at the list it returns
-            for alias in dir(board):
-                if getattr(board, alias) is getattr(microcontroller.pin, pin):
-                    pins.append(f"board.{alias}")
-            # Add the original GPIO name, in parentheses.
-
-            # Only include pins that are in board.
-            if pins:
-                pins.append(f"({str(pin)})")
-                microcontroller_pins.append(" ".join(pins))
-
-    for pins in sorted(microcontroller_pins):
-        print(pins)
+def _first_alias(entry):
+    return entry[1]
 
 # Check for a specific pin
+@profiled
 def check_for_pin(pin):
     """Check for a pin in board module.
     If you're using a board not made by Adafruit, you can use this function to search for non-standard pin names.
     You can 'import board' and then dir(board) to see what pins your board has."""
 
+    import board
+
     if hasattr(board, pin):
         pin_detected = True
     else:
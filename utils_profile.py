@@ -0,0 +1,218 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Heap profiling for the utils_* functions and benchmarks.
+
+Every utils_* entry point is decorated with @profiled, and recorded as "module.function".
+Turn it on, call the functions, then look at the report:
+
+    import utils_profile, utils_system
+    utils_profile.ENABLED = True
+    utils_system.get_os_info()
+    utils_profile.report()
+
+On CircuitPython this uses gc.mem_alloc(). On regular Python it uses tracemalloc. """
+
+import gc
+import sys
+
+from utils_ticks import ticks_diff, ticks_us
+
+# Set to True to profile every @profiled function. When False, each call costs one extra branch.
+ENABLED = False
+
+# Allocation budgets in bytes, by name, like "utils_system.get_os_info". report() flags functions whose peak goes over.
+# These are the largest peaks measured on every fake board (python -m fakes --all) with tracemalloc,
+# after the first run had imported everything, plus a quarter and rounded up to the next KB.
+# A board allocates differently, so set your own from report() once you've run on yours.
+BUDGETS = {
+    "utils_accelerometer.print_values": 4096,
+    "utils_cache.load": 1024,
+    "utils_cache.save": 3072,
+    "utils_capabilities.collect_capabilities": 22528,
+    "utils_capabilities.get_capabilities": 25600,
+    "utils_display.collect_display_info": 1024,
+    "utils_display.get_display_info": 2048,
+    "utils_i2c.discover": 6144,
+    "utils_i2c.get_i2c_info": 12288,
+    "utils_pins.build_pin_map": 21504,
+    "utils_pins.get_board_pins": 6144,
+    "utils_pins.get_matching_pins": 28672,
+    "utils_pins.get_microcontroller_pins": 3072,
+    "utils_system.collect_snapshot": 7168,
+    "utils_system.get_board_info": 3072,
+    "utils_system.get_microcontroller_info": 3072,
+    "utils_system.get_os_info": 13312,
+    "utils_wifi.connect_wifi": 3072,
+    "utils_wifi.measure_download": 5120,
+    "utils_wifi.scan_wifi_networks": 4096,
+    "utils_wifi.test_bandwidth": 33792,
+    "utils_wifi.test_wifi": 11264,
+    "utils_wifi_probe.poll": 1024,
+    "utils_wifi_probe.report": 2048,
+}
+
+# Recorded results, by name: [calls, max peak, max retained, total GC us, total us]
+_profiles = {}
+
+# How many profile blocks are currently open. Only the outermost one collects garbage.
+_depth = 0
+
+# On the board, gc.mem_alloc() tells us the heap use. Regular Python falls back to tracemalloc,
+# even if something like the fakes package has added a gc.mem_alloc().
+# tracemalloc is only imported the first time something is profiled.
+_use_gc = sys.implementation.name in ("circuitpython", "micropython")
+tracemalloc = None
+
+
+def _allocated():
+    if _use_gc:
+        return gc.mem_alloc()
+    return tracemalloc.get_traced_memory()[0]
+
+
+class profile:
+    """Context manager that measures the heap used by the code inside it.
+
+    peak:       most bytes allocated above the starting point
+    retained:   bytes still allocated afterwards, once garbage is collected
+    gc_us:      microseconds the collection after the block took. It doesn't include
+                collections that happened inside the block.
+    elapsed_us: microseconds spent inside the block, including any collections in it
+
+    On CircuitPython, garbage collection stays on, so the code behaves the same as
+    without profiling. The heap is only read at the start and end, so peak is a lower bound.
+    If the heap shrank over the block, a collection ran inside it: forced_gc is set,
+    and peak says nothing useful.
+    Nested blocks don't collect, so retained and gc_us are None for them."""
+
+    def __init__(self, name=None):
+        self.name = name
+        self.peak = None
+        self.retained = None
+        self.gc_us = None
+        self.elapsed_us = None
+        self.forced_gc = False
+
+    def __enter__(self):
+        global _depth, tracemalloc
+        self._outermost = _depth == 0
+        self._started_tracing = False
+        _depth += 1
+
+        if not _use_gc:
+            if tracemalloc is None:
+                import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+        if self._outermost:
+            gc.collect()
+            if not _use_gc:
+                tracemalloc.reset_peak()
+        self._start = _allocated()
+        self._start_us = ticks_us()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _depth
+        self.elapsed_us = ticks_diff(ticks_us(), self._start_us)
+        _depth -= 1
+
+        if _use_gc:
+            end = gc.mem_alloc()
+            self.forced_gc = end < self._start
+            self.peak = max(0, end - self._start)
+        elif self._outermost:
+            self.peak = max(0, tracemalloc.get_traced_memory()[1] - self._start)
+        else:
+            self.peak = max(0, _allocated() - self._start)
+
+        if self._outermost:
+            start_us = ticks_us()
+            gc.collect()
+            self.gc_us = ticks_diff(ticks_us(), start_us)
+            self.retained = _allocated() - self._start
+        if self._started_tracing:
+            tracemalloc.stop()
+
+        if self.name is not None:
+            _record(self)
+        return False
+
+
+def _record(result):
+    entry = _profiles.get(result.name)
+    if entry is None:
+        # Floats for the totals, which can outgrow a small int
+        entry = _profiles[result.name] = [0, 0, 0, 0.0, 0.0]
+    entry[0] += 1
+    entry[1] = max(entry[1], result.peak)
+    if result.retained is not None:
+        entry[2] = max(entry[2], result.retained)
+    if result.gc_us is not None:
+        entry[3] += result.gc_us
+    entry[4] += result.elapsed_us
+
+
+def profiler(module=None):
+    """Return a decorator that profiles functions as "module.name", whenever ENABLED is True.
+    Functions on CircuitPython don't know which module they're in, so each module makes its own:
+
+        profiled = utils_profile.profiler(__name__)
+    """
+    prefix = "" if module is None else module + "."
+
+    def profiled(function):
+        name = prefix + function.__name__
+
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            with profile(name):
+                return function(*args, **kwargs)
+
+        # Not every CircuitPython build lets you set these
+        try:
+            wrapper.__name__ = function.__name__
+            wrapper.__doc__ = function.__doc__
+        except AttributeError:
+            pass
+        return wrapper
+
+    return profiled
+
+
+# Decorator that profiles a function under its own name, for your own code
+profiled = profiler()
+
+
+def results():
+    """Return recorded profiles as a dict of name -> dict of statistics"""
+    return {
+        name: {"calls": calls, "peak": peak, "retained": retained, "gc_us": gc_us, "elapsed_us": elapsed_us,
+               "budget": BUDGETS.get(name)}
+        for name, (calls, peak, retained, gc_us, elapsed_us) in _profiles.items()
+    }
+
+
+def over_budget():
+    """Return the names of functions whose peak allocation went over their budget"""
+    return [name for name, entry in _profiles.items() if name in BUDGETS and entry[1] > BUDGETS[name]]
+
+
+def reset():
+    """Forget everything recorded so far"""
+    _profiles.clear()
+
+
+def report():
+    """Print recorded profiles, one line per function"""
+    print("\n=== heap profile ===\n")
+    print("\t%-44s %6s %10s %10s %8s %10s" % ("function", "calls", "peak B", "kept B", "GC ms", "budget B"))
+    for name in sorted(_profiles):
+        calls, peak, retained, gc_us, _ = _profiles[name]
+        budget = BUDGETS.get(name)
+        flag = " OVER" if budget is not None and peak > budget else ""
+        print("\t%-44s %6d %10d %10d %8.2f %10s%s" % (
+            name, calls, peak, retained, gc_us / 1000, "-" if budget is None else budget, flag))
@@ -0,0 +1,275 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Text output for the utils_* reports, without the temporary strings.
+
+print() with f-strings, str() and join() makes a new string for every field, and on a board
+that runs for weeks those leftovers fragment the heap. ReportWriter formats straight into one
+preallocated bytearray instead, and writes it to the serial console in one go:
+
+    from utils_report import writer
+    out = writer()
+    out.heading(b"os module info")
+    out.row(b"Board name:", snapshot.machine)
+    out.key(b"MAC address:")
+    out.hex_bytes(wifi.radio.mac_address)
+    out.newline()
+    out.flush()
+
+Labels are bytes literals, so they cost nothing to write. Numbers and hex are written digit by digit.
+The buffer flushes itself when it fills up, so reports of any length work. """
+
+import sys
+
+# Columns the values line up on, after the key
+KEY_WIDTH = 24
+BUFFER_SIZE = 512
+
+_HEX_DIGITS = b"0123456789ABCDEF"
+
+# CircuitPython strings can be copied straight into a bytearray. Regular Python strings have to be encoded first.
+try:
+    memoryview(bytearray(1))[0:1] = "a"
+    _str_is_buffer = True
+except TypeError:
+    _str_is_buffer = False
+
+
+class ReportWriter:
+    """Formats text into a preallocated bytearray, then writes it to sys.stdout in one call per block.
+
+    size:       bytes to format before flushing
+    key_width:  column the values start at, for key() and row()"""
+
+    def __init__(self, size=BUFFER_SIZE, key_width=KEY_WIDTH):
+        self.buffer = bytearray(size)
+        self._view = memoryview(self.buffer)
+        self.length = 0
+        self._line_start = 0
+        self.key_width = key_width
+        self.flushes = 0
+
+    def _reserve(self, count):
+        """Make room for count more bytes, flushing if needed"""
+        if self.length + count > len(self.buffer):
+            self.flush()
+            if count > len(self.buffer):
+                raise ValueError("ReportWriter buffer is too small")
+
+    def flush(self):
+        """Write what's been formatted to sys.stdout"""
+        if self.length == 0:
+            return
+        out = sys.stdout
+        buffer = getattr(out, "buffer", None)
+        if buffer is not None:
+            # Anything print() wrote has to come out first
+            flush = getattr(out, "flush", None)
+            if flush is not None:
+                flush()
+            buffer.write(self._view[:self.length])
+        else:
+            view = self._view[:self.length]
+            try:
+                # The board's stdout takes bytes, even where it has no buffer
+                out.write(view)
+            except TypeError:
+                # Somewhere that only takes text, like a redirected stdout on a computer.
+                # Decoded straight from the view, without copying it to bytes first.
+                out.write(str(view, "utf-8"))
+        # Keep track of where the line started, so pad() still works after a flush
+        self._line_start -= self.length
+        self.length = 0
+        self.flushes += 1
+
+    def byte(self, value):
+        self._reserve(1)
+        self.buffer[self.length] = value
+        self.length += 1
+
+    def text(self, value):
+        """Write bytes, or a str"""
+        if isinstance(value, str) and not _str_is_buffer:
+            if value.isascii() and len(value) <= len(self.buffer):
+                # Character by character allocates nothing, so tracemalloc on a computer sees what the board would
+                self._reserve(len(value))
+                for character in value:
+                    self.buffer[self.length] = ord(character)
+                    self.length += 1
+                return
+            value = value.encode()
+        count = len(value)
+        if count > len(self.buffer):
+            # Too big for the buffer, so write it in pieces
+            for start in range(0, count, len(self.buffer)):
+                self.text(value[start:start + len(self.buffer)])
+            return
+        self._reserve(count)
+        try:
+            self._view[self.length:self.length + count] = value
+        except ValueError:
+            # A CircuitPython string with characters that take more than one byte
+            value = value.encode()
+            count = len(value)
+            self._reserve(count)
+            self._view[self.length:self.length + count] = value
+        self.length += count
+
+    def newline(self):
+        self.byte(10)
+        self._line_start = self.length
+
+    def line(self, value=b""):
+        """Write value and end the line"""
+        self.text(value)
+        self.newline()
+
+    def pad(self, column, fill=32):
+        """Pad the current line with spaces out to column. Tabs count as one character."""
+        count = column - (self.length - self._line_start)
+        if count > 0:
+            self._reserve(count)
+            for i in range(self.length, self.length + count):
+                self.buffer[i] = fill
+            self.length += count
+
+    def number(self, value, width=0, fill=32):
+        """Write an integer in decimal, right-aligned in width"""
+        negative = value < 0
+        if negative:
+            value = -value
+        digits = 1
+        rest = value
+        while rest >= 10:
+            rest //= 10
+            digits += 1
+        if negative:
+            # The sign goes after the padding, next to the digits
+            if width > digits + 1:
+                self.pad(self.length - self._line_start + width - digits - 1)
+            self.byte(45)
+            width = 0
+        count = max(width, digits)
+        self._reserve(count)
+        end = self.length + count
+        for i in range(self.length, end - digits):
+            self.buffer[i] = fill
+        position = end
+        while True:
+            position -= 1
+            self.buffer[position] = 48 + value % 10
+            value //= 10
+            if value == 0:
+                break
+        self.length = end
+
+    def fixed(self, value, decimals=2, width=0):
+        """Write a float with a fixed number of decimals, right-aligned in width"""
+        negative = value < 0
+        if negative:
+            value = -value
+        scale = 10 ** decimals
+        whole = int(value)
+        fraction = int((value - whole) * scale + 0.5)
+        if fraction >= scale:
+            whole += 1
+            fraction -= scale
+        if width:
+            used = negative + (decimals + 1 if decimals else 0)
+            rest = whole
+            while rest >= 10:
+                rest //= 10
+                used += 1
+            self.pad(self.length - self._line_start + width - used - 1)
+        if negative:
+            self.byte(45)
+        self.number(whole)
+        if decimals:
+            self.byte(46)
+            self.number(fraction, decimals, 48)
+
+    def kilobytes(self, size):
+        """Write a size in bytes as KB with one decimal, using only integer math"""
+        tenths = (size * 10 + 512) // 1024
+        self.number(tenths // 10)
+        self.byte(46)
+        self.number(tenths % 10)
+        self.text(b" KB")
+
+    def hex(self, value, digits=2, prefix=True):
+        """Write an integer in hex, like 0x1D for an I2C address"""
+        self._reserve(digits + 2)
+        if prefix:
+            self.buffer[self.length] = 48
+            self.buffer[self.length + 1] = 120
+            self.length += 2
+        for i in range(digits - 1, -1, -1):
+            self.buffer[self.length + i] = _HEX_DIGITS[value & 0x0F]
+            value >>= 4
+        self.length += digits
+
+    def hex_bytes(self, data, separator=45):
+        """Write bytes as hex pairs, like 7C-DF-A1-00-11-22 for a MAC address or BSSID"""
+        self._reserve(len(data) * 3)
+        for i in range(len(data)):
+            if i and separator is not None:
+                self.buffer[self.length] = separator
+                self.length += 1
+            self.buffer[self.length] = _HEX_DIGITS[data[i] >> 4]
+            self.buffer[self.length + 1] = _HEX_DIGITS[data[i] & 0x0F]
+            self.length += 2
+
+    def value(self, value, decimals=2):
+        """Write any of None, bool, int, float, str or bytes"""
+        if value is None:
+            self.text(b"None")
+        elif value is True:
+            self.text(b"True")
+        elif value is False:
+            self.text(b"False")
+        elif isinstance(value, int):
+            self.number(value)
+        elif isinstance(value, float):
+            self.fixed(value, decimals)
+        elif isinstance(value, (str, bytes, bytearray)):
+            self.text(value)
+        else:
+            # Anything else has to go through str() anyway
+            self.text(str(value))
+
+    def heading(self, title):
+        """Write a section heading, like print("\\n=== title ===\\n") does"""
+        self.newline()
+        self.text(b"=== ")
+        self.text(title)
+        self.line(b" ===")
+        self.newline()
+
+    def key(self, key, indent=0):
+        """Start a table row: indent tabs, then key, padded out to key_width"""
+        for _ in range(indent):
+            self.byte(9)
+        self.text(key)
+        self.pad(self.key_width + indent)
+        self.byte(32)
+
+    def row(self, key, value, units=None, indent=0):
+        """Write a whole table row: key, value and optional units"""
+        self.key(key, indent)
+        self.value(value)
+        if units is not None:
+            self.byte(32)
+            self.text(units)
+        self.newline()
+
+
+# Shared by every report, so there's only ever one buffer
+_writer = None
+
+
+def writer():
+    """Return the shared ReportWriter"""
+    global _writer
+    if _writer is None:
+        _writer = ReportWriter()
+    return _writer
@@ -0,0 +1,332 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Samples the CPU's frequency, temperature and voltage, and free memory, every so often, to see whether
+the board throttled or its supply sagged while a benchmark or network test ran.
+
+    import utils_sampler
+    sampler = utils_sampler.SystemSampler(interval=0.5, path="samples.bin")
+    while working:
+        ...
+        sampler.poll()          # takes a sample if one is due
+    sampler.flush()
+    sampler.report()
+
+Or run it as an asyncio task alongside your code with run_async(), or hand it to
+utils_benchmark.run_benchmark() or LatencyProbe.run(). Samples are fixed-width records in a ring that's
+allocated once. With a path, they're also appended to that file BATCH records at a time, to keep flash
+writes few; that needs CIRCUITPY to be writable from boot.py. dump() prints the ring over serial instead.
+tools/align_log.py lines the samples up with saved benchmark and probe results. """
+
+import struct
+import time
+
+from utils_profile import profiler
+from utils_ticks import ticks_add, ticks_diff, ticks_ms
+
+profiled = profiler(__name__)
+
+# Every session in a log starts with MAGIC and FORMAT_VERSION.
+# Bump FORMAT_VERSION whenever the layout below changes.
+MAGIC = b"CPM"
+FORMAT_VERSION = 2
+
+# Seconds between samples, samples the ring holds, and samples written to the log at once
+INTERVAL = 1.0
+CAPACITY = 256
+BATCH = 64
+# Where samples go if you ask for a log without naming one. On the board, this is the root of CIRCUITPY.
+LOG_FILE = "samples.bin"
+
+# Layout, all little-endian:
+#   session:    "CPM", version u8, record size u8, time.localtime() year u16, month, day, hour, minute
+#               and second u8, ticks_ms() u32, interval ms u32, board_id and release (length u8, UTF-8 bytes)
+#               The clock and ticks_ms() are read together, to line the log up with other results.
+#               The clock is kept as its fields, since seconds since 1970 don't fit a small int.
+#   batch:      "R", count u16, then count records
+#   record:     ticks_ms() u32, CPU MHz u16, temperature i16 (hundredths of a degree C),
+#               voltage u16 (mV), gc.mem_free() u32
+# A log is sessions and batches one after another, since each start() of a sampler appends a session.
+RECORD = "<IHhHI"
+RECORD_SIZE = struct.calcsize(RECORD)
+_SESSION = "<3sBBHBBBBBII"
+_BATCH = "<cH"
+
+# Stand-ins for values that are None, the same as utils_telemetry's
+_NO_TEMPERATURE = -0x8000
+_NO_VOLTAGE = 0xFFFF
+
+class SystemSampler:
+    """Keeps the last capacity samples, and appends them to path in batches if you give one.
+
+    count:          samples taken
+    flushes:        writes to the log
+    write_errors:   writes that failed. After the first, the sampler stops trying and keeps only the ring."""
+
+    def __init__(self, interval=INTERVAL, capacity=CAPACITY, path=None, batch=BATCH):
+        if path is not None and batch > capacity:
+            raise ValueError("batch must fit in the ring")
+        self.interval = interval
+        self.capacity = capacity
+        self.path = path
+        self.batch = batch
+        self.buffer = bytearray(capacity * RECORD_SIZE)
+        self.count = 0
+        self.flushes = 0
+        self.write_errors = 0
+        self._next = 0
+        self._unflushed = 0
+        self._due_ms = None
+        self._session = None
+        # The clock as (year, month, day, hour, minute, second). Boards only have localtime(), which counts
+        # the same as time.time(); on a computer, gmtime() does.
+        clock = getattr(time, "gmtime", time.localtime)
+        self._start_time = tuple(clock()[:6])
+        self._start_ms = ticks_ms()
+
+    def sample(self):
+        """Take a sample now"""
+        import gc
+        import microcontroller
+
+        cpu = microcontroller.cpu
+        temperature = cpu.temperature
+        voltage = cpu.voltage
+        struct.pack_into(RECORD, self.buffer, self._next * RECORD_SIZE,
+                         ticks_ms(),
+                         min(cpu.frequency // 1000000, 0xFFFF),
+                         _NO_TEMPERATURE if temperature is None else int(round(temperature * 100)),
+                         _NO_VOLTAGE if voltage is None else int(round(voltage * 1000)),
+                         gc.mem_free())
+        self._next = (self._next + 1) % self.capacity
+        self.count += 1
+        self._unflushed = min(self._unflushed + 1, self.capacity)
+        if self.path is not None and self._unflushed >= self.batch:
+            self.flush()
+
+    def poll(self):
+        """Take a sample if interval seconds have passed since the last one. Returns True if it did."""
+        now = ticks_ms()
+        if self._due_ms is not None and ticks_diff(now, self._due_ms) < 0:
+            return False
+        self._due_ms = ticks_add(now, int(self.interval * 1000))
+        self.sample()
+        return True
+
+    def run(self, seconds=None):
+        """Sample every interval, for seconds, or forever if seconds is None"""
+        end = None if seconds is None else ticks_add(ticks_ms(), int(seconds * 1000))
+        while end is None or ticks_diff(ticks_ms(), end) < 0:
+            self.poll()
+            time.sleep(self.interval)
+
+    async def run_async(self, seconds=None):
+        """Like run(), as an asyncio task"""
+        import asyncio
+        end = None if seconds is None else ticks_add(ticks_ms(), int(seconds * 1000))
+        while end is None or ticks_diff(ticks_ms(), end) < 0:
+            self.poll()
+            await asyncio.sleep(self.interval)
+
+    def _session_header(self):
+        if self._session is None:
+            import board
+            import os
+            header = bytearray(struct.pack(_SESSION, MAGIC, FORMAT_VERSION, RECORD_SIZE, *self._start_time,
+                                           self._start_ms, int(self.interval * 1000)))
+            for text in (board.board_id, os.uname().release):
+                data = text.encode()[:255]
+                header.append(len(data))
+                header.extend(data)
+            self._session = header
+        return self._session
+
+    @profiled
+    def flush(self):
+        """Append the samples not yet written to the log, in one write. Returns the number written."""
+        count = self._unflushed
+        if self.path is None or count == 0:
+            return 0
+        first = (self._next - count) % self.capacity
+        view = memoryview(self.buffer)
+        try:
+            with open(self.path, "ab") as file:
+                if self.flushes == 0:
+                    file.write(self._session_header())
+                file.write(struct.pack(_BATCH, b"R", count))
+                # The unwritten samples may wrap around the end of the ring
+                end = min(first + count, self.capacity)
+                file.write(view[first * RECORD_SIZE:end * RECORD_SIZE])
+                if first + count > self.capacity:
+                    file.write(view[:(first + count - self.capacity) * RECORD_SIZE])
+        except OSError as e:
+            self.write_errors += 1
+            self.path = None
+            print("\tCouldn't write samples to the log:", e)
+            print("\tTo write to CIRCUITPY, call storage.remount('/', readonly=False) in boot.py")
+            return 0
+        self.flushes += 1
+        self._unflushed = 0
+        return count
+
+    def records(self):
+        """Yield (ticks_ms(), MHz, temperature C or None, voltage V or None, mem_free) for each sample
+        in the ring, oldest first"""
+        kept = min(self.count, self.capacity)
+        first = (self._next - kept) % self.capacity
+        for i in range(kept):
+            yield _unpack(self.buffer, ((first + i) % self.capacity) * RECORD_SIZE)
+
+    def summary(self):
+        """Return min, mean and max of each value over the ring, and how many samples were below the
+        highest CPU frequency seen, which is what throttling looks like"""
+        fields = ("mhz", "temperature", "voltage", "mem_free")
+        result = {"samples": 0, "throttled": 0}
+        lows = [None] * 4
+        highs = [None] * 4
+        totals = [0] * 4
+        counts = [0] * 4
+        frequencies = []
+        for record in self.records():
+            result["samples"] += 1
+            frequencies.append(record[1])
+            for i, value in enumerate(record[1:]):
+                if value is None:
+                    continue
+                if lows[i] is None or value < lows[i]:
+                    lows[i] = value
+                if highs[i] is None or value > highs[i]:
+                    highs[i] = value
+                totals[i] += value
+                counts[i] += 1
+        if frequencies:
+            top = max(frequencies)
+            result["throttled"] = sum(1 for mhz in frequencies if mhz < top)
+        for i, name in enumerate(fields):
+            result[name] = (lows[i], totals[i] / counts[i] if counts[i] else None, highs[i])
+        return result
+
+    @profiled
+    def report(self):
+        """Print the summary"""
+        from utils_report import writer
+        out = writer()
+        out.heading(b"system samples")
+        summary = self.summary()
+        out.key(b"Samples:")
+        out.number(summary["samples"])
+        if self.count > self.capacity:
+            out.text(b" (of ")
+            out.number(self.count)
+            out.text(b")")
+        out.newline()
+        out.line(b"\t                    min       mean        max")
+        for label, name, scale, decimals in ((b"CPU MHz", "mhz", 1, 0), (b"Temperature C", "temperature", 1, 1),
+                                             (b"Voltage V", "voltage", 1, 3), (b"Free memory KB", "mem_free", 1024, 1)):
+            out.byte(9)
+            out.text(label)
+            out.pad(17)
+            for value in summary[name]:
+                if value is None:
+                    out.text(b"          -")
+                else:
+                    out.fixed(value / scale, decimals, 11)
+            out.newline()
+        if summary["throttled"]:
+            out.key(b"Below top speed:")
+            out.number(summary["throttled"])
+            out.line(b" samples")
+        if self.path is not None or self.flushes or self.write_errors:
+            out.key(b"Log writes:")
+            out.number(self.flushes)
+            if self.write_errors:
+                out.text(b", failed")
+            out.newline()
+        out.flush()
+
+    def dump(self):
+        """Print the ring as text tools/align_log.py can read, for boards that can't write the log:
+
+            SAMPLES version year-month-day-hour-minute-second ticks_ms interval_ms board_id release
+            ticks_ms MHz hundredths_C mV mem_free      one line for each sample
+            END
+        """
+        from utils_report import writer
+        out = writer()
+        header = self._session_header()
+        out.text(b"SAMPLES ")
+        out.number(FORMAT_VERSION)
+        out.byte(32)
+        for i, value in enumerate(self._start_time):
+            if i:
+                out.byte(45)
+            out.number(value)
+        out.byte(32)
+        for value in (self._start_ms, int(self.interval * 1000)):
+            out.number(value)
+            out.byte(32)
+        pos = struct.calcsize(_SESSION)
+        for _ in range(2):
+            length = header[pos]
+            out.text(bytes(header[pos + 1:pos + 1 + length]))
+            out.byte(32)
+            pos += 1 + length
+        out.newline()
+        kept = min(self.count, self.capacity)
+        first = (self._next - kept) % self.capacity
+        for i in range(kept):
+            values = struct.unpack_from(RECORD, self.buffer, ((first + i) % self.capacity) * RECORD_SIZE)
+            for j, value in enumerate(values):
+                if j:
+                    out.byte(32)
+                out.number(value)
+            out.newline()
+        out.line(b"END")
+        out.flush()
+
+
+def _unpack(data, pos):
+    ms, mhz, temperature, voltage, mem_free = struct.unpack_from(RECORD, data, pos)
+    return (ms, mhz, None if temperature == _NO_TEMPERATURE else temperature / 100,
+            None if voltage == _NO_VOLTAGE else voltage / 1000, mem_free)
+
+
+def decode(data):
+    """Decode a log written by flush(). Returns a list of sessions, each a dict with "time", the clock's
+    (year, month, day, hour, minute, second), "monotonic_ms", the ticks_ms() read with it, "interval_ms",
+    "board_id", "release" and "records", a list of tuples like records()."""
+    sessions = []
+    session = None
+    pos = 0
+    session_size = struct.calcsize(_SESSION)
+    batch_size = struct.calcsize(_BATCH)
+    while pos < len(data):
+        if data[pos:pos + 3] == MAGIC:
+            # Checked first, since older sessions have a different layout
+            version = data[pos + 3]
+            if version != FORMAT_VERSION or data[pos + 4] != RECORD_SIZE:
+                raise ValueError("unsupported sample log version %d" % version)
+            fields = struct.unpack_from(_SESSION, data, pos)
+            start_time = fields[3:9]
+            start_ms, interval_ms = fields[9], fields[10]
+            pos += session_size
+            text = []
+            for _ in range(2):
+                length = data[pos]
+                text.append(bytes(data[pos + 1:pos + 1 + length]).decode())
+                pos += 1 + length
+            session = {"time": start_time, "monotonic_ms": start_ms, "interval_ms": interval_ms,
+                       "board_id": text[0], "release": text[1], "records": []}
+            sessions.append(session)
+        elif data[pos:pos + 1] == b"R" and session is not None:
+            count = struct.unpack_from(_BATCH, data, pos)[1]
+            pos += batch_size
+            if pos + count * RECORD_SIZE > len(data):
+                # The board was reset partway through a write
+                break
+            for i in range(count):
+                session["records"].append(_unpack(data, pos + i * RECORD_SIZE))
+            pos += count * RECORD_SIZE
+        else:
+            raise ValueError("not a sample log, at byte %d" % pos)
+    return sessions
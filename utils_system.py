@@ -5,95 +5,235 @@
 
 """ Helper functions for learning about your boards """
 
-def get_os_info():
-    """Show os module info. Includes CircuitPython version and filesystem info.
-    Show details about storage and memory"""
+from utils_profile import profiler
+
+profiled = profiler(__name__)
+
+
+class BoardSnapshot:
+    """Everything the get_*_info() functions report, gathered in one pass.
+    Memory, storage and CPU readings are as of the moment the snapshot was taken, or the last
+    get_*_info() call, which reads them again. Call refresh() for new ones."""
+
+    __slots__ = (
+        # os.uname()
+        "machine", "sysname", "release", "version",
+        # gc, in bytes
+        "mem_free", "mem_alloc",
+        # os.statvfs('/')
+        "statvfs",
+        # board
+        "board_id", "board_pins",
+        # microcontroller
+        "nvm_size", "cpu_frequency", "cpu_temperature", "cpu_voltage", "microcontroller_pins",
+        # utils_display.collect_display_info(), or None if there's no built-in display
+        "display",
+    )
+
+    def as_dict(self):
+        """Return the snapshot as a plain dict"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# Cached result of collect_snapshot()
+_snapshot = None
+
+
+@profiled
+def collect_snapshot():
+    """Gather os, memory, storage, board, microcontroller and display details in one pass.
+    The snapshot is cached for the session. Use refresh() to collect it again."""
+
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = _collect()
+    return _snapshot
+
+
+@profiled
+def refresh():
+    """Throw away the cached snapshot and collect a new one"""
+
+    global _snapshot
+    _snapshot = _collect()
+    return _snapshot
+
+
+def reset():
+    """Throw away the cached snapshot without collecting a new one. The next collect_snapshot() does that."""
+
+    global _snapshot
+    _snapshot = None
+
+
+def update_display(**fields):
+    """Change the cached snapshot's display details, like update_display(rotation=90), after changing
+    the display. Does nothing until there's a snapshot with a display, since that reads them fresh."""
+
+    if _snapshot is not None and _snapshot.display is not None:
+        _snapshot.display.update(fields)
+
+
+def _collect():
+    import os
+    import board
+    import microcontroller
+    import utils_cache
+    import utils_display
+
+    snapshot = BoardSnapshot()
+
+    uname = os.uname()
+    snapshot.machine = uname.machine
+    snapshot.sysname = uname.sysname
+    snapshot.release = uname.release
+    snapshot.version = uname.version
+
+    snapshot.board_id = board.board_id
+    # The pin names only change with the firmware, so they're kept from boot to boot
+    pins = utils_cache.get("board_pins")
+    if pins is None:
+        pins = dir(board)
+        pins.sort()
+        utils_cache.put("board_pins", pins)
+    snapshot.board_pins = tuple(pins)
 
-    print("\n=== os module info ===\n")
+    snapshot.nvm_size = len(microcontroller.nvm) if microcontroller.nvm is not None else 0
+    pins = utils_cache.get("microcontroller_pins")
+    if pins is None:
+        pins = dir(microcontroller.pin)
+        utils_cache.put("microcontroller_pins", pins)
+    snapshot.microcontroller_pins = tuple(pins)
 
+    snapshot.display = utils_display.collect_display_info()
+
+    _read_live(snapshot)
+    return snapshot
+
+
+def _read_live(snapshot):
+    """Read the fields that change while the board runs: memory, storage and the CPU's readings"""
     import os
     import gc
+    import microcontroller
+
+    snapshot.mem_free = gc.mem_free()
+    snapshot.mem_alloc = gc.mem_alloc()
+    snapshot.statvfs = tuple(os.statvfs('/'))
+    cpu = microcontroller.cpu
+    snapshot.cpu_frequency = cpu.frequency
+    snapshot.cpu_temperature = cpu.temperature
+    snapshot.cpu_voltage = cpu.voltage
+
 
-    boardNameOS = os.uname().machine
-    print("Board name:\t", boardNameOS)
+def _live_snapshot():
+    """The cached snapshot, with its changing fields read again, for the printers"""
+    snapshot = collect_snapshot()
+    _read_live(snapshot)
+    return snapshot
 
-    print("System name (CPU):\t", os.uname().sysname)
-    print("CircuitPython ver:\t", os.uname().release)
-    print("Version:\t\t", os.uname().version)
 
-    free_memory = gc.mem_free() / 1024
-    allocated_memory = gc.mem_alloc() / 1024
-    total_memory = allocated_memory + free_memory
+@profiled
+def get_os_info():
+    """Show os module info. Includes CircuitPython version and filesystem info.
+    Show details about storage and memory"""
+
+    from utils_report import writer
+    out = writer()
+    out.heading(b"os module info")
+
+    snapshot = _live_snapshot()
+
+    out.row(b"Board name:", snapshot.machine)
+    out.row(b"System name (CPU):", snapshot.sysname)
+    out.row(b"CircuitPython ver:", snapshot.release)
+    out.row(b"Version:", snapshot.version)
 
-    print("Free memory:\t", free_memory, "KB")
-    print("Total memory:\t", total_memory, "KB")
+    out.key(b"Free memory:")
+    out.kilobytes(snapshot.mem_free)
+    out.newline()
+    out.key(b"Total memory:")
+    out.kilobytes(snapshot.mem_alloc + snapshot.mem_free)
+    out.newline()
 
-    fs_stat = os.statvfs('/')
+    fs_stat = snapshot.statvfs
 
-    print("Disk size:\t", fs_stat[0] * fs_stat[2] / 1024, "KB")
-    print("Disk free space:\t", fs_stat[0] * fs_stat[3] / 1024, "KB")
+    out.key(b"Disk size:")
+    out.kilobytes(fs_stat[0] * fs_stat[2])
+    out.newline()
+    out.key(b"Disk free space:")
+    out.kilobytes(fs_stat[0] * fs_stat[3])
+    out.newline()
 
     # statvfs
-    print("statvfs /")
-    print("\t", fs_stat)
+    out.line(b"statvfs /")
+    out.text(b"\t(")
+    for i in range(len(fs_stat)):
+        if i:
+            out.text(b", ")
+        out.number(fs_stat[i])
+    out.line(b")")
+    out.flush()
 
 
+@profiled
 def get_board_info():
     """Show board module info. Mostly shows pin names.
     For more help with your board's pins, see utils_pins.py """
 
-    print("\n=== board module info ===\n")
+    from utils_report import writer
+    out = writer()
+    out.heading(b"board module info")
 
-    import board
-
-    boardNameBoard = board.board_id
-
-    print("Board name:\t", board.board_id)
-    print("Board pins:")
+    snapshot = collect_snapshot()
 
-    pins = dir(board)
-    pins.sort()
+    out.row(b"Board name:", snapshot.board_id)
+    out.line(b"Board pins:")
 
-    for item in pins:
-
-        print("\t" + item)
+    for item in snapshot.board_pins:
+        out.byte(9)
+        out.line(item)
+    out.flush()
 
 
+@profiled
 def get_microcontroller_info():
     """Show microcontroller/CPU details"""
 
-    print("\n=== microcontroller info ===\n")
+    from utils_report import writer
+    out = writer()
+    out.heading(b"microcontroller info")
 
-    import os
-    import microcontroller
+    snapshot = _live_snapshot()
 
-    cpu_type_descriptor = "CPU:"
-    cpu_type = os.uname().sysname
-    print("CPU:\t\t", cpu_type)
+    out.row(b"CPU:", snapshot.sysname)
 
-    nvm_bytes = len(microcontroller.nvm) / 1024
-    nvm_bytes_formatted = str(nvm_bytes) + " KB"
-    print("NVM:\t\t", nvm_bytes_formatted)
+    out.key(b"NVM:")
+    out.kilobytes(snapshot.nvm_size)
+    out.newline()
 
-    cpu_frequency_unformatted = microcontroller.cpu.frequency / 1000000
-    cpu_frequency =  f"{cpu_frequency_unformatted:,}" + " MHz"
-    print("CPU 0 frequency:\t", cpu_frequency)
+    out.key(b"CPU 0 frequency:")
+    out.number(snapshot.cpu_frequency // 1000000)
+    out.line(b" MHz")
 
-    cpu_temperature = microcontroller.cpu.temperature
-    if cpu_temperature == None:
-        cpu_temperature = "Not available"
-    print("CPU 0 temperature:\t", cpu_temperature)
+    cpu_temperature = snapshot.cpu_temperature
+    if cpu_temperature is None:
+        cpu_temperature = b"Not available"
+    out.row(b"CPU 0 temperature:", cpu_temperature)
 
-    cpu_voltage = microcontroller.cpu.voltage
-    if cpu_voltage == None:
-        cpu_voltage = "Not available"
-    print("CPU 0 voltage:\t", cpu_voltage)
+    cpu_voltage = snapshot.cpu_voltage
+    if cpu_voltage is None:
+        cpu_voltage = b"Not available"
+    out.row(b"CPU 0 voltage:", cpu_voltage)
 
-    print("Microcontroller pins:")
-    for pin in dir(microcontroller.pin):
-        print("\t" + pin)
+    out.line(b"Microcontroller pins:")
+    for pin in snapshot.microcontroller_pins:
+        out.byte(9)
+        out.line(pin)
+    out.flush()
 
 
+@profiled
 def get_builtin_modules():
     """List all this board's built-in CircuitPython modules.
     The output from the help command can't be formatted, so it's a little tough to read."""
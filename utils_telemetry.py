@@ -0,0 +1,334 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Compact binary encoding of board details, for sending over USB serial or UART.
+Encodes data from utils_system.collect_snapshot(), utils_pins.build_pin_map() and I2C scans.
+The same module decodes it, on the board or on your computer with regular Python. """
+
+import struct
+from utils_profile import profiler
+
+profiled = profiler(__name__)
+
+# Every payload starts with MAGIC and FORMAT_VERSION.
+# Bump FORMAT_VERSION whenever the layout below changes.
+MAGIC = b"CPT"
+FORMAT_VERSION = 1
+
+# Section flags, stored in the header byte after the version
+SECTION_SNAPSHOT = 0x01
+SECTION_PIN_MAP = 0x02
+SECTION_I2C = 0x04
+
+# Layout, all little-endian:
+#   header:     "CPT", version u8, sections u8
+#   strings:    count u16, then for each string: shared u8, length u8, UTF-8 bytes
+#               The table is sorted, and each string only stores what's left after the
+#               "shared" bytes it has in common with the one before (GPIO1, GPIO10 -> "0").
+#               Everything else refers to strings by their index in this table, so a pin name
+#               that shows up in several places is only stored once. Refs are u8 when the
+#               table has 256 strings or fewer, and u16 otherwise.
+#   snapshot:   machine, sysname, release, version, board_id (string refs)
+#               mem_free, mem_alloc, statvfs bsize, blocks, bfree, nvm_size, cpu_frequency (u32)
+#               cpu_temperature (i16, hundredths of a degree C), cpu_voltage (u16, mV)
+#               board_pins, microcontroller_pins (count u16 + string refs)
+#               display present (u8), then width, height, rotation (u16),
+#               auto_refresh (u8), brightness (u16, thousandths), bus (string ref)
+#   pin map:    count u16, then gpio name ref, alias count u8, alias refs
+#   i2c:        bus count u8, then bus name ref, address count u8, addresses u8
+_HEADER = "<3sBB"
+_SNAPSHOT_NUMBERS = "<7IhH"
+_DISPLAY = "<3HBH"
+
+# Stand-ins for values that are None
+_NO_TEMPERATURE = -0x8000
+_NO_VOLTAGE = 0xFFFF
+_NO_BRIGHTNESS = 0xFFFF
+_NO_AUTO_REFRESH = 2
+
+_sizes = {}
+
+
+def _size(fmt):
+    size = _sizes.get(fmt)
+    if size is None:
+        size = _sizes[fmt] = struct.calcsize(fmt)
+    return size
+
+
+class _Writer:
+    """Packs values into buf. With buf set to None, it only counts bytes, which is how encode() sizes its buffer."""
+
+    def __init__(self, buf, strings):
+        self.buf = buf
+        self.pos = 0
+        self.strings = strings
+        self.ref = _ref_format(len(strings))
+
+    def put(self, fmt, *values):
+        if self.buf is not None:
+            struct.pack_into(fmt, self.buf, self.pos, *values)
+        self.pos += _size(fmt)
+
+    def put_bytes(self, data):
+        end = self.pos + len(data)
+        if self.buf is not None:
+            self.buf[self.pos:end] = data
+        self.pos = end
+
+    def put_ref(self, name):
+        self.put(self.ref, self.strings[name])
+
+    def put_refs(self, names):
+        self.put("<H", len(names))
+        for name in names:
+            self.put(self.ref, self.strings[name])
+
+
+def _ref_format(count):
+    return "<B" if count <= 256 else "<H"
+
+
+def _string_table(snapshot, pin_map, i2c):
+    strings = {}
+    order = []
+
+    def _intern(name):
+        if name not in strings:
+            strings[name] = None
+            order.append(name)
+
+    if snapshot is not None:
+        for name in (snapshot.machine, snapshot.sysname, snapshot.release, snapshot.version, snapshot.board_id):
+            _intern(name)
+        for name in snapshot.board_pins:
+            _intern(name)
+        for name in snapshot.microcontroller_pins:
+            _intern(name)
+        if snapshot.display is not None:
+            _intern(snapshot.display["bus"])
+    if pin_map is not None:
+        for gpio_names, aliases in pin_map.values():
+            for gpio_name in gpio_names:
+                _intern(gpio_name)
+            for alias in aliases:
+                _intern(alias)
+    if i2c is not None:
+        for bus_name in i2c:
+            _intern(bus_name)
+
+    order.sort()
+    for index, name in enumerate(order):
+        strings[name] = index
+    return strings, order
+
+
+def _write(writer, order, snapshot, pin_map, i2c):
+    sections = 0
+    if snapshot is not None:
+        sections |= SECTION_SNAPSHOT
+    if pin_map is not None:
+        sections |= SECTION_PIN_MAP
+    if i2c is not None:
+        sections |= SECTION_I2C
+    writer.put(_HEADER, MAGIC, FORMAT_VERSION, sections)
+
+    writer.put("<H", len(order))
+    previous = b""
+    for name in order:
+        data = name.encode()
+        if len(data) > 255:
+            raise ValueError("string too long to encode: " + name[:20])
+        shared = 0
+        limit = min(len(data), len(previous))
+        while shared < limit and data[shared] == previous[shared]:
+            shared += 1
+        writer.put("<BB", shared, len(data) - shared)
+        writer.put_bytes(data[shared:])
+        previous = data
+
+    if snapshot is not None:
+        for name in (snapshot.machine, snapshot.sysname, snapshot.release, snapshot.version, snapshot.board_id):
+            writer.put_ref(name)
+        temperature = snapshot.cpu_temperature
+        voltage = snapshot.cpu_voltage
+        statvfs = snapshot.statvfs
+        writer.put(
+            _SNAPSHOT_NUMBERS,
+            snapshot.mem_free,
+            snapshot.mem_alloc,
+            statvfs[0],
+            statvfs[2],
+            statvfs[3],
+            snapshot.nvm_size,
+            snapshot.cpu_frequency,
+            _NO_TEMPERATURE if temperature is None else int(round(temperature * 100)),
+            _NO_VOLTAGE if voltage is None else int(round(voltage * 1000)),
+        )
+        writer.put_refs(snapshot.board_pins)
+        writer.put_refs(snapshot.microcontroller_pins)
+
+        display = snapshot.display
+        if display is None:
+            writer.put("<B", 0)
+        else:
+            writer.put("<B", 1)
+            auto_refresh = display["auto_refresh"]
+            brightness = display["brightness"]
+            writer.put(
+                _DISPLAY,
+                display["width"],
+                display["height"],
+                display["rotation"],
+                _NO_AUTO_REFRESH if auto_refresh is None else int(auto_refresh),
+                _NO_BRIGHTNESS if brightness is None else int(round(brightness * 1000)),
+            )
+            writer.put_ref(display["bus"])
+
+    if pin_map is not None:
+        # One entry per GPIO name, so a Pin with two names is sent twice, with the same aliases
+        writer.put("<H", sum(len(gpio_names) for gpio_names, _ in pin_map.values()))
+        for gpio_names, aliases in pin_map.values():
+            for gpio_name in gpio_names:
+                writer.put_ref(gpio_name)
+                writer.put("<B", len(aliases))
+                for alias in aliases:
+                    writer.put_ref(alias)
+
+    if i2c is not None:
+        writer.put("<B", len(i2c))
+        for bus_name, addresses in i2c.items():
+            writer.put_ref(bus_name)
+            writer.put("<B", len(addresses))
+            writer.put_bytes(bytes(addresses))
+
+
+@profiled
+def encode_into(buf, snapshot=None, pin_map=None, i2c=None):
+    """Encode into an existing bytearray or memoryview, starting at offset 0.
+    snapshot is a utils_system.BoardSnapshot, pin_map is the dict from utils_pins.build_pin_map(),
+    and i2c is a dict of bus name -> list of addresses. Leave out any you don't need.
+    Returns the number of bytes written. Raises ValueError if buf is too small."""
+
+    strings, order = _string_table(snapshot, pin_map, i2c)
+    size = _Writer(None, strings)
+    _write(size, order, snapshot, pin_map, i2c)
+    if size.pos > len(buf):
+        raise ValueError("buffer too small, need %d bytes" % size.pos)
+    _write(_Writer(buf, strings), order, snapshot, pin_map, i2c)
+    return size.pos
+
+
+@profiled
+def encode(snapshot=None, pin_map=None, i2c=None):
+    """Encode into a new bytearray of exactly the right size. See encode_into()."""
+
+    strings, order = _string_table(snapshot, pin_map, i2c)
+    size = _Writer(None, strings)
+    _write(size, order, snapshot, pin_map, i2c)
+    buf = bytearray(size.pos)
+    _write(_Writer(buf, strings), order, snapshot, pin_map, i2c)
+    return buf
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def get(self, fmt):
+        values = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += _size(fmt)
+        return values
+
+    def get_one(self, fmt):
+        return self.get(fmt)[0]
+
+    def get_bytes(self, length):
+        end = self.pos + length
+        data = bytes(self.data[self.pos:end])
+        self.pos = end
+        return data
+
+
+def decode(data):
+    """Decode a payload from encode().
+    Returns a dict with "version", and whichever of "snapshot", "pin_map" and "i2c" were encoded.
+    "snapshot" is a dict with the same keys as utils_system.BoardSnapshot,
+    "pin_map" maps GPIO names to lists of board aliases, and "i2c" maps bus names to address lists."""
+
+    reader = _Reader(data)
+    magic, version, sections = reader.get(_HEADER)
+    if magic != MAGIC:
+        raise ValueError("not a telemetry payload")
+    if version != FORMAT_VERSION:
+        raise ValueError("unsupported telemetry version %d" % version)
+
+    strings = []
+    previous = b""
+    for _ in range(reader.get_one("<H")):
+        shared, length = reader.get("<BB")
+        previous = previous[:shared] + reader.get_bytes(length)
+        strings.append(previous.decode())
+
+    ref = _ref_format(len(strings))
+
+    def string():
+        return strings[reader.get_one(ref)]
+
+    def refs():
+        count = reader.get_one("<H")
+        return tuple(string() for _ in range(count))
+
+    result = {"version": version}
+
+    if sections & SECTION_SNAPSHOT:
+        machine, sysname, release, os_version, board_id = (string() for _ in range(5))
+        (mem_free, mem_alloc, bsize, blocks, bfree, nvm_size, cpu_frequency,
+         temperature, voltage) = reader.get(_SNAPSHOT_NUMBERS)
+        snapshot = {
+            "machine": machine,
+            "sysname": sysname,
+            "release": release,
+            "version": os_version,
+            "mem_free": mem_free,
+            "mem_alloc": mem_alloc,
+            # Only the fields the reports use are encoded
+            "statvfs": (bsize, None, blocks, bfree),
+            "board_id": board_id,
+            "board_pins": refs(),
+            "nvm_size": nvm_size,
+            "cpu_frequency": cpu_frequency,
+            "cpu_temperature": None if temperature == _NO_TEMPERATURE else temperature / 100,
+            "cpu_voltage": None if voltage == _NO_VOLTAGE else voltage / 1000,
+        }
+        snapshot["microcontroller_pins"] = refs()
+        if reader.get_one("<B"):
+            width, height, rotation, auto_refresh, brightness = reader.get(_DISPLAY)
+            snapshot["display"] = {
+                "width": width,
+                "height": height,
+                "rotation": rotation,
+                "bus": string(),
+                "auto_refresh": None if auto_refresh == _NO_AUTO_REFRESH else bool(auto_refresh),
+                "brightness": None if brightness == _NO_BRIGHTNESS else brightness / 1000,
+            }
+        else:
+            snapshot["display"] = None
+        result["snapshot"] = snapshot
+
+    if sections & SECTION_PIN_MAP:
+        pin_map = {}
+        for _ in range(reader.get_one("<H")):
+            gpio_name = string()
+            pin_map[gpio_name] = [string() for _ in range(reader.get_one("<B"))]
+        result["pin_map"] = pin_map
+
+    if sections & SECTION_I2C:
+        i2c = {}
+        for _ in range(reader.get_one("<B")):
+            bus_name = string()
+            i2c[bus_name] = list(reader.get_bytes(reader.get_one("<B")))
+        result["i2c"] = i2c
+
+    return result
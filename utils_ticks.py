@@ -0,0 +1,66 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Timestamps that never need a long integer, for timing things on every board.
+
+Boards built without long integers, like the SAMD21 ones, can't hold time.monotonic_ns(), or
+the time since boot in microseconds for more than a few minutes. These ticks count up to
+TICKS_PERIOD and start again from 0, like supervisor.ticks_ms(), so they and the differences
+between them are always small ints:
+
+    from utils_ticks import ticks_us, ticks_diff
+    start = ticks_us()
+    ...
+    elapsed_us = ticks_diff(ticks_us(), start)
+
+ticks_us() wraps about every 9 minutes, so it can time things up to about 4 and a half minutes long.
+ticks_ms() wraps about every 6 days. Boards without time.monotonic_ns() only get millisecond
+resolution from ticks_us(). """
+
+import time
+
+# Ticks count from 0 to TICKS_MAX, then start again
+TICKS_PERIOD = 1 << 29
+TICKS_MAX = TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+try:
+    _monotonic_ns = time.monotonic_ns
+except AttributeError:
+    _monotonic_ns = None
+
+try:
+    # Wraps at TICKS_PERIOD too
+    from supervisor import ticks_ms
+except ImportError:
+    if _monotonic_ns is not None:
+        def ticks_ms():
+            """Milliseconds, modulo TICKS_PERIOD"""
+            return (_monotonic_ns() // 1000000) & TICKS_MAX
+    else:
+        def ticks_ms():
+            """Milliseconds, modulo TICKS_PERIOD"""
+            return int(time.monotonic() * 1000) & TICKS_MAX
+
+if _monotonic_ns is not None:
+    def ticks_us():
+        """Microseconds, modulo TICKS_PERIOD"""
+        return (_monotonic_ns() // 1000) & TICKS_MAX
+else:
+    def ticks_us():
+        """Microseconds, modulo TICKS_PERIOD, counted in whole milliseconds"""
+        ms = ticks_ms()
+        # ms * 1000 modulo TICKS_PERIOD, in two parts so neither product needs a long integer
+        high = (((ms >> 15) * 1000) & 0x3FFF) << 15
+        return (high + (ms & 0x7FFF) * 1000) & TICKS_MAX
+
+
+def ticks_diff(end, start):
+    """end - start, for two ticks from the same function, allowing for wraparound.
+    Right as long as they're less than half of TICKS_PERIOD apart."""
+    return ((end - start + _TICKS_HALFPERIOD) & TICKS_MAX) - _TICKS_HALFPERIOD
+
+
+def ticks_add(ticks, delta):
+    """The ticks delta after ticks, for deadlines"""
+    return (ticks + delta) & TICKS_MAX
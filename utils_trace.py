@@ -0,0 +1,214 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Timing traces for the utils_* functions: where the time goes inside an I2C scan, a wifi connect,
+an HTTP request or a display refresh.
+
+The slow parts of utils_i2c, utils_pins, utils_wifi and utils_display record named spans and counters
+while tracing is on. Turn it on, call the functions, then look at the trace:
+
+    import utils_trace, utils_i2c
+    utils_trace.start()
+    utils_i2c.discover()
+    utils_trace.report()        # totals for each name
+    utils_trace.dump()          # the whole timeline, for tools/trace_summary.py on your computer
+
+Records go in a ring of CAPACITY entries, allocated once by start(), so tracing doesn't allocate as it
+goes and long runs keep the newest records. When tracing is off, each span costs one branch.
+
+To trace your own code:
+
+    trace = utils_trace.begin() if utils_trace.ENABLED else 0
+    ...
+    if trace:
+        utils_trace.end("my_code", trace)
+
+Times are utils_ticks.ticks_us(), so they're small ints on every board. They wrap about every 9 minutes,
+which tools/trace_summary.py allows for, as long as something is recorded at least every 4 minutes or so.
+"""
+
+from utils_ticks import TICKS_MAX, ticks_diff, ticks_us
+
+# True while tracing. Set it with start() and stop(), or directly.
+ENABLED = False
+
+# Records the ring holds, unless start() is given another size
+CAPACITY = 256
+
+# Version of dump()'s format. tools/trace_summary.py checks it.
+FORMAT_VERSION = 2
+
+# Set in a record's name index for counters
+_COUNTER = 0x8000
+
+# Names, in the order they were first recorded, and their indexes
+_names = []
+_name_index = {}
+
+# The ring: name index, microseconds since start() when the span began or the counter changed, modulo
+# TICKS_PERIOD, and the span's length in microseconds or the counter's increase, up to TICKS_MAX
+_name_ids = None
+_starts = None
+_values = None
+# Where the next record goes, and how many have been recorded since start()
+_next = 0
+_recorded = 0
+# Microseconds, from begin(), when start() ran
+_epoch = 0
+
+
+def begin():
+    """Microsecond ticks to pass to end(), never 0"""
+    return ticks_us() + 1
+
+
+def start(capacity=CAPACITY):
+    """Forget what was recorded, and start tracing into a ring of capacity records"""
+    global ENABLED, _name_ids, _starts, _values, _next, _recorded, _epoch
+    from array import array
+
+    if _name_ids is None or len(_name_ids) != capacity:
+        _name_ids = array("H", bytes(2 * capacity))
+        _starts = array("I", bytes(4 * capacity))
+        _values = array("I", bytes(4 * capacity))
+    _names.clear()
+    _name_index.clear()
+    _next = 0
+    _recorded = 0
+    _epoch = begin()
+    ENABLED = True
+
+
+def stop():
+    """Stop tracing, keeping what was recorded"""
+    global ENABLED
+    ENABLED = False
+
+
+def _record(name, flags, when, value):
+    global _next, _recorded
+    if _name_ids is None:
+        # ENABLED was set directly, without start()
+        start()
+    index = _name_index.get(name)
+    if index is None:
+        index = _name_index[name] = len(_names)
+        _names.append(name)
+    slot = _next
+    _name_ids[slot] = index | flags
+    _starts[slot] = (when - _epoch) & TICKS_MAX
+    _values[slot] = max(0, min(value, TICKS_MAX))
+    _next = slot + 1 if slot + 1 < len(_name_ids) else 0
+    _recorded += 1
+
+
+def end(name, started):
+    """Record a span called name, from started, what begin() returned, until now"""
+    _record(name, 0, started, ticks_diff(begin(), started))
+
+
+def count(name, value=1):
+    """Record that counter name went up by value, like bytes sent or retries"""
+    _record(name, _COUNTER, begin(), value)
+
+
+def records():
+    """Yield (name, is_counter, start us, value) for each record still in the ring, oldest first"""
+    if _name_ids is None:
+        return
+    capacity = len(_name_ids)
+    kept = min(_recorded, capacity)
+    first = _next - kept if _recorded <= capacity else _next
+    for i in range(kept):
+        slot = (first + i) % capacity
+        index = _name_ids[slot]
+        yield _names[index & ~_COUNTER], bool(index & _COUNTER), _starts[slot], _values[slot]
+
+
+def dropped():
+    """How many of the oldest records the ring has overwritten"""
+    if _name_ids is None:
+        return 0
+    return max(0, _recorded - len(_name_ids))
+
+
+def dump():
+    """Print the trace as a timeline tools/trace_summary.py can read:
+
+        TRACE version capacity recorded dropped
+        N index name                    once for each name
+        S index start_us duration_us    a span
+        C index time_us increase        a counter
+        END
+    """
+    from utils_report import writer
+    out = writer()
+    out.text(b"TRACE ")
+    out.number(FORMAT_VERSION)
+    out.byte(32)
+    out.number(0 if _name_ids is None else len(_name_ids))
+    out.byte(32)
+    out.number(_recorded)
+    out.byte(32)
+    out.number(dropped())
+    out.newline()
+    for index, name in enumerate(_names):
+        out.text(b"N ")
+        out.number(index)
+        out.byte(32)
+        out.line(name)
+    for name, is_counter, started, value in records():
+        out.text(b"C " if is_counter else b"S ")
+        out.number(_name_index[name])
+        out.byte(32)
+        out.number(started)
+        out.byte(32)
+        out.number(value)
+        out.newline()
+    out.line(b"END")
+    out.flush()
+
+
+def summary():
+    """Return a dict of name -> [calls, total, max] from the records still in the ring.
+    For spans, total and max are microseconds. For counters, they're the increases."""
+    totals = {}
+    for name, _, _, value in records():
+        entry = totals.get(name)
+        if entry is None:
+            totals[name] = [1, value, value]
+        else:
+            entry[0] += 1
+            entry[1] += value
+            if value > entry[2]:
+                entry[2] = value
+    return totals
+
+
+def report():
+    """Print totals for each name, spans first, slowest first"""
+    from utils_report import writer
+    out = writer()
+    out.heading(b"trace")
+    if dropped():
+        out.text(b"Oldest ")
+        out.number(dropped())
+        out.line(b" records were overwritten. start() with a bigger capacity to keep them.")
+    totals = summary()
+    counters = set(name for name, is_counter, _, _ in records() if is_counter)
+    out.line(b"\tname                      calls   total ms    mean ms     max ms")
+    for name in sorted(totals, key=lambda name: (name in counters, -totals[name][1])):
+        calls, total, most = totals[name]
+        out.byte(9)
+        out.text(name)
+        out.pad(27)
+        out.number(calls, 5)
+        if name in counters:
+            out.text(b"   total ")
+            out.number(total)
+        else:
+            out.fixed(total / 1000, 2, 11)
+            out.fixed(total / calls / 1000, 2, 11)
+            out.fixed(most / 1000, 2, 11)
+        out.newline()
+    out.flush()
@@ -4,26 +4,46 @@
 # And by Adafruit/Kattni Rembor's CircuitPython Essentials: https://learn.adafruit.com/circuitpython-essentials/circuitpython-essentials
 # MIT license
 
+# wifi, ipaddress and the HTTP libraries are imported inside the functions that use them,
+# so importing this module costs almost nothing until you actually use the network.
 import os
-import wifi
-import ipaddress
+
+import utils_trace
+from utils_profile import profiler
+from utils_ticks import ticks_add, ticks_diff, ticks_ms, ticks_us
+
+profiled = profiler(__name__)
 
 # For readability, some function calls below start by printing this string
 # Data printed inside each function indented with \t for readability
 CPUTILS_STRING = 'CP UTILS:'
-PING_IP = ipaddress.IPv4Address("8.8.8.8")
+PING_IP = "8.8.8.8"
 # This shuould be a small file, since boards have very little RAM.
 FILE_DOWNLOAD_URL = "http://wifitest.adafruit.com/testwifi/index.html"
+# Seconds for ping and HTTP requests
+PING_TIMEOUT = 1.0
+# What test_wifi() measures latency to, and how many times. See utils_wifi_probe for the kinds of target.
+PROBE_TARGETS = ("gateway", PING_IP)
+PROBE_ROUNDS = 10
+HTTP_TIMEOUT = 15
+# Bytes read at a time. The async functions give other tasks a turn after each chunk.
+CHUNK_SIZE = 1024
 
 
 # Connect to Wifi
 # If user doesn't specify SSID and password, it's taken from settings.toml
-def connect_wifi(
-        ssid=os.getenv("CIRCUITPY_WIFI_SSID"),
-        password=os.getenv("CIRCUITPY_WIFI_PASSWORD")
-    ):
+# when the function is called, so changes to settings.toml are picked up after a reload
+@profiled
+def connect_wifi(ssid=None, password=None):
     print(CPUTILS_STRING, "Connecting to WiFi...")
 
+    import wifi
+
+    if ssid is None:
+        ssid = os.getenv("CIRCUITPY_WIFI_SSID")
+    if password is None:
+        password = os.getenv("CIRCUITPY_WIFI_PASSWORD")
+
     # If user doesn't specify ssid/pwd in the function call,
     # they should specify it in settings.toml
     if ssid is None or len(ssid) == 0:
@@ -37,7 +57,10 @@ def connect_wifi(
     try:
         print("\tSSID:", ssid)
         print("\tpassword:", password)
+        trace = utils_trace.begin() if utils_trace.ENABLED else 0
         wifi.radio.connect(ssid, password)
+        if trace:
+            utils_trace.end("wifi.connect", trace)
         print("\tSuccessfully connected")
     except Exception as e:
         print("\tFailed to connect:", e)
@@ -48,24 +71,41 @@ def connect_wifi(
 # Sort by RSSI (signal strength)
 # Then, print each found SSID and RSSI
 # Finally, return an array of SSIDs and RSSIs
+@profiled
 def scan_wifi_networks():
     print(CPUTILS_STRING, "Scanning for WiFi networks...")
 
+    import wifi
+
     networks = []
+    trace = utils_trace.begin() if utils_trace.ENABLED else 0
     for network in wifi.radio.start_scanning_networks():
         networks.append(network)
     wifi.radio.stop_scanning_networks()
+    if trace:
+        utils_trace.end("wifi.scan", trace)
     networks = sorted(networks, key=lambda net: net.rssi, reverse=True)
+
+    from utils_report import writer
+    out = writer()
     for network in networks:
-        print("\t", network.ssid, "\t\trssi:", network.rssi, "dBm")
+        out.text(b"\t ")
+        out.text(network.ssid)
+        out.text(b" \t\trssi: ")
+        out.number(network.rssi)
+        out.line(b" dBm")
+    out.flush()
     return networks
 
 
 # Print info about current WiFi network connection to the REPL.
 # Then, try a few network operations to verify it's working reliably.
-def test_wifi():
+@profiled
+def test_wifi(targets=PROBE_TARGETS, rounds=PROBE_ROUNDS):
     print(CPUTILS_STRING, "Testing Wifi connection...")
 
+    import wifi
+
     # Don't bother with tests if not connected to Wifi
     if not wifi.radio.enabled:
         print("\tWifi radio disabled")
@@ -75,38 +115,22 @@ def test_wifi():
         return
 
     # First, print details about the radio and connection
-    print("\tIP:", wifi.radio.ipv4_address)
-    mac_address_raw = wifi.radio.mac_address
-    mac_formatted = '-'.join(['{:02X}'.format(byte) for byte in mac_address_raw])
-    print("\tMAC address:", mac_formatted)
-    print("\tDNS server:", wifi.radio.ipv4_dns)
-    print("\tGateway:", wifi.radio.ipv4_gateway)
-    print("\tSubnet:", wifi.radio.ipv4_subnet)
-    print("\tAP Authmode:", wifi.radio.ap_info.authmode)
-    print("\tAP SSID:", wifi.radio.ap_info.ssid)
-    bssid_raw = wifi.radio.ap_info.bssid
-    bssid_formatted = '-'.join(['{:02X}'.format(byte) for byte in bssid_raw])
-    print("\tAP BSSID:", bssid_formatted)
-    print("\tAP Channel:", wifi.radio.ap_info.channel)
-    print("\tAP Country:", wifi.radio.ap_info.country)
-    print("\tAP RSSI:", wifi.radio.ap_info.rssi)
-
-    # Second, ping PING_IP - the primary DNS server for Google DNS
-    ping = wifi.radio.ping(ip=PING_IP)
-    if ping is None:
-        print("\tCouldn't ping 'google.com' successfully")
-    else:
-        print("\tPinging 'google.com' took:", ping * 1000, "ms")
+    from utils_report import writer
+    out = writer()
+    radio = wifi.radio
+    _write_connection_details(out, radio)
+
+    out.flush()
+
+    # Second, latency, jitter and loss to the gateway and PING_IP - the primary DNS server for Google DNS
+    probe = _latency_probe(targets, rounds)
+    probe.run(rounds)
+    probe.report()
 
     # Third, get some text via HTTP request and print it
     TEXT_URL = "http://wifitest.adafruit.com/testwifi/index.html"
     print("\tHTTP Request from", TEXT_URL)
-    import socketpool
-    import ssl
-    import adafruit_requests
-    pool = socketpool.SocketPool(wifi.radio)
-    context = ssl.create_default_context()
-    requests = adafruit_requests.Session(pool, context)
+    requests = get_session()
     try:
         response = requests.get(TEXT_URL)
         if response.content:
@@ -117,10 +141,40 @@ def test_wifi():
         print("\tFailed to request data from", TEXT_URL, e)
 
 
-# Download a ~1MB file to test speed
-def test_bandwidth():
+def _write_connection_details(out, radio):
+    ap_info = radio.ap_info
+    out.row(b"\tIP:", radio.ipv4_address)
+    out.key(b"\tMAC address:")
+    out.hex_bytes(radio.mac_address)
+    out.newline()
+    out.row(b"\tDNS server:", radio.ipv4_dns)
+    out.row(b"\tGateway:", radio.ipv4_gateway)
+    out.row(b"\tSubnet:", radio.ipv4_subnet)
+    out.row(b"\tAP Authmode:", ap_info.authmode)
+    out.row(b"\tAP SSID:", ap_info.ssid)
+    out.key(b"\tAP BSSID:")
+    out.hex_bytes(ap_info.bssid)
+    out.newline()
+    out.row(b"\tAP Channel:", ap_info.channel)
+    out.row(b"\tAP Country:", ap_info.country)
+    out.row(b"\tAP RSSI:", ap_info.rssi, b"dBm")
+
+
+def _latency_probe(targets, rounds):
+    from utils_wifi_probe import LatencyProbe
+    print("\tLatency to each target, over", rounds, "probes:")
+    return LatencyProbe(targets, timeout=PING_TIMEOUT)
+
+
+# Download url to test speed, streaming it through one small buffer, so it can be far bigger than memory.
+# Reports the time to the first byte, the steady throughput without the connection setup,
+# and the throughput every interval seconds. limit stops after that many bytes.
+@profiled
+def test_bandwidth(url=FILE_DOWNLOAD_URL, interval=1.0, limit=None):
     print(CPUTILS_STRING, "Testing download bandwidth...")
 
+    import wifi
+
     # Abort if not connected to Wifi
     if not wifi.radio.enabled:
         print("\tWifi radio disabled")
@@ -129,34 +183,661 @@ def test_bandwidth():
         print("\tNot connected to WiFi")
         return
 
-    import time
-    import socketpool
-    import ssl
-    import adafruit_requests
+    print("\tHTTP request:", url)
+    try:
+        result = measure_download(url, interval, limit)
+    except Exception as e:
+        print("\tHTTP request error:", e)
+        return
+    from utils_report import writer
+    out = writer()
+    _write_throughput(out, result)
+    out.flush()
+    if result.timings.status != 200:
+        print("Failed to download test file. Status code:", result.timings.status)
+    return result
 
-    pool = socketpool.SocketPool(wifi.radio)
-    context = ssl.create_default_context()
-    requests = adafruit_requests.Session(pool, context)
 
-    start_time = time.monotonic()
+# Upload size bytes to url to test speed, like test_bandwidth() does for downloads.
+# url needs a server that takes a POST and throws the data away, like tools/local_http_server.py.
+@profiled
+def test_upload(url, size=1000000, interval=1.0):
+    print(CPUTILS_STRING, "Testing upload bandwidth...")
+
+    import wifi
+
+    if not wifi.radio.enabled:
+        print("\tWifi radio disabled")
+        return
+    if not wifi.radio.connected:
+        print("\tNot connected to WiFi")
+        return
+
+    print("\tHTTP POST:", url, size, "bytes")
     try:
-        print("\tHTTP request:", FILE_DOWNLOAD_URL)
-        response = requests.get(FILE_DOWNLOAD_URL)
-        print("\tStatus code:", response.status_code)
-        print("\tHeaders:")
-        for header, value in response.headers.items():
-            print(f"\t\t{header}: {value}")
-
-        if response.status_code == 200:
-            # Calculate download speed
-            end_time = time.monotonic()
-            duration = end_time - start_time    # Time taken for download in seconds
-            data_length = len(response.content)  # Length of data in bytes
-            speed_bps = data_length / duration  # Speed in bytes per second
-
-            print("\tDownloaded", data_length, "bytes in", duration, "seconds.")
-            print("\tDownload speed:", speed_bps, "Bytes per second.")
+        result = measure_upload(url, size, interval)
+    except Exception as e:
+        print("\tHTTP request error:", e)
+        return
+    from utils_report import writer
+    out = writer()
+    _write_throughput(out, result)
+    out.flush()
+    return result
+
+
+# One HTTP session, shared by every function here and by your own code.
+# The socket pool, SSL context and session are created the first time they're needed,
+# and the session keeps connections open between requests to the same server,
+# so later requests skip DNS, connecting and the TLS handshake.
+_pool = None
+_ssl_context = None
+_session = None
+
+
+def get_socket_pool():
+    global _pool
+    if _pool is None:
+        import wifi
+        import socketpool
+        _pool = socketpool.SocketPool(wifi.radio)
+    return _pool
+
+
+def get_ssl_context():
+    global _ssl_context
+    if _ssl_context is None:
+        import ssl
+        _ssl_context = ssl.create_default_context()
+    return _ssl_context
+
+
+# Return the shared adafruit_requests.Session
+def get_session():
+    global _session
+    if _session is None:
+        import adafruit_requests
+        _session = adafruit_requests.Session(get_socket_pool(), get_ssl_context())
+    return _session
+
+
+# Close the connections the shared session holds open. The next get_session() starts a new one.
+# reset=True also drops the socket pool and SSL context, for after the radio restarts.
+def close_session(reset=False):
+    global _session, _pool, _ssl_context
+    if _session is not None:
+        try:
+            # adafruit_requests 3.x leaves its sockets to adafruit_connection_manager, which can close them
+            import adafruit_connection_manager
+            adafruit_connection_manager.connection_manager_close_all(_pool)
+        except (ImportError, RuntimeError):
+            # Not installed, or it isn't managing this pool because adafruit_requests is older
+            _close_old_sockets(_session)
+        _session = None
+    if reset:
+        _pool = None
+        _ssl_context = None
+
+
+# adafruit_requests 1.x and 2.x keep open sockets on the session, with no public way to close them.
+# If they aren't where those versions keep them, dropping the session leaves them to the garbage collector.
+def _close_old_sockets(session):
+    sockets = getattr(session, "_open_sockets", None)
+    if not isinstance(sockets, dict):
+        return
+    for sock in sockets.values():
+        try:
+            sock.close()
+        except (OSError, AttributeError):
+            pass
+    sockets.clear()
+    free = getattr(session, "_socket_free", None)
+    if isinstance(free, dict):
+        free.clear()
+
+
+class HTTPTimings:
+    """Milliseconds spent in each part of one request, from time_request().
+    tls_ms is 0 for http. CircuitPython may finish the TLS handshake on the first write,
+    in which case part of it shows up in first_byte_ms."""
+
+    __slots__ = ("dns_ms", "connect_ms", "tls_ms", "first_byte_ms", "total_ms", "status", "length")
+
+    def __init__(self):
+        self.dns_ms = 0.0
+        self.connect_ms = 0.0
+        self.tls_ms = 0.0
+        self.first_byte_ms = 0.0
+        self.total_ms = 0.0
+        self.status = None
+        self.length = 0
+
+
+# Milliseconds since start, a ticks_us()
+def _elapsed_ms(start):
+    return ticks_diff(ticks_us(), start) / 1000
+
+
+# Scratch buffer for time_request(), so reading a response doesn't allocate
+_read_buffer = None
+
+
+# Open a fresh connection to url's server, timing the DNS lookup, TCP connect and TLS handshake into timings.
+# Returns (socket, host, path).
+def _open_connection(url, timeout, timings):
+    proto, _, rest = url.partition("//")
+    host_port, _, path = rest.partition("/")
+    host, _, port = host_port.partition(":")
+    port = int(port) if port else (443 if proto == "https:" else 80)
+
+    pool = get_socket_pool()
+    trace = utils_trace.begin() if utils_trace.ENABLED else 0
+    step = ticks_us()
+    info = pool.getaddrinfo(host, port, 0, pool.SOCK_STREAM)[0]
+    timings.dns_ms = _elapsed_ms(step)
+    if trace:
+        utils_trace.end("http.dns", trace)
+        trace = utils_trace.begin()
+
+    step = ticks_us()
+    sock = pool.socket(info[0], info[1], info[2])
+    try:
+        sock.settimeout(timeout)
+        sock.connect(info[-1])
+        timings.connect_ms = _elapsed_ms(step)
+        if trace:
+            utils_trace.end("http.connect", trace)
+
+        if proto == "https:":
+            trace = utils_trace.begin() if utils_trace.ENABLED else 0
+            step = ticks_us()
+            sock = get_ssl_context().wrap_socket(sock, server_hostname=host)
+            handshake = getattr(sock, "do_handshake", None)
+            if handshake is not None:
+                handshake()
+            timings.tls_ms = _elapsed_ms(step)
+            if trace:
+                utils_trace.end("http.tls", trace)
+    except Exception:
+        sock.close()
+        raise
+    return sock, host, path
+
+
+# Bytes of "\r\n\r\n", which ends the headers
+_HEADER_END = b"\r\n\r\n"
+
+
+# Find the end of the headers in buf[:count], carrying matched, the number of "\r\n\r\n" bytes
+# already seen, across reads. Returns (where the body starts or -1, matched).
+def _find_body(buf, count, matched):
+    for i in range(count):
+        if buf[i] == _HEADER_END[matched]:
+            matched += 1
+            if matched == 4:
+                return i + 1, matched
         else:
-            print("Failed to download test file. Status code:", response.status_code)
+            matched = 1 if buf[i] == 13 else 0
+    return -1, matched
+
+
+# Make one GET request on a fresh connection, timing each step separately:
+# DNS lookup, TCP connect, TLS handshake, and waiting for the first byte of the answer.
+# The body is read and thrown away. Returns an HTTPTimings.
+@profiled
+def time_request(url=FILE_DOWNLOAD_URL, timeout=HTTP_TIMEOUT):
+    global _read_buffer
+    if _read_buffer is None:
+        _read_buffer = bytearray(CHUNK_SIZE)
+    buf = _read_buffer
+
+    timings = HTTPTimings()
+    request_trace = utils_trace.begin() if utils_trace.ENABLED else 0
+    start = ticks_us()
+    sock, host, path = _open_connection(url, timeout, timings)
+    try:
+        request = "GET /" + path + " HTTP/1.1\r\nHost: " + host + "\r\nConnection: close\r\n\r\n"
+        trace = utils_trace.begin() if utils_trace.ENABLED else 0
+        step = ticks_us()
+        sock.send(request.encode())
+        count = sock.recv_into(buf)
+        timings.first_byte_ms = _elapsed_ms(step)
+        if trace:
+            utils_trace.end("http.first_byte", trace)
+
+        # The status code is the 3 digits after "HTTP/1.1 "
+        if count >= 12:
+            timings.status = int(bytes(buf[9:12]))
+        # Everything up to the blank line is headers
+        body_start = -1
+        matched = 0
+        length = 0
+        while count > 0:
+            if body_start < 0:
+                body_start, matched = _find_body(buf, count, matched)
+                if body_start >= 0:
+                    length += count - body_start
+            else:
+                length += count
+            count = sock.recv_into(buf)
+        timings.length = length
+    finally:
+        sock.close()
+    timings.total_ms = _elapsed_ms(start)
+    if request_trace:
+        utils_trace.end("http.request", request_trace)
+        utils_trace.count("http.bytes", timings.length)
+    return timings
+
+
+# Print how long each part of a request to url takes on a fresh connection,
+# then how long the same request takes through the shared session, which reuses its connection
+@profiled
+def test_http_timings(url=FILE_DOWNLOAD_URL, count=3):
+    print(CPUTILS_STRING, "Timing HTTP requests...")
+    print("\tHTTP request:", url)
+
+    from utils_report import writer
+    out = writer()
+    out.line(b"\t           dns ms  connect ms    tls ms  first byte ms  total ms")
+    try:
+        for _ in range(count):
+            timings = time_request(url)
+            out.text(b"\tnew     ")
+            out.fixed(timings.dns_ms, 1, 9)
+            out.fixed(timings.connect_ms, 1, 12)
+            out.fixed(timings.tls_ms, 1, 10)
+            out.fixed(timings.first_byte_ms, 1, 15)
+            out.fixed(timings.total_ms, 1, 10)
+            out.newline()
+        requests = get_session()
+        for _ in range(count):
+            start = ticks_us()
+            response = requests.get(url)
+            first_byte_ms = _elapsed_ms(start)
+            response.content
+            out.text(b"\tsession ")
+            out.text(b"        -           -         -")
+            out.fixed(first_byte_ms, 1, 15)
+            out.fixed(_elapsed_ms(start), 1, 10)
+            out.newline()
+    except Exception as e:
+        out.flush()
+        print("\tRequest failed:", e)
+        return
+    out.flush()
+
+
+# Most points a throughput series keeps. When a test runs longer, neighbouring points are
+# averaged together and the interval doubles, so the series always fits in the same memory.
+SERIES_POINTS = 64
+# Bytes read or sent at a time by the throughput tests
+THROUGHPUT_CHUNK = 4096
+
+
+class ThroughputResult:
+    """What measure_download() or measure_upload() saw.
+
+    timings:      an HTTPTimings with the DNS, connect, TLS and first byte times, and the status.
+                  For an upload, first_byte_ms is the wait for the server's answer after the last byte was sent.
+    length:       body bytes transferred
+    seconds:      time from the first body byte to the last, without the connection setup
+    steady_bps:   bytes per second over those seconds
+    series:       bytes per second in each interval, as an array. Only the first count are used.
+    interval:     seconds each point in the series covers
+
+    Transfers are timed in ticks_ms(), since they can take longer than ticks_us() can time."""
+
+    __slots__ = ("timings", "length", "seconds", "steady_bps", "series", "count", "interval",
+                 "_interval_ms", "_interval_start", "_interval_bytes")
+
+    def __init__(self, interval):
+        from array import array
+        self.timings = HTTPTimings()
+        self.length = 0
+        self.seconds = 0.0
+        self.steady_bps = 0.0
+        self.series = array("f", [0.0] * SERIES_POINTS)
+        self.count = 0
+        self.interval = interval
+        self._interval_ms = int(interval * 1000)
+        self._interval_start = 0
+        self._interval_bytes = 0
+
+    def _start(self, now):
+        self._interval_start = now
+
+    def _add(self, now, count):
+        """Count bytes transferred at now, closing any intervals that have ended"""
+        self.length += count
+        self._interval_bytes += count
+        while ticks_diff(now, self._interval_start) >= self._interval_ms:
+            if self.count == SERIES_POINTS:
+                # Full, so halve the resolution
+                for i in range(SERIES_POINTS // 2):
+                    self.series[i] = (self.series[2 * i] + self.series[2 * i + 1]) / 2
+                self.count = SERIES_POINTS // 2
+                self.interval *= 2
+                self._interval_ms *= 2
+            self.series[self.count] = self._interval_bytes / self.interval
+            self.count += 1
+            self._interval_bytes = 0
+            self._interval_start = ticks_add(self._interval_start, self._interval_ms)
+
+    def _finish(self, start, end):
+        self.seconds = ticks_diff(end, start) / 1000
+        if self.seconds > 0:
+            self.steady_bps = self.length / self.seconds
+
+
+# Download url in chunks into one reused buffer, without keeping any of it, so the size isn't limited by memory.
+# Stops after limit bytes if given. Returns a ThroughputResult.
+@profiled
+def measure_download(url, interval=1.0, limit=None, timeout=HTTP_TIMEOUT, chunk_size=THROUGHPUT_CHUNK):
+    buf = bytearray(chunk_size)
+    result = ThroughputResult(interval)
+    timings = result.timings
+    trace = utils_trace.begin() if utils_trace.ENABLED else 0
+    start = ticks_ms()
+    sock, host, path = _open_connection(url, timeout, timings)
+    try:
+        request = "GET /" + path + " HTTP/1.1\r\nHost: " + host + "\r\nConnection: close\r\n\r\n"
+        step = ticks_us()
+        sock.send(request.encode())
+        count = sock.recv_into(buf)
+        timings.first_byte_ms = _elapsed_ms(step)
+        body_time = ticks_ms()
+        if count >= 12:
+            timings.status = int(bytes(buf[9:12]))
+
+        result._start(body_time)
+        body_start = -1
+        matched = 0
+        while count > 0:
+            if body_start < 0:
+                body_start, matched = _find_body(buf, count, matched)
+                if body_start >= 0:
+                    result._add(ticks_ms(), count - body_start)
+            else:
+                result._add(ticks_ms(), count)
+            if limit is not None and result.length >= limit:
+                break
+            count = sock.recv_into(buf)
+        end = ticks_ms()
+    finally:
+        sock.close()
+    result._finish(body_time, end)
+    timings.length = result.length
+    timings.total_ms = ticks_diff(end, start)
+    if trace:
+        utils_trace.end("http.download", trace)
+        utils_trace.count("http.bytes", result.length)
+    return result
+
+
+# POST size bytes to url, sent in chunks from one reused buffer, so the size isn't limited by memory.
+# The server should read and throw away the body, like POST /upload on fakes/http_server.py. Returns a ThroughputResult.
+@profiled
+def measure_upload(url, size, interval=1.0, timeout=HTTP_TIMEOUT, chunk_size=THROUGHPUT_CHUNK):
+    buf = bytearray(chunk_size)
+    for i in range(chunk_size):
+        buf[i] = 48 + i % 10
+    result = ThroughputResult(interval)
+    timings = result.timings
+    start = ticks_ms()
+    sock, host, path = _open_connection(url, timeout, timings)
+    try:
+        request = ("POST /" + path + " HTTP/1.1\r\nHost: " + host + "\r\nContent-Type: application/octet-stream"
+                   "\r\nContent-Length: " + str(size) + "\r\nConnection: close\r\n\r\n")
+        sock.send(request.encode())
+        body_start = ticks_ms()
+        result._start(body_start)
+        view = memoryview(buf)
+        remaining = size
+        while remaining > 0:
+            if remaining >= chunk_size:
+                sent = sock.send(buf)
+            else:
+                sent = sock.send(view[:remaining])
+            remaining -= sent
+            result._add(ticks_ms(), sent)
+
+        # The data isn't all there until the server says so
+        step = ticks_us()
+        count = sock.recv_into(buf)
+        timings.first_byte_ms = _elapsed_ms(step)
+        end = ticks_ms()
+        if count >= 12:
+            timings.status = int(bytes(buf[9:12]))
+    finally:
+        sock.close()
+    result._finish(body_start, end)
+    timings.length = result.length
+    timings.total_ms = ticks_diff(end, start)
+    return result
+
+
+def _write_throughput(out, result):
+    timings = result.timings
+    out.row(b"\tStatus code:", timings.status)
+    out.key(b"\tConnection setup:")
+    out.fixed(timings.dns_ms + timings.connect_ms + timings.tls_ms, 1)
+    out.line(b" ms")
+    out.key(b"\tTime to first byte:")
+    out.fixed(timings.first_byte_ms, 1)
+    out.line(b" ms")
+    out.key(b"\tTransferred:")
+    out.number(result.length)
+    out.text(b" bytes in ")
+    out.fixed(result.seconds, 2)
+    out.line(b" s")
+    out.key(b"\tSteady throughput:")
+    out.kilobytes(int(result.steady_bps))
+    out.line(b"/s")
+    if result.count == 0:
+        return
+    out.text(b"\tKB/s every ")
+    out.fixed(result.interval, 2)
+    out.line(b" s:")
+    for i in range(result.count):
+        if i % 8 == 0:
+            if i:
+                out.newline()
+            out.byte(9)
+        out.fixed(result.series[i] / 1024, 1, 9)
+    out.newline()
+
+
+# asyncio versions of the functions above, so a display or sensor loop keeps running while the
+# board connects, scans or downloads. They give other tasks a turn whenever they'd otherwise wait.
+# wifi.radio.connect(), each scan step and each socket read still block inside CircuitPython,
+# so those are kept short with timeouts and small chunks. Run them as tasks:
+#     asyncio.create_task(utils_wifi.keep_connected())
+#     await utils_wifi.scan_wifi_networks_async()
+# Cancelling a task stops it at its next turn, and cleans up the scan or the open response.
+
+# Seconds each connect attempt can take
+CONNECT_TIMEOUT = 10
+# Seconds to wait after the first failed connect. The wait doubles after each failure, up to RECONNECT_BACKOFF_MAX.
+RECONNECT_BACKOFF = 1.0
+RECONNECT_BACKOFF_MAX = 60.0
+# Seconds between connection checks in keep_connected()
+CHECK_INTERVAL = 5.0
+
+
+def _wifi_settings(ssid, password):
+    if ssid is None:
+        ssid = os.getenv("CIRCUITPY_WIFI_SSID")
+    if password is None:
+        password = os.getenv("CIRCUITPY_WIFI_PASSWORD")
+    return ssid, password
+
+
+# Connect, retrying with a growing wait between attempts.
+# attempts=None keeps trying until it connects. Returns True once connected, False if every attempt failed.
+async def connect_wifi_async(ssid=None, password=None, attempts=5, timeout=CONNECT_TIMEOUT):
+    print(CPUTILS_STRING, "Connecting to WiFi...")
+
+    import asyncio
+    import wifi
+
+    ssid, password = _wifi_settings(ssid, password)
+    if ssid is None or len(ssid) == 0:
+        print("\tNo SSID specified in connect_wifi_async() or settings.toml")
+        return False
+
+    backoff = RECONNECT_BACKOFF
+    attempt = 0
+    while attempts is None or attempt < attempts:
+        attempt += 1
+        try:
+            wifi.radio.connect(ssid, password, timeout=timeout)
+            print("\tSuccessfully connected to", ssid)
+            return True
+        except Exception as e:
+            print("\tFailed to connect:", e)
+        if attempts is not None and attempt >= attempts:
+            break
+        print("\tTrying again in", backoff, "seconds")
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+    return False
+
+
+# Run forever as a task, reconnecting whenever the connection drops
+async def keep_connected(ssid=None, password=None, check_interval=CHECK_INTERVAL):
+    import asyncio
+    import wifi
+
+    while True:
+        if not wifi.radio.connected:
+            # Connections from before the drop are dead, so don't let the session reuse them
+            close_session()
+            await connect_wifi_async(ssid, password, attempts=None)
+        await asyncio.sleep(check_interval)
+
+
+# Print each network as the scan finds it, or pass it to on_network(network) instead.
+# Nothing is kept or sorted. Stops after timeout seconds if given. Returns how many networks were found.
+async def scan_wifi_networks_async(on_network=None, timeout=None):
+    print(CPUTILS_STRING, "Scanning for WiFi networks...")
+
+    import asyncio
+    import wifi
+    from utils_report import writer
+
+    out = writer()
+    count = 0
+    start = ticks_ms()
+    networks = wifi.radio.start_scanning_networks()
+    try:
+        for network in networks:
+            count += 1
+            if on_network is None:
+                out.text(b"\t ")
+                out.text(network.ssid)
+                out.text(b" \t\trssi: ")
+                out.number(network.rssi)
+                out.line(b" dBm")
+                out.flush()
+            else:
+                on_network(network)
+            await asyncio.sleep(0)
+            if timeout is not None and ticks_diff(ticks_ms(), start) >= timeout * 1000:
+                break
+    finally:
+        wifi.radio.stop_scanning_networks()
+    return count
+
+
+# Download url in CHUNK_SIZE pieces, giving other tasks a turn after each one.
+# Returns (status code, bytes downloaded). The response is closed even if the task is cancelled.
+async def _download(requests, url, timeout):
+    import asyncio
+
+    response = requests.get(url, stream=True, timeout=timeout)
+    try:
+        total = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            total += len(chunk)
+            await asyncio.sleep(0)
+        return response.status_code, total
+    finally:
+        response.close()
+
+
+# Same as test_wifi(), but the ping and the HTTP request have timeouts,
+# and the download lets other tasks run. Returns True if everything worked.
+async def test_wifi_async(timeout=HTTP_TIMEOUT, targets=PROBE_TARGETS, rounds=PROBE_ROUNDS):
+    print(CPUTILS_STRING, "Testing Wifi connection...")
+
+    import asyncio
+    import wifi
+    from utils_report import writer
+
+    if not wifi.radio.enabled:
+        print("\tWifi radio disabled")
+        return False
+    if not wifi.radio.connected:
+        print("\tNot connected to WiFi")
+        return False
+
+    out = writer()
+    radio = wifi.radio
+    _write_connection_details(out, radio)
+    out.flush()
+    probe = _latency_probe(targets, rounds)
+    await probe.run_async(rounds)
+    probe.report()
+
+    print("\tHTTP Request from", FILE_DOWNLOAD_URL)
+    try:
+        status, length = await asyncio.wait_for(_download(get_session(), FILE_DOWNLOAD_URL, timeout), timeout)
+    except asyncio.TimeoutError:
+        print("\tNo response within", timeout, "seconds")
+        return False
+    except Exception as e:
+        print("\tFailed to request data from", FILE_DOWNLOAD_URL, e)
+        return False
+    if length:
+        print("\tHTTP Response successfully received!")
+    else:
+        print("\t\tSuccessful request, but empty response")
+    answered = any(stats.lost < stats.sent for stats in probe.targets)
+    return answered and status == 200
+
+
+# Same as test_bandwidth(), but gives up after timeout seconds and lets other tasks run during the download.
+# Returns the speed in bytes per second, or None if the download failed.
+async def test_bandwidth_async(url=FILE_DOWNLOAD_URL, timeout=60):
+    print(CPUTILS_STRING, "Testing download bandwidth...")
+
+    import asyncio
+    import wifi
+
+    if not wifi.radio.enabled:
+        print("\tWifi radio disabled")
+        return None
+    if not wifi.radio.connected:
+        print("\tNot connected to WiFi")
+        return None
+
+    print("\tHTTP request:", url)
+    start = ticks_ms()
+    try:
+        status, length = await asyncio.wait_for(_download(get_session(), url, timeout), timeout)
+    except asyncio.TimeoutError:
+        print("\tDownload took longer than", timeout, "seconds")
+        return None
     except Exception as e:
         print("\tHTTP request error:", e)
+        return None
+    # At least a millisecond, so a download faster than a tick doesn't divide by zero
+    duration = max(1, ticks_diff(ticks_ms(), start)) / 1000
+    if status != 200:
+        print("Failed to download test file. Status code:", status)
+        return None
+    speed_bps = length / duration
+    print("\tDownloaded", length, "bytes in", duration, "seconds.")
+    print("\tDownload speed:", speed_bps, "Bytes per second.")
+    return speed_bps
@@ -0,0 +1,358 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Latency, jitter and packet loss to several targets, measured over many probes instead of one ping.
+
+    import utils_wifi_probe
+    probe = utils_wifi_probe.LatencyProbe(["gateway", "dns", "8.8.8.8"])
+    probe.run(rounds=50)
+    probe.report()
+
+Targets can be:
+    "gateway", "dns"        the addresses the wifi connection was given
+    "8.8.8.8", "example.com"  any other host, pinged
+    "tcp://example.com:443"   time a TCP connect, for networks that block ping
+    "http://example.com/"     time a GET through utils_wifi's shared session
+
+The p50, p90 and p99 latencies are estimated as probes come in (the P-square algorithm), so a probe
+uses the same memory after a million probes as after ten, and no list of samples is kept. """
+
+import time
+
+from utils_profile import profiler
+from utils_ticks import ticks_diff, ticks_ms, ticks_us
+
+profiled = profiler(__name__)
+
+# Seconds to wait for each probe before counting it lost
+PROBE_TIMEOUT = 1.0
+# Seconds between rounds
+PROBE_INTERVAL = 0.1
+# Port for "tcp://host" targets that don't give one
+TCP_PORT = 80
+PERCENTILES = (0.5, 0.9, 0.99)
+# Where save_results() appends runs. On the board, this is the root of CIRCUITPY.
+RESULTS_FILE = "probes.jsonl"
+
+class QuantileEstimator:
+    """Estimates one quantile of a stream of values in constant memory, with the P-square algorithm
+    (Jain and Chlamtac, 1985). Five markers track the minimum, the quantile, the maximum and two points
+    in between; each new value nudges them, fitting a parabola through neighbouring markers.
+    Exact for the first five values, and usually within a few percent after that."""
+
+    __slots__ = ("quantile", "count", "heights", "positions", "desired", "_increments")
+
+    def __init__(self, quantile):
+        from array import array
+        self.quantile = quantile
+        self.count = 0
+        self.heights = array("f", [0.0] * 5)
+        self.positions = array("L", [0, 1, 2, 3, 4])
+        self.desired = array("f", [0.0, 2 * quantile, 4 * quantile, 2 + 2 * quantile, 4.0])
+        self._increments = (0.0, quantile / 2, quantile, (1 + quantile) / 2, 1.0)
+
+    def add(self, value):
+        heights = self.heights
+        if self.count < 5:
+            # Insertion sort the first five values into place
+            i = self.count
+            while i > 0 and heights[i - 1] > value:
+                heights[i] = heights[i - 1]
+                i -= 1
+            heights[i] = value
+            self.count += 1
+            return
+        self.count += 1
+
+        # Find the cell the value falls in, stretching the ends if it's a new minimum or maximum
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+
+        positions = self.positions
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self._increments[i]
+
+        # Move the middle markers towards where they should be, one position at a time
+        for i in range(1, 4):
+            offset = self.desired[i] - positions[i]
+            if (offset >= 1 and positions[i + 1] - positions[i] > 1) or \
+                    (offset <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / \
+                        (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i, step):
+        heights = self.heights
+        positions = self.positions
+        below = positions[i] - positions[i - 1]
+        above = positions[i + 1] - positions[i]
+        return heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+            (below + step) * (heights[i + 1] - heights[i]) / above +
+            (above - step) * (heights[i] - heights[i - 1]) / below)
+
+    def value(self):
+        """Return the estimate, or None before the first value"""
+        if self.count == 0:
+            return None
+        if self.count < 5:
+            return self.heights[int(self.quantile * (self.count - 1) + 0.5)]
+        return self.heights[2]
+
+
+class TargetStats:
+    """What a LatencyProbe has seen from one target.
+
+    jitter_ms:  how much the latency changes from one probe to the next, smoothed like RTP's
+                interarrival jitter (RFC 3550): each change moves it 1/16 of the way"""
+
+    __slots__ = ("target", "mode", "host", "port", "address", "sent", "lost", "min_ms", "max_ms",
+                 "total_ms", "last_ms", "jitter_ms", "quantiles", "last_error")
+
+    def __init__(self, target):
+        self.target = target
+        self.address = None
+        self.port = None
+        if target.startswith("http://") or target.startswith("https://"):
+            self.mode = "http"
+            self.host = target
+        elif target.startswith("tcp://"):
+            self.mode = "tcp"
+            host, _, port = target[6:].partition(":")
+            self.host = host
+            self.port = int(port) if port else TCP_PORT
+        else:
+            self.mode = "icmp"
+            self.host = target
+        self.sent = 0
+        self.lost = 0
+        self.min_ms = None
+        self.max_ms = None
+        self.total_ms = 0.0
+        self.last_ms = None
+        self.jitter_ms = 0.0
+        self.quantiles = tuple(QuantileEstimator(quantile) for quantile in PERCENTILES)
+        self.last_error = None
+
+    def record(self, ms):
+        if self.min_ms is None or ms < self.min_ms:
+            self.min_ms = ms
+        if self.max_ms is None or ms > self.max_ms:
+            self.max_ms = ms
+        self.total_ms += ms
+        if self.last_ms is not None:
+            self.jitter_ms += (abs(ms - self.last_ms) - self.jitter_ms) / 16
+        self.last_ms = ms
+        for estimator in self.quantiles:
+            estimator.add(ms)
+
+    def percentile(self, fraction):
+        """Return the estimated latency in ms for one of PERCENTILES, like 0.99, or None if nothing answered"""
+        for estimator in self.quantiles:
+            if estimator.quantile == fraction:
+                return estimator.value()
+        raise ValueError("Not one of PERCENTILES")
+
+    def mean_ms(self):
+        answered = self.sent - self.lost
+        return self.total_ms / answered if answered else None
+
+    def loss(self):
+        """Fraction of probes that got no answer"""
+        return self.lost / self.sent if self.sent else 0.0
+
+
+class LatencyProbe:
+    """Probes each target in turn, over and over, and keeps latency, jitter and loss for each.
+
+    targets:   see the top of this file. Defaults to the gateway, the DNS server and 8.8.8.8.
+    interval:  seconds between rounds
+    timeout:   seconds to wait for each probe
+
+    Call poll() for one round from your own loop, run() for a number of rounds, or run_async() as an asyncio task."""
+
+    def __init__(self, targets=("gateway", "dns", "8.8.8.8"), interval=PROBE_INTERVAL, timeout=PROBE_TIMEOUT):
+        self.targets = [TargetStats(target) for target in targets]
+        self.interval = interval
+        self.timeout = timeout
+        self.rounds = 0
+        # utils_ticks.ticks_ms() when the first round started and the last one ended
+        self.start_ms = None
+        self.end_ms = None
+
+    def _resolve(self, stats):
+        """Find the address to ping or connect to, the first time it's needed"""
+        import ipaddress
+        import wifi
+
+        if stats.host in ("gateway", "dns"):
+            address = wifi.radio.ipv4_gateway if stats.host == "gateway" else wifi.radio.ipv4_dns
+            # Sockets want the address as a string, ping wants an IPv4Address
+            stats.address = str(address) if stats.mode == "tcp" else address
+        else:
+            from utils_wifi import get_socket_pool
+            pool = get_socket_pool()
+            info = pool.getaddrinfo(stats.host, stats.port or 0, 0, pool.SOCK_STREAM)[0]
+            stats.address = info[-1][0] if stats.mode == "tcp" else ipaddress.ip_address(info[-1][0])
+
+    def _probe_ms(self, stats):
+        """Probe one target once. Returns the latency in ms, or None if there was no answer."""
+        if stats.mode == "icmp":
+            import wifi
+            seconds = wifi.radio.ping(stats.address, timeout=self.timeout)
+            return None if seconds is None else seconds * 1000
+
+        from utils_wifi import get_socket_pool, get_session
+        start = ticks_us()
+        if stats.mode == "tcp":
+            pool = get_socket_pool()
+            sock = pool.socket(pool.AF_INET, pool.SOCK_STREAM)
+            try:
+                sock.settimeout(self.timeout)
+                sock.connect((stats.address, stats.port))
+            finally:
+                sock.close()
+        else:
+            response = get_session().get(stats.host, timeout=self.timeout)
+            try:
+                response.content
+            finally:
+                response.close()
+        return ticks_diff(ticks_us(), start) / 1000
+
+    def probe(self, stats):
+        """Probe one target once and record the result"""
+        stats.sent += 1
+        try:
+            if stats.address is None and stats.mode != "http":
+                self._resolve(stats)
+            ms = self._probe_ms(stats)
+        except Exception as error:
+            # A failed lookup, a refused or timed out connect, or a failed request all count as lost
+            stats.last_error = error
+            ms = None
+        if ms is None:
+            stats.lost += 1
+        else:
+            stats.record(ms)
+
+    @profiled
+    def poll(self):
+        """Probe every target once"""
+        if self.start_ms is None:
+            self.start_ms = ticks_ms()
+        for stats in self.targets:
+            self.probe(stats)
+        self.rounds += 1
+        self.end_ms = ticks_ms()
+
+    def run(self, rounds=20, sampler=None):
+        """Poll every interval seconds, for rounds rounds, or forever if rounds is None.
+        Give a utils_sampler.SystemSampler to sample the CPU and free memory as it goes."""
+        while rounds is None or self.rounds < rounds:
+            if self.rounds:
+                time.sleep(self.interval)
+            if sampler is not None:
+                sampler.poll()
+            self.poll()
+
+    async def run_async(self, rounds=20):
+        """Like run(), but gives other tasks a turn between targets and while waiting. A ping still blocks
+        until it's answered or times out."""
+        import asyncio
+        if self.start_ms is None:
+            self.start_ms = ticks_ms()
+        while rounds is None or self.rounds < rounds:
+            if self.rounds:
+                await asyncio.sleep(self.interval)
+            for stats in self.targets:
+                self.probe(stats)
+                await asyncio.sleep(0)
+            self.rounds += 1
+            self.end_ms = ticks_ms()
+
+    def summary(self):
+        """Return one dict per target, with its counts, loss, jitter and latencies in ms"""
+        rows = []
+        for stats in self.targets:
+            row = {
+                "target": stats.target,
+                "mode": stats.mode,
+                "sent": stats.sent,
+                "lost": stats.lost,
+                "loss": stats.loss(),
+                "min_ms": stats.min_ms,
+                "mean_ms": stats.mean_ms(),
+                "max_ms": stats.max_ms,
+                "jitter_ms": stats.jitter_ms,
+            }
+            for estimator in stats.quantiles:
+                row["p%d_ms" % round(estimator.quantile * 100)] = estimator.value()
+            rows.append(row)
+        return rows
+
+    @profiled
+    def save_results(self, path=RESULTS_FILE):
+        """Append the summary to path as one JSON record, with the board and firmware it came from,
+        like utils_benchmark.save_results(). Returns the record."""
+        import json
+        import os
+        import board
+
+        record = {
+            "time": time.time(),
+            "monotonic_ms": ticks_ms(),
+            "board_id": board.board_id,
+            "release": os.uname().release,
+            "start_ms": self.start_ms,
+            "end_ms": self.end_ms,
+            "rounds": self.rounds,
+            "targets": self.summary(),
+        }
+        try:
+            with open(path, "a") as file:
+                file.write(json.dumps(record))
+                file.write("\n")
+        except OSError as e:
+            print("\tCouldn't save probe results to", path, e)
+            print("\tTo write to CIRCUITPY, call storage.remount('/', readonly=False) in boot.py")
+        return record
+
+    @profiled
+    def report(self):
+        """Print the summary as a table"""
+        from utils_report import writer
+        out = writer()
+        out.line(b"\ttarget                        mode   sent  loss%   min ms   p50 ms   p90 ms   p99 ms   max ms  jitter")
+        for stats in self.targets:
+            out.byte(9)
+            out.text(stats.target if len(stats.target) <= 28 else stats.target[:25] + "...")
+            out.pad(31)
+            out.text(stats.mode)
+            out.number(stats.sent, 11 - len(stats.mode))
+            out.fixed(stats.loss() * 100, 1, 7)
+            values = (stats.min_ms,) + tuple(estimator.value() for estimator in stats.quantiles) + \
+                (stats.max_ms, stats.jitter_ms if stats.last_ms is not None else None)
+            for value in values:
+                if value is None:
+                    out.text(b"        -")
+                else:
+                    out.fixed(value, 1, 9)
+            out.newline()
+            if stats.lost == stats.sent and stats.last_error is not None:
+                out.text(b"\t\t")
+                out.line(str(stats.last_error))
+        out.flush()
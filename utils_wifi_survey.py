@@ -0,0 +1,325 @@
+# By @howdymoto / Wright Bagwell
+# MIT license
+
+""" Wifi site survey: scan over and over, and keep RSSI statistics for every access point.
+
+Useful for deciding where to put an access point, or a board. Each BSSID gets a fixed slot in
+a set of arrays, updated as each scan comes in, so memory use is the same after 10 scans or 10,000:
+
+    import utils_wifi_survey
+    survey = utils_wifi_survey.WifiSurvey()
+    survey.run(scans=20, interval=5)
+    survey.report()
+
+Results can be written as CSV with write_csv(), or packed into a compact binary form with encode()
+and read back with decode(), on the board or on your computer. """
+
+import struct
+import time
+
+from utils_profile import profiler
+
+profiled = profiler(__name__)
+
+# Access points a survey keeps statistics for. Any more are counted in WifiSurvey.dropped.
+MAX_NETWORKS = 32
+# 2.4 GHz channels. Networks on other bands are counted, but left out of the channel analysis.
+CHANNELS = 14
+# A 2.4 GHz channel is about 22 MHz wide and channels are 5 MHz apart,
+# so a network overlaps channels less than this far from its own
+OVERLAP_CHANNELS = 5
+# Non-overlapping channels to choose from in best_channel()
+PREFERRED_CHANNELS = (1, 6, 11)
+
+# Binary format, all little-endian:
+#   header:   "CPS", version u8, scans u16, network count u8, dropped u16
+#   network:  bssid 6 bytes, channel u8, samples u16, last seen scan u16, min i8, max i8,
+#             mean i16 (hundredths of a dBm), stddev u16 (hundredths of a dB), ssid length u8, ssid UTF-8
+MAGIC = b"CPS"
+FORMAT_VERSION = 1
+_HEADER = "<3sBHBH"
+_NETWORK = "<6sBHHbbhHB"
+
+CSV_HEADER = "bssid,ssid,channel,samples,seen_percent,rssi_min,rssi_mean,rssi_max,rssi_stddev\n"
+
+
+def _ssid_bytes(ssid):
+    """ssid as UTF-8, cut to the 255 bytes its length can count, at the end of a whole character"""
+    data = ssid.encode()
+    if len(data) <= 255:
+        return data
+    end = 255
+    # Back up past the continuation bytes of the character that didn't fit
+    while data[end] & 0xC0 == 0x80:
+        end -= 1
+    return data[:end]
+
+
+class WifiSurvey:
+    """RSSI statistics for each access point, over many scans.
+
+    For each BSSID, slot i of the arrays holds: samples, min, max, mean and the running
+    sum of squares for the standard deviation (Welford's method), plus the channel and the
+    scan it was last seen in. ssids is a list, since names vary in length."""
+
+    def __init__(self, max_networks=MAX_NETWORKS):
+        from array import array
+
+        self.max_networks = max_networks
+        self.bssids = bytearray(6 * max_networks)
+        self.ssids = []
+        self.channels = bytearray(max_networks)
+        self.samples = array("H", [0] * max_networks)
+        self.rssi_min = array("b", [0] * max_networks)
+        self.rssi_max = array("b", [0] * max_networks)
+        self.mean = array("f", [0.0] * max_networks)
+        self._m2 = array("f", [0.0] * max_networks)
+        self.last_seen = array("H", [0] * max_networks)
+        self.count = 0
+        self.scans = 0
+        self.dropped = 0
+        self.other_band = 0
+
+    def _find(self, bssid):
+        """Return the slot for bssid, adding it if there's room, or -1"""
+        for slot in range(self.count):
+            start = slot * 6
+            for i in range(6):
+                if self.bssids[start + i] != bssid[i]:
+                    break
+            else:
+                return slot
+        if self.count == self.max_networks:
+            return -1
+        slot = self.count
+        self.bssids[slot * 6:slot * 6 + 6] = bssid
+        self.count += 1
+        return slot
+
+    def add(self, network):
+        """Record one scan result, a wifi.Network"""
+        slot = self._find(network.bssid)
+        if slot < 0:
+            self.dropped += 1
+            return
+        rssi = network.rssi
+        samples = self.samples[slot]
+        if samples == 0:
+            self.ssids.append(network.ssid)
+            self.channels[slot] = network.channel if network.channel < 256 else 0
+            if network.channel > CHANNELS:
+                self.other_band += 1
+            self.rssi_min[slot] = rssi
+            self.rssi_max[slot] = rssi
+        else:
+            if rssi < self.rssi_min[slot]:
+                self.rssi_min[slot] = rssi
+            if rssi > self.rssi_max[slot]:
+                self.rssi_max[slot] = rssi
+        # The counts saturate rather than wrap, so a very long survey stays correct, if less precise
+        if samples < 0xFFFF:
+            samples += 1
+            self.samples[slot] = samples
+        delta = rssi - self.mean[slot]
+        self.mean[slot] += delta / samples
+        self._m2[slot] += delta * (rssi - self.mean[slot])
+        self.last_seen[slot] = min(self.scans, 0xFFFF)
+
+    def stddev(self, slot):
+        samples = self.samples[slot]
+        if samples < 2:
+            return 0.0
+        return (self._m2[slot] / (samples - 1)) ** 0.5
+
+    def bssid_text(self, slot):
+        start = slot * 6
+        return ":".join("%02X" % value for value in self.bssids[start:start + 6])
+
+    @profiled
+    def scan(self):
+        """Run one scan and add every network it finds"""
+        import wifi
+
+        self.scans += 1
+        try:
+            for network in wifi.radio.start_scanning_networks():
+                self.add(network)
+        finally:
+            wifi.radio.stop_scanning_networks()
+
+    def run(self, scans=10, interval=5.0):
+        """Scan scans times, interval seconds apart"""
+        for i in range(scans):
+            if i:
+                time.sleep(interval)
+            self.scan()
+
+    async def run_async(self, scans=10, interval=5.0):
+        """Like run(), but lets other tasks run between scans and between scan results"""
+        import asyncio
+        import wifi
+
+        for i in range(scans):
+            if i:
+                await asyncio.sleep(interval)
+            self.scans += 1
+            networks = wifi.radio.start_scanning_networks()
+            try:
+                for network in networks:
+                    self.add(network)
+                    await asyncio.sleep(0)
+            finally:
+                wifi.radio.stop_scanning_networks()
+
+    def channel_counts(self):
+        """Return an array of how many networks are on each 2.4 GHz channel. Index 0 is unused."""
+        from array import array
+
+        counts = array("H", [0] * (CHANNELS + 1))
+        for slot in range(self.count):
+            channel = self.channels[slot]
+            if 0 < channel <= CHANNELS:
+                counts[channel] += 1
+        return counts
+
+    def channel_congestion(self):
+        """Return an array with a congestion score for each 2.4 GHz channel. Index 0 is unused.
+
+        Every network adds to its own channel and its neighbours, less the further away they are,
+        weighted by how strong it is (0 at -100 dBm, 1 at -30 dBm and up) and how often it was seen."""
+        from array import array
+
+        congestion = array("f", [0.0] * (CHANNELS + 1))
+        for slot in range(self.count):
+            own = self.channels[slot]
+            if not 0 < own <= CHANNELS:
+                continue
+            strength = min(1.0, max(0.0, (self.mean[slot] + 100) / 70))
+            presence = self.samples[slot] / self.scans if self.scans else 1.0
+            weight = strength * min(1.0, presence)
+            for channel in range(max(1, own - OVERLAP_CHANNELS + 1), min(CHANNELS, own + OVERLAP_CHANNELS - 1) + 1):
+                congestion[channel] += weight * (1 - abs(channel - own) / OVERLAP_CHANNELS)
+        return congestion
+
+    def best_channel(self):
+        """Return the least congested of PREFERRED_CHANNELS"""
+        congestion = self.channel_congestion()
+        return min(PREFERRED_CHANNELS, key=lambda channel: congestion[channel])
+
+    @profiled
+    def report(self):
+        """Print each access point's statistics, strongest first, then the channel analysis"""
+        from utils_report import writer
+
+        out = writer()
+        out.heading(b"wifi survey")
+        out.text(b"Scans: ")
+        out.number(self.scans)
+        out.text(b"    Access points: ")
+        out.number(self.count)
+        if self.dropped:
+            out.text(b"    Results dropped, survey full: ")
+            out.number(self.dropped)
+        out.newline()
+        out.newline()
+        out.line(b"BSSID              ch  seen%   min   mean   max  stddev  SSID")
+        for slot in sorted(range(self.count), key=lambda slot: -self.mean[slot]):
+            out.hex_bytes(self.bssids[slot * 6:slot * 6 + 6], 58)
+            out.number(self.channels[slot], 4)
+            out.number(self.samples[slot] * 100 // max(1, self.scans), 7)
+            out.number(self.rssi_min[slot], 6)
+            out.fixed(self.mean[slot], 1, 7)
+            out.number(self.rssi_max[slot], 6)
+            out.fixed(self.stddev(slot), 1, 8)
+            out.text(b"  ")
+            out.line(self.ssids[slot])
+
+        counts = self.channel_counts()
+        congestion = self.channel_congestion()
+        out.newline()
+        out.line(b"channel  networks  congestion")
+        for channel in range(1, CHANNELS + 1):
+            if counts[channel] or congestion[channel] >= 0.05:
+                out.number(channel, 7)
+                out.number(counts[channel], 10)
+                out.fixed(congestion[channel], 2, 12)
+                out.newline()
+        if self.other_band:
+            out.text(b"Networks on other bands: ")
+            out.number(self.other_band)
+            out.newline()
+        out.text(b"Least congested of channels 1, 6 and 11: ")
+        out.number(self.best_channel())
+        out.newline()
+        out.flush()
+
+    def write_csv(self, stream):
+        """Write one CSV line per access point to stream, anything with a write() method, like an open file"""
+        stream.write(CSV_HEADER)
+        for slot in range(self.count):
+            stream.write("%s,%s,%d,%d,%d,%d,%.1f,%d,%.1f\n" % (
+                self.bssid_text(slot), self.ssids[slot].replace(",", " "), self.channels[slot],
+                self.samples[slot], self.samples[slot] * 100 // max(1, self.scans),
+                self.rssi_min[slot], self.mean[slot], self.rssi_max[slot], self.stddev(slot)))
+
+    def encoded_size(self):
+        size = struct.calcsize(_HEADER)
+        for slot in range(self.count):
+            size += struct.calcsize(_NETWORK) + len(_ssid_bytes(self.ssids[slot]))
+        return size
+
+    def encode_into(self, buf):
+        """Pack the survey into buf, a bytearray or memoryview with room for encoded_size() bytes.
+        Returns the number of bytes written."""
+        struct.pack_into(_HEADER, buf, 0, MAGIC, FORMAT_VERSION, min(self.scans, 0xFFFF), self.count,
+                         min(self.dropped, 0xFFFF))
+        pos = struct.calcsize(_HEADER)
+        network_size = struct.calcsize(_NETWORK)
+        for slot in range(self.count):
+            ssid = _ssid_bytes(self.ssids[slot])
+            start = slot * 6
+            struct.pack_into(_NETWORK, buf, pos, bytes(self.bssids[start:start + 6]), self.channels[slot],
+                             self.samples[slot], self.last_seen[slot], self.rssi_min[slot], self.rssi_max[slot],
+                             round(self.mean[slot] * 100), min(0xFFFF, round(self.stddev(slot) * 100)), len(ssid))
+            pos += network_size
+            buf[pos:pos + len(ssid)] = ssid
+            pos += len(ssid)
+        return pos
+
+    @profiled
+    def encode(self):
+        """Return the survey packed into bytes"""
+        buf = bytearray(self.encoded_size())
+        self.encode_into(buf)
+        return bytes(buf)
+
+
+def decode(data):
+    """Unpack what WifiSurvey.encode() made. Returns a dict with scans, dropped and a list of networks,
+    each a dict. Raises ValueError for data that isn't a survey, or is from another format version."""
+
+    magic, version, scans, count, dropped = struct.unpack_from(_HEADER, data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a wifi survey")
+    if version != FORMAT_VERSION:
+        raise ValueError("Wifi survey format version %d, expected %d" % (version, FORMAT_VERSION))
+    pos = struct.calcsize(_HEADER)
+    network_size = struct.calcsize(_NETWORK)
+    networks = []
+    for _ in range(count):
+        bssid, channel, samples, last_seen, rssi_min, rssi_max, mean, stddev, length = \
+            struct.unpack_from(_NETWORK, data, pos)
+        pos += network_size
+        networks.append({
+            "bssid": ":".join("%02X" % value for value in bssid),
+            "ssid": bytes(data[pos:pos + length]).decode(),
+            "channel": channel,
+            "samples": samples,
+            "last_seen": last_seen,
+            "rssi_min": rssi_min,
+            "rssi_mean": mean / 100,
+            "rssi_max": rssi_max,
+            "rssi_stddev": stddev / 100,
+        })
+        pos += length
+    return {"scans": scans, "dropped": dropped, "networks": networks}